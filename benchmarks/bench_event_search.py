@@ -0,0 +1,237 @@
+"""
+Event search latency: seeds a large events table and times GET /events/
+searches (word, prefix, type and time-range filters, ranked paging)
+through the Flask test client against the real database.
+
+    python benchmarks/bench_event_search.py                      # 10M events
+    python benchmarks/bench_event_search.py --events 1000000 --keep
+    python benchmarks/bench_event_search.py --reuse               # data kept by --keep
+
+Needs the MySQL database from extensions/extensions.py with the schema
+migrated (migration 11 adds the event_terms index). Events are spread
+over --projects projects and 90 days; the benchmark user is subscribed to
+--subscribed of them, so every search also has to skip other projects'
+words, as in production. A few events with a marker word are seeded at
+the very start of the 90 days, and the run fails unless a search finds
+every one of them, so the timings cover the full history rather than a
+recent slice. Seeding 10M rows takes a while; keep the data with --keep
+and rerun with --reuse. Exits non-zero when any query's p95
+is over --budget-ms.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from index import app
+from extensions.extensions import get_db_connection
+from extensions.ids import new_id
+from extensions.sql import in_list
+from extensions.search import index_events
+from functions.projects import JWT_SECRET
+
+MARKER = "created by bench_event_search.py"
+# Seeded on the oldest events only; every one must be found.
+OLDEST_WORD = "zzbencholdest"
+OLDEST_EVENTS = 20
+
+SOURCES = ["api", "worker", "scheduler", "billing", "auth", "gateway", "search", "mailer", "cdn", "webhooks"]
+VERBS = ["request", "connection", "job", "payment", "login", "upload", "query", "deploy", "sync", "export"]
+OUTCOMES = ["failed", "succeeded", "retried", "timed out", "was slow", "completed", "was rejected", "started"]
+DETAILS = [
+    "timeout after 30s", "connection refused", "status 500", "status 502", "status 404", "deadlock detected",
+    "certificate expired", "rate limited", "disk full", "out of memory", "invalid token", "dns lookup failed",
+]
+
+
+def _message(rnd):
+    # Zipf-ish vocabulary: a few very common words, a long tail of rare
+    # identifiers (hosts, order numbers) like real log lines.
+    return (
+        f"{rnd.choice(VERBS)} {rnd.choice(OUTCOMES)} on host-{int(rnd.paretovariate(1.2)) % 5000}: "
+        f"{rnd.choice(DETAILS)} (order {rnd.randrange(10 ** 7):07d})"
+    )
+
+
+def seed(n_events, n_projects, n_subscribed, batch=5000):
+    """Returns (user_id, project_ids)."""
+    rnd = random.Random(22)
+    now = datetime.datetime.now()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            user_id = new_id()
+            cursor.execute(
+                "INSERT INTO users (id, email, password_hash, name) VALUES (%s, %s, 'x', %s)",
+                (user_id, f"event-search-{user_id}@example.invalid", MARKER),
+            )
+            project_ids = [new_id() for _ in range(n_projects)]
+            cursor.executemany(
+                "INSERT INTO projects (id, name, description) VALUES (%s, %s, %s)",
+                [(pid, f"event search {i}", MARKER) for i, pid in enumerate(project_ids)],
+            )
+            cursor.executemany(
+                """
+                INSERT INTO subscriptions (id, user_id, project_id, expires_at, is_active)
+                VALUES (%s, %s, %s, %s, TRUE)
+                """,
+                [(new_id(), user_id, pid, now + datetime.timedelta(days=365)) for pid in project_ids[:n_subscribed]],
+            )
+        conn.commit()
+
+        started = time.perf_counter()
+        oldest = now - datetime.timedelta(days=90)
+        with conn.cursor() as cursor:
+            for done in range(0, n_events, batch):
+                events = [
+                    {"id": new_id(), "project_id": rnd.choice(project_ids),
+                     "type": rnd.choice(("info", "info", "warning", "error")),
+                     "message": _message(rnd), "source": rnd.choice(SOURCES),
+                     "created_at": now - datetime.timedelta(seconds=rnd.randrange(90 * 86400))}
+                    for _ in range(min(batch, n_events - done))
+                ]
+                if done == 0:
+                    for i, e in enumerate(events[:OLDEST_EVENTS]):
+                        e["project_id"] = project_ids[i % n_subscribed]
+                        e["message"] += f" {OLDEST_WORD}"
+                        e["created_at"] = oldest + datetime.timedelta(seconds=i)
+                cursor.executemany(
+                    """
+                    INSERT INTO events (id, project_id, type, message, source, created_at)
+                    VALUES (%(id)s, %(project_id)s, %(type)s, %(message)s, %(source)s, %(created_at)s)
+                    """,
+                    events,
+                )
+                index_events(cursor, events)
+                conn.commit()
+                if (done // batch) % 100 == 0:
+                    print(f"  seeded {done + batch:,} events ({time.perf_counter() - started:.0f}s)")
+            cursor.execute("ANALYZE TABLE events")
+            cursor.fetchall()
+    finally:
+        conn.close()
+    return user_id, project_ids
+
+
+def find_seeded():
+    """(user_id, project_ids) of data left by an earlier --keep run, or None."""
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM users WHERE name = %s LIMIT 1", (MARKER,))
+            user = cursor.fetchone()
+            cursor.execute("SELECT id FROM projects WHERE description = %s", (MARKER,))
+            project_ids = [r["id"] for r in cursor.fetchall()]
+    finally:
+        conn.close()
+    return (user["id"], project_ids) if user and project_ids else None
+
+
+def cleanup(user_id, project_ids):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            for pid in project_ids:
+                for table in ("event_terms", "events"):
+                    while cursor.execute(f"DELETE FROM {table} WHERE project_id = %s LIMIT 50000", (pid,)):
+                        conn.commit()
+            p = in_list(len(project_ids))
+            cursor.execute(f"DELETE FROM subscriptions WHERE project_id IN ({p})", project_ids)
+            cursor.execute(f"DELETE FROM projects WHERE id IN ({p})", project_ids)
+            cursor.execute("DELETE FROM users WHERE id = %s", (user_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def run(user_id, runs, budget_ms):
+    client = app.test_client()
+    headers = {"Authorization": f"Bearer {jwt.encode({'id': user_id}, JWT_SECRET, algorithm='HS256')}"}
+    since = (datetime.datetime.now() - datetime.timedelta(days=1)).isoformat(timespec="seconds")
+
+    found = client.get(f"/events/?q={OLDEST_WORD}&limit=200", headers=headers).get_json() or {}
+    if len(found.get("events", [])) != OLDEST_EVENTS:
+        print(f"FAIL: search found {len(found.get('events', []))} of the {OLDEST_EVENTS} oldest marker events")
+        return 1
+
+    first = client.get("/events/?q=timeout&limit=50", headers=headers).get_json() or {}
+    queries = [
+        ("rare word", "/events/?q=deadlock"),
+        ("oldest events", f"/events/?q={OLDEST_WORD}"),
+        ("common word", "/events/?q=failed"),
+        ("two words", "/events/?q=payment+rejected"),
+        ("prefix", "/events/?q=certif"),
+        ("order number prefix", "/events/?q=00421"),
+        ("word + type", "/events/?q=timeout&type=error"),
+        ("word + last 24h", f"/events/?q=refused&since={since}"),
+        ("word, newest first", "/events/?q=timeout&sort=recent"),
+        ("no search, last 24h", f"/events/?since={since}"),
+    ]
+    if first.get("next_cursor"):
+        queries.append(("ranked page 2", f"/events/?q=timeout&limit=50&cursor={first['next_cursor']}"))
+
+    failures = 0
+    print(f"{'query':22} {'hits':>5} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for label, path in queries:
+        client.get(path, headers=headers)  # warm the buffer pool
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            resp = client.get(path, headers=headers)
+            samples.append((time.perf_counter() - started) * 1000)
+            if resp.status_code != 200:
+                print(f"{label}: HTTP {resp.status_code} {resp.get_data(as_text=True)[:200]}")
+                return 1
+        hits = len(resp.get_json()["events"])
+        p95 = percentile(samples, 0.95)
+        over = p95 > budget_ms
+        failures += over
+        print(f"{label:22} {hits:>5} {percentile(samples, 0.5):>8.1f} {p95:>8.1f} {max(samples):>8.1f}"
+              + ("  OVER BUDGET" if over else ""))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=10_000_000)
+    parser.add_argument("--projects", type=int, default=500)
+    parser.add_argument("--subscribed", type=int, default=5, help="projects the benchmark user can see")
+    parser.add_argument("--runs", type=int, default=50, help="timed requests per query")
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows for --reuse")
+    parser.add_argument("--reuse", action="store_true", help="reuse rows kept by an earlier --keep run")
+    args = parser.parse_args()
+
+    seeded = find_seeded() if args.reuse else None
+    if args.reuse and not seeded:
+        print("No kept benchmark data found; seeding")
+    if seeded:
+        user_id, project_ids = seeded
+    else:
+        print(f"Seeding {args.events:,} events over {args.projects} projects")
+        user_id, project_ids = seed(args.events, args.projects, args.subscribed)
+
+    try:
+        failures = run(user_id, args.runs, args.budget_ms)
+    finally:
+        if not args.keep:
+            cleanup(user_id, project_ids)
+
+    if failures:
+        print(f"FAIL: {failures} queries over the {args.budget_ms:.0f}ms p95 budget")
+        sys.exit(1)
+    print(f"OK: every query's p95 is within {args.budget_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
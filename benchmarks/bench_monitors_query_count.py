@@ -0,0 +1,132 @@
+"""
+Seeds N monitors behind a fake DB connection and asserts that GET /monitors
+runs a constant number of queries regardless of N.
+
+    python benchmarks/bench_monitors_query_count.py --sizes 10 100 500 1000
+
+No MySQL needed: the fake cursor answers each query shape with synthetic
+rows and records every execute() call.
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from index import app
+from functions.projects import JWT_SECRET
+import functions.monitors as monitors_module
+
+MAX_QUERIES = 4  # page + rollup stats + ranked heartbeats + stale fallback
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self._rows = []
+
+    def execute(self, sql, params=()):
+        self.db.queries.append(sql)
+        if "FROM uptime_monitors" in sql:
+            self._rows = self.db.monitors[:params[-1]]
+        elif "uptime_rollup_" in sql:
+            ids = dict.fromkeys(p for p in params if isinstance(p, str))
+            self._rows = [
+                {"monitor_id": mid, "total_checks": 1440, "up_checks": 1430, "avg_latency": 125.0}
+                for mid in ids
+                if mid in self.db.fresh
+            ]
+        elif "ROW_NUMBER()" in sql:
+            # (monitor ids..., since) per check interval, then HISTORY_POINTS
+            ids = [p for p in params[:-1] if isinstance(p, str)]
+            self._rows = [
+                dict(hb, monitor_id=mid)
+                for mid in ids
+                if mid in self.db.fresh
+                for hb in self.db.history
+            ]
+        elif "WHERE monitor_id = %s" in sql:
+            # (monitor_id, HISTORY_POINTS) per stale monitor, UNION ALL-ed
+            ids = params[::2]
+            self._rows = [
+                dict(hb, monitor_id=mid)
+                for mid in ids
+                if mid in self.db.checked
+                for hb in self.db.history
+            ]
+        else:
+            raise AssertionError(f"unexpected query: {sql}")
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class FakeConnection:
+    def __init__(self, n_monitors):
+        now = datetime.datetime.now()
+        self.queries = []
+        # A mix of check intervals, so the page spans several heartbeat windows.
+        self.monitors = [
+            {
+                "id": f"m{i}",
+                "name": f"monitor {i}",
+                "url": f"https://example.com/{i}",
+                "project_id": "p1",
+                "check_interval": (30, 60, 300, 3600)[i % 4],
+                "created_at": now - datetime.timedelta(minutes=i),
+            }
+            for i in range(n_monitors)
+        ]
+        # Every tenth monitor has no heartbeat in the last 24h and falls back
+        # to its last known checks; every twentieth was never checked at all.
+        self.fresh = {m["id"] for i, m in enumerate(self.monitors) if i % 10}
+        self.checked = {m["id"] for i, m in enumerate(self.monitors) if i % 20}
+        self.history = [
+            {
+                "status": "up",
+                "response_time_ms": 120 + rn,
+                "checked_at": now - datetime.timedelta(minutes=rn),
+                "rn": rn,
+            }
+            for rn in range(1, monitors_module.HISTORY_POINTS + 1)
+        ]
+
+    def cursor(self, *args):
+        return FakeCursor(self)
+
+    def close(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500, 1000])
+    args = parser.parse_args()
+
+    token = jwt.encode({"id": "bench-user"}, JWT_SECRET, algorithm="HS256")
+    client = app.test_client()
+
+    for n in args.sizes:
+        fake = FakeConnection(n)
+        monitors_module.get_db_connection = lambda: fake
+        start = time.perf_counter()
+        resp = client.get(f"/monitors?limit={n}", headers={"Authorization": f"Bearer {token}"})
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        assert resp.status_code == 200, resp.get_data(as_text=True)
+        monitors = resp.get_json()["monitors"]
+        assert len(monitors) == n
+        assert all(m["history"] for i, m in enumerate(monitors) if i % 20), "stale monitors lost their history"
+        assert len(fake.queries) <= MAX_QUERIES, f"{len(fake.queries)} queries for {n} monitors"
+        print(f"monitors={n:<6} queries={len(fake.queries)} elapsed={elapsed_ms:.1f}ms")
+
+    print(f"OK: query count stays <= {MAX_QUERIES} for every size")
+
+
+if __name__ == "__main__":
+    main()
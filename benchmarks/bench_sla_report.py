@@ -0,0 +1,226 @@
+"""
+SLA report benchmark: seeds 90 days of synthetic checks for a project's
+monitors as heartbeat rollups and incidents, then times sla_report() for
+7/30/90 day windows and checks its figures against exact values computed
+from the synthetic checks.
+
+    python benchmarks/bench_sla_report.py
+    python benchmarks/bench_sla_report.py --monitors 50 --runs 10 --keep
+
+Needs the MySQL database from extensions/extensions.py with the schema
+migrated. Only rollups are written (day and hour rows for the whole range,
+minute rows where the windows have ragged edges), the same rows the uptime
+worker would have produced with write_rollups' aggregation, so no raw
+heartbeats are stored or read. Exits non-zero when a latency percentile
+is off by more than the sketch's relative accuracy, downtime differs, or
+a report takes longer than --budget-ms.
+"""
+import argparse
+import datetime
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions.extensions import get_db_connection
+from extensions.ids import new_id
+from extensions.sql import in_list
+from functions.rollups import ROLLUP_TABLES, LatencySketch, _aggregate
+from functions.sla import SLA_QUANTILES, SLA_WINDOWS, sla_report
+
+DAYS = 90
+
+
+def _rollup_rows(groups):
+    return [
+        (monitor_id, start, g["project_id"], g["check_count"], g["up_count"], g["latency_count"],
+         g["latency_sum"], g["latency_min"], g["latency_max"], g["sketch"].to_json())
+        for (monitor_id, start), g in groups.items()
+    ]
+
+
+def seed(n_monitors, now):
+    """
+    Returns (project_id, monitor_ids, checks, incidents, first): checks[monitor_id]
+    is the latency of every minute's check from `first` on (None while
+    down), incidents is [(monitor_id, started_at, resolved_at)].
+    """
+    rnd = random.Random(25)
+    first = (now - datetime.timedelta(days=DAYS + 1)).replace(hour=0, minute=0, second=0)
+    minutes = int((now - first).total_seconds() // 60) + 1
+    # Minute rollups are only read at the ragged edges of each window.
+    edges = [(now - datetime.timedelta(hours=2), now)] + [
+        (now - datetime.timedelta(days=d, hours=1), now - datetime.timedelta(days=d) + datetime.timedelta(hours=2))
+        for d in SLA_WINDOWS.values()
+    ]
+
+    project_id = new_id()
+    monitor_ids = [new_id() for _ in range(n_monitors)]
+    checks, incidents = {}, []
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO projects (id, name, description) VALUES (%s, 'sla benchmark', 'created by bench_sla_report.py')",
+                (project_id,),
+            )
+            cursor.executemany(
+                "INSERT INTO uptime_monitors (id, project_id, name, url, created_at) VALUES (%s, %s, %s, %s, %s)",
+                [(mid, project_id, f"sla bench {i}", f"https://sla-bench.invalid/{i}", first)
+                 for i, mid in enumerate(monitor_ids)],
+            )
+        conn.commit()
+
+        for n, monitor_id in enumerate(monitor_ids):
+            down = [False] * minutes
+            for _ in range(rnd.randint(2, 12)):
+                start = rnd.randrange(minutes - 1)
+                length = min(minutes - 1 - start, int(rnd.expovariate(1 / 30)) + 1)
+                for i in range(start, start + length):
+                    down[i] = True
+            # Incidents are the down runs; the one still running at `now` stays open.
+            run_start = None
+            for i in range(minutes + 1):
+                if i < minutes and down[i] and run_start is None:
+                    run_start = i
+                elif (i == minutes or not down[i]) and run_start is not None:
+                    resolved = first + datetime.timedelta(minutes=i) if i < minutes else None
+                    incidents.append((monitor_id, first + datetime.timedelta(minutes=run_start), resolved))
+                    run_start = None
+
+            mu = math.log(rnd.uniform(60, 400))
+            latencies = [
+                None if down[i] else int(rnd.lognormvariate(mu, 0.35) * (rnd.uniform(3, 8) if rnd.random() < 0.01 else 1))
+                for i in range(minutes)
+            ]
+            checks[monitor_id] = latencies
+            records = [
+                {
+                    "monitor_id": monitor_id,
+                    "project_id": project_id,
+                    "checked_at": first + datetime.timedelta(minutes=i),
+                    "hb_status": "down" if latency is None else "up",
+                    "response_time_ms": latency,
+                }
+                for i, latency in enumerate(latencies)
+            ]
+            edge_records = [r for r in records if any(lo <= r["checked_at"] < hi for lo, hi in edges)]
+            with conn.cursor() as cursor:
+                for resolution, table in ROLLUP_TABLES.items():
+                    groups = _aggregate(edge_records if resolution == "minute" else records, resolution)
+                    cursor.executemany(
+                        f"""
+                        INSERT INTO {table} (
+                            monitor_id, bucket_start, project_id, check_count, up_count,
+                            latency_count, latency_sum, latency_min, latency_max, latency_sketch
+                        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        """,
+                        _rollup_rows(groups),
+                    )
+            conn.commit()
+            print(f"  seeded monitor {n + 1}/{n_monitors} ({minutes:,} checks)")
+
+        with conn.cursor() as cursor:
+            cursor.executemany(
+                """
+                INSERT INTO uptime_incidents (id, project_id, monitor_id, status, started_at, resolved_at, started_reason, last_error)
+                VALUES (%s, %s, %s, %s, %s, %s, 'down', 'sla benchmark')
+                """,
+                [(new_id(), project_id, mid, "resolved" if resolved else "open", started, resolved)
+                 for mid, started, resolved in incidents],
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    return project_id, monitor_ids, checks, incidents, first
+
+
+def cleanup(project_id, monitor_ids):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            m = in_list(len(monitor_ids))
+            for table in ROLLUP_TABLES.values():
+                cursor.execute(f"DELETE FROM {table} WHERE monitor_id IN ({m})", monitor_ids)
+            cursor.execute("DELETE FROM uptime_incidents WHERE project_id = %s", (project_id,))
+            cursor.execute("DELETE FROM uptime_monitors WHERE project_id = %s", (project_id,))
+            cursor.execute("DELETE FROM projects WHERE id = %s", (project_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def exact(checks, incidents, first, start, end):
+    """Exact latency quantiles (same rank rule as the sketch) and downtime minutes."""
+    lo = max(0, math.ceil((start - first).total_seconds() / 60))
+    hi = math.ceil((end - first).total_seconds() / 60)
+    values = sorted(v for latencies in checks.values() for v in latencies[lo:hi] if v is not None)
+    quantiles = {name: float(values[int(q * (len(values) - 1))]) for name, q in SLA_QUANTILES.items()}
+    down = sum(
+        max(0.0, (min(resolved or end, end) - max(started, start)).total_seconds())
+        for _, started, resolved in incidents
+    )
+    return quantiles, down / 60, hi - lo
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--monitors", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5, help="timed reports per window")
+    parser.add_argument("--budget-ms", type=float, default=500.0)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    args = parser.parse_args()
+
+    now = datetime.datetime.now().replace(second=30, microsecond=0)
+    print(f"Seeding {DAYS} days for {args.monitors} monitors")
+    project_id, monitor_ids, checks, incidents, first = seed(args.monitors, now)
+
+    failures = 0
+    tolerance = LatencySketch.RELATIVE_ACCURACY + 1e-9
+    try:
+        print(f"{'window':7} {'raw checks':>11} {'rollup rows':>11} {'median ms':>10} "
+              f"{'p50 err':>8} {'p95 err':>8} {'p99 err':>8} {'downtime min':>13}")
+        for window, days in SLA_WINDOWS.items():
+            start = now - datetime.timedelta(days=days)
+            samples = []
+            for _ in range(args.runs):
+                conn = get_db_connection()
+                try:
+                    started = time.perf_counter()
+                    report = sla_report(conn, project_id, start, now)
+                    samples.append((time.perf_counter() - started) * 1000)
+                finally:
+                    conn.close()
+
+            quantiles, downtime, minutes = exact(checks, incidents, first, start, now)
+            summary = report["summary"]
+            errors = {
+                name: abs(summary["latency"][name] - value) / value
+                for name, value in quantiles.items()
+            }
+            median = sorted(samples)[len(samples) // 2]
+            bad = (
+                any(e > tolerance for e in errors.values())
+                or abs(summary["downtimeMinutes"] - downtime) > 0.01
+                or median > args.budget_ms
+            )
+            failures += bad
+            print(f"{window:7} {minutes * len(monitor_ids):>11,} {report['coverage']['rollupRows']:>11,} {median:>10.1f} "
+                  f"{errors['p50']:>8.2%} {errors['p95']:>8.2%} {errors['p99']:>8.2%} "
+                  f"{summary['downtimeMinutes']:>6.0f}/{downtime:<6.0f}" + ("  FAIL" if bad else ""))
+    finally:
+        if not args.keep:
+            cleanup(project_id, monitor_ids)
+
+    if failures:
+        print(f"FAIL: {failures} windows out of tolerance or over the {args.budget_ms:.0f}ms budget")
+        sys.exit(1)
+    print(f"OK: percentiles within {LatencySketch.RELATIVE_ACCURACY:.0%}, downtime exact, "
+          f"every report under {args.budget_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
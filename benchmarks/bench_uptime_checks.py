@@ -0,0 +1,98 @@
+"""
+Measures uptime check throughput against a local stub HTTP server.
+
+    python benchmarks/bench_uptime_checks.py --monitors 500 --latency-ms 200 --concurrency 200
+
+Every request to the stub sleeps for --latency-ms before answering, so the
+numbers reflect how many probes the engine keeps in flight rather than
+network speed.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functions.uptime_engine import run_checks
+
+
+def _make_handler(latency_s):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency_s)
+            body = b"ok"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub_server(latency_ms):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(latency_ms / 1000.0))
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def run(monitors, concurrency, per_host_limit):
+    start = time.perf_counter()
+    latencies = []
+    failures = 0
+    for _, result in run_checks(monitors, concurrency=concurrency, per_host_limit=per_host_limit):
+        if result["is_success"]:
+            latencies.append(result["response_time_ms"])
+        else:
+            failures += 1
+    elapsed = time.perf_counter() - start
+    return elapsed, latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--monitors", type=int, default=500)
+    parser.add_argument("--latency-ms", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--hosts", type=int, default=25, help="stub servers (distinct host:port) to spread monitors over")
+    parser.add_argument("--per-host-limit", type=int, default=8)
+    parser.add_argument("--sequential", action="store_true", help="also run with concurrency=1 for comparison")
+    args = parser.parse_args()
+
+    # The per-host limit is keyed on host:port, so one stub server per
+    # "host" exercises it the way distinct real hosts would.
+    servers = [start_stub_server(args.latency_ms) for _ in range(max(1, args.hosts))]
+    monitors = []
+    for i in range(args.monitors):
+        port = servers[i % len(servers)].server_address[1]
+        monitors.append({"id": str(i), "url": f"http://127.0.0.1:{port}/check/{i}", "timeout_ms": 30000})
+
+    modes = [("concurrent", args.concurrency)]
+    if args.sequential:
+        modes.append(("sequential", 1))
+
+    for label, concurrency in modes:
+        elapsed, latencies, failures = run(monitors, concurrency, args.per_host_limit)
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] if latencies else 0
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0
+        print(
+            f"{label:<11} concurrency={concurrency:<4} checks={len(monitors)} "
+            f"elapsed={elapsed:.2f}s checks/sec={len(monitors) / elapsed:.1f} "
+            f"p50={p50}ms p99={p99}ms failures={failures}"
+        )
+
+    for server in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Runs several uptime worker processes against the same database and checks
+that lease claiming never lets two of them check the same monitor.
+
+    python benchmarks/bench_worker_leases.py --monitors 400 --workers 4
+
+Needs the MySQL database from extensions/extensions.py with the schema set
+up. Creates a throwaway project whose monitors point at a local stub
+server, seeds some of them with an expired lease from a "crashed" worker,
+lets the workers drain everything due, then asserts that every monitor was
+requested exactly once and has exactly one heartbeat and one rollup count.
+It then has one worker's lease run out and be taken over by another, and
+asserts that the first worker's late result writes nothing: no heartbeat,
+no rollup count, and the new owner's lease left alone. The project
+and its rows are deleted afterwards.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extensions.extensions import get_db_connection
+from extensions.ids import new_id
+from extensions.sql import in_list
+
+
+def start_stub_server(latency_ms, hits):
+    lock = threading.Lock()
+
+    class CountingHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with lock:
+                hits[self.path] += 1
+            time.sleep(latency_ms / 1000.0)
+            body = b"ok"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CountingHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 1024
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed(project_id, port, count, stale_leases):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO projects (id, name, description) VALUES (%s, %s, %s)",
+                (project_id, "lease benchmark", "created by benchmarks/bench_worker_leases.py"),
+            )
+            ids = [new_id() for _ in range(count)]
+            cursor.executemany(
+                """
+                INSERT INTO uptime_monitors (id, project_id, name, url, interval_seconds, timeout_ms)
+                VALUES (%s, %s, %s, %s, 3600, 5000)
+                """,
+                [(mid, project_id, f"m{i}", f"http://127.0.0.1:{port}/{mid}") for i, mid in enumerate(ids)],
+            )
+            # A worker that died mid-pass: its leases ran out a minute ago.
+            cursor.execute(
+                f"""
+                UPDATE uptime_monitors
+                SET claimed_by = 'crashed-worker', lease_until = DATE_SUB(NOW(), INTERVAL 60 SECOND)
+                WHERE id IN ({in_list(stale_leases)})
+                """,
+                ids[:stale_leases],
+            )
+        conn.commit()
+    finally:
+        conn.close()
+    return ids
+
+
+def cleanup(project_id):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            for table in ("uptime_heartbeats", "uptime_incidents", "uptime_rollup_minute",
+                          "uptime_rollup_hour", "uptime_rollup_day", "uptime_monitors"):
+                cursor.execute(f"DELETE FROM {table} WHERE project_id = %s", (project_id,))
+            cursor.execute("DELETE FROM projects WHERE id = %s", (project_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _counts(cursor, monitor_id):
+    """(heartbeats, minute rollup check_count) recorded for the monitor."""
+    cursor.execute("SELECT COUNT(*) AS n FROM uptime_heartbeats WHERE monitor_id = %s", (monitor_id,))
+    heartbeats = cursor.fetchone()["n"]
+    cursor.execute(
+        "SELECT COALESCE(SUM(check_count), 0) AS n FROM uptime_rollup_minute WHERE monitor_id = %s",
+        (monitor_id,),
+    )
+    return heartbeats, int(cursor.fetchone()["n"])
+
+
+def check_takeover(project_id, monitor_id):
+    """
+    Worker "slow" leases a monitor and its lease runs out; worker "fast"
+    takes it over. When "slow" finally writes its result, the monitor must
+    still be leased to "fast" with its schedule untouched, and no heartbeat
+    or rollup count may be added for it. Returns an error message, or None.
+    """
+    import datetime
+    from functions.system import _claim_due_monitors, _release_monitors
+    from functions.uptime_writer import UptimeResultWriter
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "UPDATE uptime_monitors SET next_check_at = NULL, claimed_by = NULL, lease_until = NULL WHERE id = %s",
+                (monitor_id,),
+            )
+            heartbeats_before, rollup_checks_before = _counts(cursor, monitor_id)
+        conn.commit()
+    finally:
+        conn.close()
+
+    if not _claim_due_monitors(1, "slow", 1, monitor_ids=[monitor_id]):
+        return "slow worker could not claim the monitor"
+    time.sleep(2.5)  # lease_until has one-second resolution
+    if not _claim_due_monitors(1, "fast", 60, monitor_ids=[monitor_id]):
+        return "fast worker could not take over the expired lease"
+
+    with UptimeResultWriter(worker_id="slow") as writer:
+        writer.add({
+            "monitor_id": monitor_id, "project_id": project_id, "checked_at": datetime.datetime.now(),
+            "interval_seconds": 3600, "hb_status": "up", "status_code": 200, "response_time_ms": 1,
+            "error_message": None, "prev_status": "up", "new_status": "up", "consecutive_failures": 0,
+        })
+        writer.flush()
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT claimed_by, next_check_at FROM uptime_monitors WHERE id = %s", (monitor_id,))
+            row = cursor.fetchone()
+            heartbeats_after, rollup_checks_after = _counts(cursor, monitor_id)
+    finally:
+        conn.close()
+    _release_monitors("fast", [monitor_id])
+    if heartbeats_after != heartbeats_before:
+        return "late result from the expired lease added a heartbeat"
+    if rollup_checks_after != rollup_checks_before:
+        return "late result from the expired lease was counted in the rollups"
+    if row["claimed_by"] != "fast":
+        return f"late result from the expired lease left claimed_by={row['claimed_by']!r}"
+    if row["next_check_at"] is not None:
+        return "late result from the expired lease moved next_check_at"
+    return None
+
+
+def worker(index, batch_size, claimed):
+    from functions.system import process_due_uptime_monitors_once
+
+    total = 0
+    while True:
+        n = process_due_uptime_monitors_once(max_monitors=batch_size, worker_id=f"bench-{index}")
+        if not n:
+            break
+        total += n
+    claimed[index] = total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--monitors", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=25)
+    parser.add_argument("--stale-leases", type=int, default=20)
+    parser.add_argument("--latency-ms", type=int, default=20)
+    args = parser.parse_args()
+
+    hits = Counter()
+    server = start_stub_server(args.latency_ms, hits)
+    project_id = new_id()
+    ids = seed(project_id, server.server_address[1], args.monitors, min(args.stale_leases, args.monitors))
+
+    try:
+        ctx = multiprocessing.get_context("fork")
+        claimed = ctx.Manager().dict()
+        start = time.perf_counter()
+        procs = [ctx.Process(target=worker, args=(i, args.batch_size, claimed)) for i in range(args.workers)]
+        for p in procs:
+            p.start()
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT monitor_id, COUNT(*) AS n FROM uptime_heartbeats WHERE project_id = %s GROUP BY monitor_id",
+                    (project_id,),
+                )
+                heartbeats = {r["monitor_id"]: r["n"] for r in cursor.fetchall()}
+                cursor.execute(
+                    """
+                    SELECT monitor_id, SUM(check_count) AS n FROM uptime_rollup_minute
+                    WHERE project_id = %s GROUP BY monitor_id
+                    """,
+                    (project_id,),
+                )
+                rollup_checks = {r["monitor_id"]: int(r["n"]) for r in cursor.fetchall()}
+                cursor.execute(
+                    "SELECT COUNT(*) AS n FROM uptime_monitors WHERE project_id = %s AND claimed_by IS NOT NULL",
+                    (project_id,),
+                )
+                still_leased = cursor.fetchone()["n"]
+        finally:
+            conn.close()
+        takeover_error = check_takeover(project_id, ids[0])
+    finally:
+        server.shutdown()
+        cleanup(project_id)
+
+    per_worker = ", ".join(f"{k}={v}" for k, v in sorted(claimed.items()))
+    print(f"workers={args.workers} monitors={args.monitors} elapsed={elapsed:.2f}s claimed: {per_worker}")
+
+    requested = [hits[f"/{mid}"] for mid in ids]
+    checked = [heartbeats.get(mid, 0) for mid in ids]
+    counted = [rollup_checks.get(mid, 0) for mid in ids]
+    failed = False
+    if any(n != 1 for n in requested):
+        print(f"FAIL: request counts per monitor: {sorted(Counter(requested).items())}")
+        failed = True
+    if any(n != 1 for n in checked):
+        print(f"FAIL: heartbeat counts per monitor: {sorted(Counter(checked).items())}")
+        failed = True
+    if any(n != 1 for n in counted):
+        print(f"FAIL: rollup check counts per monitor: {sorted(Counter(counted).items())}")
+        failed = True
+    if still_leased:
+        print(f"FAIL: {still_leased} monitors still leased after the run")
+        failed = True
+    if takeover_error:
+        print(f"FAIL: lease takeover: {takeover_error}")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("OK: every monitor was checked and counted exactly once, including the expired leases, "
+          "and a late result from a lease taken over by another worker wrote nothing")
+
+
+if __name__ == "__main__":
+    main()
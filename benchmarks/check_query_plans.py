@@ -0,0 +1,292 @@
+"""
+Query-plan regression check: runs the hot read paths against the real
+database, EXPLAINs every SELECT they issue and fails if any plan reads a
+whole table (access type ALL).
+
+    python benchmarks/check_query_plans.py
+    python benchmarks/check_query_plans.py --projects 400 --keep
+
+Needs the MySQL database from extensions/extensions.py with the schema set
+up. The SQL is not copied here: each handler runs through the Flask test
+client (and the uptime worker's claim/sync functions are called directly)
+with get_db_connection swapped for a wrapper that EXPLAINs each SELECT
+before executing it. Worker calls are rolled back, so nothing is leased.
+
+Plans depend on table sizes, so a synthetic dataset is seeded first (users,
+projects, subscriptions, monitors, incidents, events, activities) and
+deleted afterwards unless --keep is given.
+"""
+import argparse
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jwt
+from index import app
+from extensions.extensions import get_db_connection
+from extensions.ids import new_id
+from extensions.sql import in_list
+from extensions.search import index_events
+from functions.projects import JWT_SECRET
+import functions.alerts
+import functions.dashboard
+import functions.events
+import functions.monitors
+import functions.projects
+import functions.system
+import functions.uptime_scheduler
+
+PATCHED_MODULES = (
+    functions.alerts,
+    functions.dashboard,
+    functions.events,
+    functions.monitors,
+    functions.projects,
+    functions.system,
+    functions.uptime_scheduler,
+)
+
+
+class ExplainingCursor:
+    def __init__(self, conn, cursor):
+        self._conn = conn
+        self._cursor = cursor
+
+    def execute(self, sql, params=None):
+        if sql.lstrip().upper().startswith(("SELECT", "WITH", "(")):
+            with self._conn.raw.cursor() as explain:
+                explain.execute("EXPLAIN " + sql, params)
+                self._conn.plans.append((self._conn.label, sql, explain.fetchall()))
+        return self._cursor.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+
+class ExplainingConnection:
+    """Pooled connection whose SELECTs are EXPLAINed first; dry_run turns commit into rollback."""
+
+    def __init__(self, raw, plans, label, dry_run):
+        self.raw = raw
+        self.plans = plans
+        self.label = label
+        self.dry_run = dry_run
+
+    def cursor(self, *args, **kwargs):
+        return ExplainingCursor(self, self.raw.cursor(*args, **kwargs))
+
+    def commit(self):
+        if self.dry_run:
+            self.raw.rollback()
+        else:
+            self.raw.commit()
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+def _patch(plans, label, dry_run=False):
+    def connect():
+        raw = get_db_connection()
+        return ExplainingConnection(raw, plans, label, dry_run) if raw else None
+
+    for module in PATCHED_MODULES:
+        module.get_db_connection = connect
+
+
+def seed(n_projects, users_per_project=3):
+    """Returns (user_id, api_key, project_ids, user_ids) for cleanup."""
+    rnd = random.Random(7)
+    now = datetime.datetime.now()
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            n_users = max(4, n_projects // 2)
+            user_ids = [new_id() for _ in range(n_users)]
+            cursor.executemany(
+                "INSERT INTO users (id, email, password_hash, name) VALUES (%s, %s, 'x', 'plan check')",
+                [(uid, f"plan-check-{uid}@example.invalid") for uid in user_ids],
+            )
+            project_ids = [new_id() for _ in range(n_projects)]
+            cursor.executemany(
+                "INSERT INTO projects (id, name, description) VALUES (%s, %s, 'created by check_query_plans.py')",
+                [(pid, f"plan check {i}") for i, pid in enumerate(project_ids)],
+            )
+            subs = set()
+            for pid in project_ids:
+                for uid in rnd.sample(user_ids, users_per_project):
+                    subs.add((uid, pid))
+            cursor.executemany(
+                """
+                INSERT INTO subscriptions (id, user_id, project_id, expires_at, is_active)
+                VALUES (%s, %s, %s, %s, TRUE)
+                """,
+                [(new_id(), uid, pid, now + datetime.timedelta(days=30)) for uid, pid in subs],
+            )
+            user_id = user_ids[0]
+            api_key = new_id()
+            cursor.execute("INSERT INTO api_keys (user_id, api_key) VALUES (%s, %s)", (user_id, api_key))
+
+            monitors = []
+            for pid in project_ids:
+                for i in range(10):
+                    monitors.append((new_id(), pid, f"https://plan-check.invalid/{pid}/{i}",
+                                     now + datetime.timedelta(seconds=rnd.randint(-60, 3600))))
+            cursor.executemany(
+                """
+                INSERT INTO uptime_monitors (id, project_id, name, url, next_check_at)
+                VALUES (%s, %s, 'plan check', %s, %s)
+                """,
+                [(mid, pid, url, nxt) for mid, pid, url, nxt in monitors],
+            )
+            cursor.executemany(
+                """
+                INSERT INTO uptime_incidents (id, project_id, monitor_id, status, started_at, started_reason, last_error)
+                VALUES (%s, %s, %s, %s, %s, 'down', 'plan check')
+                """,
+                [
+                    (new_id(), pid, mid, rnd.choice(("open", "resolved", "resolved")),
+                     now - datetime.timedelta(minutes=rnd.randint(1, 60 * 24 * 30)))
+                    for mid, pid, _, _ in monitors
+                    for _ in range(3)
+                ],
+            )
+            events = [
+                {"id": new_id(), "project_id": pid, "type": rnd.choice(("info", "warning", "error")),
+                 "message": "plan check event", "source": "check_query_plans",
+                 "created_at": now - datetime.timedelta(minutes=rnd.randint(1, 60 * 24 * 30))}
+                for pid in project_ids
+                for _ in range(30)
+            ]
+            cursor.executemany(
+                """
+                INSERT INTO events (id, project_id, type, message, source, created_at)
+                VALUES (%(id)s, %(project_id)s, %(type)s, %(message)s, %(source)s, %(created_at)s)
+                """,
+                events,
+            )
+            index_events(cursor, events)
+            cursor.executemany(
+                """
+                INSERT INTO activities (id, user_id, project_id, title, type, created_at)
+                VALUES (%s, %s, %s, 'plan check', 'monitor', %s)
+                """,
+                [
+                    (new_id(), uid, pid, now - datetime.timedelta(minutes=rnd.randint(1, 60 * 24 * 30)))
+                    for uid, pid in subs
+                    for _ in range(10)
+                ],
+            )
+        conn.commit()
+        with conn.cursor() as cursor:
+            for table in ("users", "projects", "subscriptions", "uptime_monitors", "uptime_incidents", "events", "event_terms", "activities"):
+                cursor.execute(f"ANALYZE TABLE {table}")
+                cursor.fetchall()
+    finally:
+        conn.close()
+    return user_id, api_key, project_ids, user_ids
+
+
+def cleanup(project_ids, user_ids):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            p = in_list(len(project_ids))
+            u = in_list(len(user_ids))
+            cursor.execute(f"DELETE FROM activities WHERE project_id IN ({p})", project_ids)
+            cursor.execute(f"DELETE FROM event_terms WHERE project_id IN ({p})", project_ids)
+            cursor.execute(f"DELETE FROM events WHERE project_id IN ({p})", project_ids)
+            cursor.execute(f"DELETE FROM uptime_incidents WHERE project_id IN ({p})", project_ids)
+            cursor.execute(f"DELETE FROM uptime_monitors WHERE project_id IN ({p})", project_ids)
+            cursor.execute(f"DELETE FROM subscriptions WHERE project_id IN ({p})", project_ids)
+            cursor.execute(f"DELETE FROM api_keys WHERE user_id IN ({u})", user_ids)
+            cursor.execute(f"DELETE FROM projects WHERE id IN ({p})", project_ids)
+            cursor.execute(f"DELETE FROM users WHERE id IN ({u})", user_ids)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def collect_plans(user_id, api_key, project_id):
+    plans = []
+    client = app.test_client()
+    bearer = {"Authorization": f"Bearer {jwt.encode({'id': user_id}, JWT_SECRET, algorithm='HS256')}"}
+    sdk = {"X-Watchup-Project": project_id, "X-Watchup-Key": api_key}
+
+    requests_to_run = [
+        ("GET /projects/", "/projects/", bearer),
+        ("GET /monitors", "/monitors", bearer),
+        ("GET /alerts/", "/alerts/", bearer),
+        ("GET /alerts/?status=active", "/alerts/?status=active", bearer),
+        ("GET /events/", "/events/", bearer),
+        ("GET /events/?type=error", "/events/?type=error", bearer),
+        ("GET /events/?q=plan", "/events/?q=plan", bearer),
+        ("GET /dashboard/stats", "/dashboard/stats", bearer),
+        ("GET /dashboard/charts", "/dashboard/charts", bearer),
+        ("GET /dashboard/activity", "/dashboard/activity", bearer),
+        ("GET /v1/monitors", "/v1/monitors", sdk),
+    ]
+    for label, path, headers in requests_to_run:
+        _patch(plans, label)
+        resp = client.get(path, headers=headers)
+        if resp.status_code != 200:
+            print(f"warning: {label} returned {resp.status_code}")
+
+    _patch(plans, "worker: claim due monitors", dry_run=True)
+    functions.system._claim_due_monitors(functions.system.UPTIME_BATCH_SIZE, "plan-check", 1)
+
+    _patch(plans, "scheduler: sync", dry_run=True)
+    scheduler = functions.uptime_scheduler.UptimeScheduler(lambda ids: {}, 1)
+    scheduler._watermark = datetime.datetime.now()
+    scheduler.sync()
+    return plans
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--keep", action="store_true", help="keep the seeded rows")
+    args = parser.parse_args()
+
+    user_id, api_key, project_ids, user_ids = seed(args.projects)
+    try:
+        conn = get_db_connection()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT project_id FROM subscriptions WHERE user_id = %s LIMIT 1", (user_id,))
+                project_id = cursor.fetchone()["project_id"]
+        finally:
+            conn.close()
+        plans = collect_plans(user_id, api_key, project_id)
+    finally:
+        if not args.keep:
+            cleanup(project_ids, user_ids)
+
+    failures = 0
+    for label, sql, rows in plans:
+        for row in rows:
+            table = row.get("table") or ""
+            scan = row.get("type") == "ALL" and not table.startswith("<")
+            marker = "FULL SCAN" if scan else "ok"
+            print(f"{marker:9} {label:32} {table:24} type={row.get('type')} key={row.get('key')} rows={row.get('rows')}")
+            if scan:
+                failures += 1
+                print("          " + " ".join(sql.split())[:300])
+
+    if failures:
+        print(f"FAIL: {failures} full table scans in hot queries")
+        sys.exit(1)
+    print(f"OK: {len(plans)} queries, no full table scans")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+import os
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from pymysql.constants import SERVER_STATUS
+
+
+class PoolExhausted(Exception):
+    pass
+
+
+class PooledConnection:
+    """
+    Thin proxy around a pymysql connection checked out of a ConnectionPool.
+    Everything (cursor(), commit(), rollback(), ...) is forwarded to the
+    real connection; close() hands it back to the pool instead of closing
+    the socket.
+    """
+
+    def __init__(self, pool, raw, created_at, generation):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._generation = generation
+
+    def __getattr__(self, name):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise AttributeError(f"connection already returned to pool (accessing {name!r})")
+        return getattr(raw, name)
+
+    def close(self):
+        self._pool._release(self)
+
+    def discard(self):
+        """
+        Closes the connection instead of returning it, e.g. when an
+        unbuffered result is still being sent: reading it off just to
+        reuse the connection can cost far more than a new one.
+        """
+        self._pool._release(self, keep=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and self._raw is not None:
+            try:
+                self._raw.rollback()
+            except Exception:
+                pass
+        self.close()
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of pymysql connections.
+
+    - keeps at least `min_size` connections open once first used and never
+      more than `max_size` in total; callers wait up to `timeout_seconds`
+      for a free one before PoolExhausted is raised
+    - pings a connection on checkout if it sat idle longer than
+      `ping_after_seconds`, replacing it if the ping fails
+    - replaces connections older than `recycle_seconds`
+    - rolls back any open transaction when a connection is returned
+    - starts over with an empty pool after a fork (gunicorn preload), since
+      sockets inherited from the parent must not be shared
+    """
+
+    def __init__(self, factory, min_size=1, max_size=10, recycle_seconds=3600, timeout_seconds=5.0, ping_after_seconds=5.0):
+        self._factory = factory
+        self.min_size = max(0, int(min_size))
+        self.max_size = max(1, int(max_size), self.min_size)
+        self.recycle_seconds = float(recycle_seconds)
+        self.timeout_seconds = float(timeout_seconds)
+        self.ping_after_seconds = float(ping_after_seconds)
+
+        self._cond = threading.Condition()
+        self._generation = 0
+        self._reset_state()
+
+    def _reset_state(self):
+        self._generation += 1
+        self._pid = os.getpid()
+        self._idle = deque()  # (raw, created_at, last_used)
+        self._size = 0
+        self._in_use = 0
+        self._warmed = False
+        self._counters = {
+            "checkouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "failed_pings": 0,
+            "waits": 0,
+            "exhausted": 0,
+            "peak_in_use": 0,
+        }
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # Drop (not close) inherited connections: close() would send
+            # COM_QUIT over a socket the parent is still using.
+            self._reset_state()
+
+    def _new_raw(self):
+        raw = self._factory()
+        with self._cond:
+            self._counters["created"] += 1
+        return raw
+
+    def _warm(self):
+        with self._cond:
+            if self._warmed:
+                return
+            self._warmed = True
+            missing = self.min_size - self._size
+            self._size += max(0, missing)
+        created = 0
+        try:
+            for _ in range(max(0, missing)):
+                raw = self._new_raw()
+                now = time.monotonic()
+                with self._cond:
+                    self._idle.append((raw, now, now))
+                    self._cond.notify()
+                created += 1
+        except Exception as e:
+            print(f"Database pool warm-up failed: {e}")
+            with self._cond:
+                self._size -= missing - created
+
+    def acquire(self, timeout=None):
+        with self._cond:
+            self._check_pid()
+        self._warm()
+
+        timeout = self.timeout_seconds if timeout is None else float(timeout)
+        deadline = time.monotonic() + timeout
+        entry = None
+        waited = False
+
+        with self._cond:
+            self._counters["checkouts"] += 1
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                if not waited:
+                    waited = True
+                    self._counters["waits"] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["exhausted"] += 1
+                    raise PoolExhausted(f"no database connection free after {timeout:.1f}s (max_size={self.max_size})")
+                self._cond.wait(remaining)
+
+        try:
+            raw, created_at = self._validate(entry)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._in_use += 1
+            if self._in_use > self._counters["peak_in_use"]:
+                self._counters["peak_in_use"] = self._in_use
+        return PooledConnection(self, raw, created_at, self._generation)
+
+    def _validate(self, entry):
+        now = time.monotonic()
+        if entry is None:
+            return self._new_raw(), now
+
+        raw, created_at, last_used = entry
+        if now - created_at >= self.recycle_seconds:
+            self._close_quietly(raw)
+            with self._cond:
+                self._counters["recycled"] += 1
+            return self._new_raw(), now
+
+        if now - last_used >= self.ping_after_seconds:
+            try:
+                raw.ping(reconnect=False)
+            except Exception:
+                self._close_quietly(raw)
+                with self._cond:
+                    self._counters["failed_pings"] += 1
+                return self._new_raw(), now
+
+        return raw, created_at
+
+    def _release(self, pooled, keep=True):
+        raw = pooled._raw
+        if raw is None:
+            return
+        pooled._raw = None
+
+        with self._cond:
+            self._check_pid()
+            if pooled._generation != self._generation:
+                return
+
+        keep = keep and bool(raw.open)
+        if keep and raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            try:
+                raw.rollback()
+            except Exception:
+                keep = False
+
+        with self._cond:
+            self._in_use -= 1
+            if keep:
+                self._idle.append((raw, pooled._created_at, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+
+        if not keep:
+            self._close_quietly(raw)
+
+    @staticmethod
+    def _close_quietly(raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self, timeout=None):
+        conn = self.acquire(timeout=timeout)
+        try:
+            yield conn
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._counters)
+            data.update(
+                {
+                    "size": self._size,
+                    "idle": len(self._idle),
+                    "in_use": self._in_use,
+                    "min_size": self.min_size,
+                    "max_size": self.max_size,
+                }
+            )
+        return data
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for raw, _, _ in idle:
+            self._close_quietly(raw)
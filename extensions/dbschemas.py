@@ -1,14 +1,44 @@
-from extensions.extensions import get_db_connection
+import time
+from extensions.migrations import (
+    run_migrations, migration_status, backfill, MIGRATION_CHUNK_SIZE, MIGRATION_CHUNK_PAUSE_SECONDS,
+)
+from extensions.search import index_events
+from extensions.partitions import heartbeats_table_sql
+
+def _add_column(cursor, table, column, definition):
+    cursor.execute(
+        """
+        SELECT COUNT(*) AS n FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+        """,
+        (table, column),
+    )
+    if not cursor.fetchone()["n"]:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _add_index(cursor, table, name, kind, columns):
+    cursor.execute(
+        """
+        SELECT COUNT(*) AS n FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+        """,
+        (table, name),
+    )
+    if not cursor.fetchone()["n"]:
+        cursor.execute(f"ALTER TABLE {table} ADD {kind} {name} {columns}")
 
-def setup_database_schemas():
-    conn = None
-    try:
-        conn = get_db_connection()
-        if conn is None:
-            raise Exception("Failed to connect to database")
 
-        cursor = conn.cursor()
+# Migrations are (version, name, step) and are applied in version order by
+# extensions/migrations.py, which records each one in schema_version.
+# Never edit or renumber a migration that has shipped; add a new one.
+# Steps may run again after an interruption, so keep them re-runnable:
+# CREATE ... IF NOT EXISTS, _add_column/_add_index, idempotent backfills.
 
+# CHAR(36) ids are filled with time-ordered UUIDv7 strings from
+# extensions.ids.new_id(); rows created earlier keep their uuid4 values.
+def _initial_schema(conn):
+    with conn.cursor() as cursor:
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 id CHAR(36) PRIMARY KEY,
@@ -28,11 +58,6 @@ def setup_database_schemas():
             ) ENGINE=InnoDB;
         """)
 
-        # cursor.execute("""
-        #     ALTER TABLE users
-        #         ADD COLUMN role_id INT DEFAULT 1;
-        # """)
-
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS subscriptions (
                 id CHAR(36) PRIMARY KEY,
@@ -143,21 +168,9 @@ def setup_database_schemas():
             ) ENGINE=InnoDB;
         """)
 
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS uptime_heartbeats (
-                id CHAR(36) PRIMARY KEY,
-                project_id CHAR(36) NOT NULL,
-                monitor_id CHAR(36) NOT NULL,
-                status VARCHAR(10) NOT NULL,
-                status_code INT,
-                response_time_ms INT,
-                error_message TEXT,
-                checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (project_id) REFERENCES projects(id),
-                FOREIGN KEY (monitor_id) REFERENCES uptime_monitors(id),
-                KEY idx_uptime_hb_monitor_time (monitor_id, checked_at)
-            ) ENGINE=InnoDB;
-        """)
+        # Range-partitioned by checked_at unless HEARTBEAT_PARTITIONING=none;
+        # uptime workers (and the retention pass) keep partitions created ahead.
+        cursor.execute(heartbeats_table_sql())
 
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS uptime_incidents (
@@ -176,19 +189,225 @@ def setup_database_schemas():
             ) ENGINE=InnoDB;
         """)
 
+        # Per-monitor heartbeat rollups, written by the uptime worker in the
+        # same transaction as the heartbeats themselves.
+        for table in ("uptime_rollup_minute", "uptime_rollup_hour", "uptime_rollup_day"):
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    monitor_id CHAR(36) NOT NULL,
+                    bucket_start DATETIME NOT NULL,
+                    project_id CHAR(36) NOT NULL,
+                    check_count INT NOT NULL DEFAULT 0,
+                    up_count INT NOT NULL DEFAULT 0,
+                    latency_count INT NOT NULL DEFAULT 0,
+                    latency_sum BIGINT NOT NULL DEFAULT 0,
+                    latency_min INT NULL,
+                    latency_max INT NULL,
+                    latency_sketch MEDIUMTEXT,
+                    PRIMARY KEY (monitor_id, bucket_start),
+                    KEY idx_{table}_project_bucket (project_id, bucket_start)
+                ) ENGINE=InnoDB;
+            """)
+
+        # Heartbeats at or after rolled_up_since are already in the rollups.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS uptime_rollup_state (
+                id TINYINT PRIMARY KEY,
+                rolled_up_since DATETIME NOT NULL
+            ) ENGINE=InnoDB;
+        """)
+
+
+# SDK errors are recorded as incidents without a monitor (formerly
+# migrate_incidents_standalone.py).
+def _incidents_monitor_optional(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT IS_NULLABLE AS nullable FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'uptime_incidents' AND COLUMN_NAME = 'monitor_id'
+            """
+        )
+        if cursor.fetchone()["nullable"] != "YES":
+            cursor.execute("ALTER TABLE uptime_incidents MODIFY monitor_id CHAR(36) NULL")
+
+
+# Uptime worker leases (see _claim_due_monitors in functions/system.py).
+# The in-memory scheduler syncs from rows whose updated_at moved.
+def _uptime_worker_leases(conn):
+    with conn.cursor() as cursor:
+        _add_column(cursor, "uptime_monitors", "claimed_by", "VARCHAR(128) NULL")
+        _add_column(cursor, "uptime_monitors", "lease_until", "TIMESTAMP NULL")
+        _add_index(cursor, "uptime_monitors", "idx_uptime_monitors_updated", "KEY", "(updated_at)")
+
+
+# Phase timings of each check (see functions/uptime_engine.probe_url)
+def _heartbeat_phase_timings(conn):
+    with conn.cursor() as cursor:
+        for column in ("dns_ms", "connect_ms", "tls_ms", "ttfb_ms"):
+            _add_column(cursor, "uptime_heartbeats", column, "INT NULL")
+
+
+# SDK errors are grouped into one issue per fingerprint (see
+# functions/issues.py); monitor incidents leave fingerprint NULL.
+def _issue_fingerprints(conn):
+    with conn.cursor() as cursor:
+        _add_column(cursor, "uptime_incidents", "fingerprint", "CHAR(40) NULL")
+        _add_column(cursor, "uptime_incidents", "occurrences", "INT NOT NULL DEFAULT 1")
+        _add_column(cursor, "uptime_incidents", "last_seen_at", "TIMESTAMP NULL")
+        _add_index(cursor, "uptime_incidents", "uq_uptime_inc_fingerprint", "UNIQUE KEY", "(project_id, fingerprint)")
+
+
+# Composite indexes for the hot queries. benchmarks/check_query_plans.py
+# EXPLAINs those queries and fails if any of them scans a whole table.
+def _hot_query_indexes(conn):
+    with conn.cursor() as cursor:
+        for table, name, columns in (
+            # Uptime worker: is_active = TRUE AND deleted_at IS NULL AND next_check_at <= NOW()
+            # ORDER BY next_check_at, read straight off the index
+            ("uptime_monitors", "idx_uptime_monitors_due", "(is_active, deleted_at, next_check_at)"),
+            ("uptime_monitors", "idx_uptime_monitors_project_created", "(project_id, deleted_at, created_at)"),
+            ("subscriptions", "idx_subscriptions_user_project", "(user_id, project_id)"),
+            ("events", "idx_events_project_created", "(project_id, created_at)"),
+            ("uptime_incidents", "idx_uptime_inc_project_status_started", "(project_id, status, started_at)"),
+            ("activities", "idx_activities_user_created", "(user_id, created_at)"),
+            ("activities", "idx_activities_project_created", "(project_id, created_at)"),
+        ):
+            _add_index(cursor, table, name, "KEY", columns)
+
+
+# Daily per-project SDK ingestion counters, flushed from memory by
+# functions/ingestion.py.
+def _ingestion_stats(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingestion_stats (
+                project_id CHAR(36) NOT NULL,
+                day DATE NOT NULL,
+                accepted INT NOT NULL DEFAULT 0,
+                sampled_out INT NOT NULL DEFAULT 0,
+                over_quota INT NOT NULL DEFAULT 0,
+                PRIMARY KEY (project_id, day)
+            ) ENGINE=InnoDB;
+        """)
+
+
+# SDK issues recorded before grouping have no last_seen_at; give them
+# their start time, as record_issues does for new ones.
+def _issue_last_seen_backfill(conn):
+    backfill(
+        conn,
+        "uptime_incidents",
+        "last_seen_at = started_at",
+        "monitor_id IS NULL AND last_seen_at IS NULL",
+    )
+
+
+# Uptime state changes for the SSE stream, tailed by functions/live.py and
+# trimmed after LIVE_EVENTS_KEEP_SECONDS.
+def _live_events(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS live_events (
+                id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+                project_id CHAR(36) NOT NULL,
+                kind VARCHAR(32) NOT NULL,
+                payload TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                KEY idx_live_events_created (created_at)
+            ) ENGINE=InnoDB;
+        """)
+
+
+# Keyset pagination of alerts: (project_id, started_at) plus the implicit
+# primary key gives the (started_at, id) order per project.
+def _incident_page_index(conn):
+    with conn.cursor() as cursor:
+        _add_index(cursor, "uptime_incidents", "idx_uptime_inc_project_started", "KEY", "(project_id, started_at)")
 
-        # cursor.execute("""
-        #     ALTER TABLE subscriptions
-        #         ADD COLUMN subscription_type VARCHAR(255) DEFAULT 'pro';
-        # """)
 
+# Inverted index for event search (see extensions/search.py): one row per
+# distinct word of an event, so a search is a prefix range read of
+# (project_id, term) per word and only touches the user's projects.
+# Existing events are indexed in primary-key chunks; an interrupted run
+# starts over, and rows already written are skipped (INSERT IGNORE).
+def _event_terms(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS event_terms (
+                project_id CHAR(36) NOT NULL,
+                term VARCHAR(32) NOT NULL,
+                created_at TIMESTAMP NOT NULL,
+                event_id CHAR(36) NOT NULL,
+                PRIMARY KEY (project_id, term, created_at, event_id)
+            ) ENGINE=InnoDB;
+        """)
+    conn.commit()
+
+    last_id = ""
+    indexed = 0
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT id, project_id, message, source, created_at FROM events
+                WHERE id > %s ORDER BY id LIMIT %s
+                """,
+                (last_id, MIGRATION_CHUNK_SIZE),
+            )
+            events = cursor.fetchall()
+            if events:
+                index_events(cursor, events)
         conn.commit()
-        print("✅ Database schema setup completed")
+        if not events:
+            break
+        indexed += len(events)
+        last_id = events[-1]["id"]
+        if len(events) < MIGRATION_CHUNK_SIZE:
+            break
+        time.sleep(MIGRATION_CHUNK_PAUSE_SECONDS)
+    print(f"Indexed {indexed} events for search")
 
+
+# Project-wide heartbeat exports read (project_id, checked_at) ranges in
+# order; partitioned tables are created with this index already.
+def _heartbeat_project_index(conn):
+    with conn.cursor() as cursor:
+        _add_index(cursor, "uptime_heartbeats", "idx_uptime_hb_project_time", "KEY", "(project_id, checked_at)")
+
+
+MIGRATIONS = [
+    (1, "initial schema", _initial_schema),
+    (2, "uptime_incidents.monitor_id nullable", _incidents_monitor_optional),
+    (3, "uptime worker leases", _uptime_worker_leases),
+    (4, "heartbeat phase timings", _heartbeat_phase_timings),
+    (5, "issue fingerprints", _issue_fingerprints),
+    (6, "hot query indexes", _hot_query_indexes),
+    (7, "ingestion_stats", _ingestion_stats),
+    (8, "backfill SDK issue last_seen_at", _issue_last_seen_backfill),
+    (9, "live_events", _live_events),
+    (10, "uptime_incidents pagination index", _incident_page_index),
+    (11, "event search terms", _event_terms),
+    (12, "uptime_heartbeats project/time index", _heartbeat_project_index),
+]
+
+
+def setup_database_schemas(target=None):
+    try:
+        applied = run_migrations(MIGRATIONS, target)
+        if applied:
+            print(f"✅ Database schema migrated to version {applied[-1]}")
     except Exception as e:
         print(f"❌ Database schema setup failed: {e}")
         raise
 
-    finally:
-        if conn:
-            conn.close()
+
+def migrate_command(args):
+    """`python index.py --migrate [status | <version>]`"""
+    if args and args[0] == "status":
+        for version, name, applied_at in migration_status(MIGRATIONS):
+            print(f"{version:>4}  {'applied ' + str(applied_at) if applied_at else 'pending':28}  {name}")
+        return
+    target = int(args[0]) if args else None
+    applied = run_migrations(MIGRATIONS, target)
+    print(f"Applied {len(applied)} migrations" + (f" (now at version {applied[-1]})" if applied else ""))
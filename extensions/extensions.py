@@ -4,6 +4,7 @@ import os
 from dotenv import load_dotenv
 from flask_mail import Mail, Message
 from flask_cors import CORS
+from extensions.db_pool import ConnectionPool
 
 load_dotenv()
 
@@ -11,18 +12,30 @@ app = Flask(__name__)
 
 CORS(app, origins="*")
 
+def _connect():
+    return pymysql.connect(
+        host= "148.113.201.195",
+        user= "admin",
+        password="Pityboy@22",
+        database=os.getenv("DB_NAME", "watchup"),
+        port=int(os.getenv("DB_PORT", 3306)),
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+# Shared by every blueprint and the uptime worker. Connections handed out by
+# get_db_connection() go back to the pool on close().
+db_pool = ConnectionPool(
+    _connect,
+    min_size=int(os.getenv("DB_POOL_MIN_SIZE", 1)),
+    max_size=int(os.getenv("DB_POOL_MAX_SIZE", 10)),
+    recycle_seconds=int(os.getenv("DB_POOL_RECYCLE_SECONDS", 3600)),
+    timeout_seconds=float(os.getenv("DB_POOL_TIMEOUT_SECONDS", 5)),
+    ping_after_seconds=float(os.getenv("DB_POOL_PING_AFTER_SECONDS", 5)),
+)
+
 def get_db_connection():
     try:
-        print("Trying to connect to MYSQL database")
-        connection = pymysql.connect(
-            host= "148.113.201.195",
-            user= "admin",
-            password="Pityboy@22",
-            database=os.getenv("DB_NAME", "watchup"),
-            port=int(os.getenv("DB_PORT", 3306)),
-            cursorclass=pymysql.cursors.DictCursor
-        )
-        return connection
+        return db_pool.acquire()
     except Exception as e:
         print(f"Database connection failed: {str(e)}")
         return None
@@ -0,0 +1,155 @@
+import os
+import time
+import uuid
+import threading
+from datetime import datetime
+
+# Storage for uptime_heartbeats.id on newly created tables: "char" keeps
+# CHAR(36) text, "binary" stores the same UUID as BINARY(16). Existing
+# tables are detected (see heartbeat_id_is_binary) rather than assumed.
+HEARTBEAT_ID_STORAGE = os.getenv("HEARTBEAT_ID_STORAGE", "char").lower()
+
+_lock = threading.Lock()
+_last_ms = 0
+_seq = 0
+
+
+def uuid7():
+    """
+    RFC 9562 UUIDv7: 48-bit Unix millisecond timestamp, then a 12-bit
+    sequence and 62 random bits. IDs from one process are strictly
+    increasing (the sequence breaks ties within a millisecond), and IDs
+    from different processes are ordered to the millisecond, so InnoDB
+    appends them at the right edge of the clustered index instead of
+    splitting random pages.
+    """
+    global _last_ms, _seq
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            # Random start, leaving headroom for ties in this millisecond.
+            _seq = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        else:
+            _seq += 1
+            if _seq > 0xFFF:
+                _last_ms += 1
+                _seq = 0
+            ms = _last_ms
+        seq = _seq
+
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms & ((1 << 48) - 1)) << 80
+    value |= 0x7 << 76
+    value |= seq << 64
+    value |= 0b10 << 62
+    value |= rand_b
+    return uuid.UUID(int=value)
+
+
+def new_id():
+    """Time-ordered ID as the 36-character string stored in CHAR(36) columns."""
+    return str(uuid7())
+
+
+def new_id_bytes():
+    """Time-ordered ID as 16 raw bytes for BINARY(16) columns."""
+    return uuid7().bytes
+
+
+def id_to_bytes(value):
+    return uuid.UUID(str(value)).bytes
+
+
+def bytes_to_id(value):
+    return str(uuid.UUID(bytes=bytes(value)))
+
+
+def id_datetime(value):
+    """Creation time embedded in a UUIDv7 (None for older uuid4 IDs)."""
+    u = value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+    if u.version != 7:
+        return None
+    return datetime.fromtimestamp((u.int >> 80) / 1000.0)
+
+
+_heartbeat_id_binary = None
+
+
+def heartbeat_id_is_binary(cursor):
+    """Whether uptime_heartbeats.id is BINARY(16); looked up once per process."""
+    global _heartbeat_id_binary
+    if _heartbeat_id_binary is None:
+        cursor.execute(
+            """
+            SELECT DATA_TYPE AS data_type
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'uptime_heartbeats' AND COLUMN_NAME = 'id'
+            """
+        )
+        row = cursor.fetchone()
+        _heartbeat_id_binary = bool(row and row["data_type"].lower() == "binary")
+    return _heartbeat_id_binary
+
+
+def convert_heartbeat_ids_to_binary(conn):
+    """
+    Moves an existing uptime_heartbeats.id from CHAR(36) to BINARY(16).
+    Old uuid4 values convert byte-for-byte. The copy is done one monitor
+    at a time to keep transactions short; stop the uptime worker first,
+    since rows inserted mid-copy would have no binary id.
+    """
+    global _heartbeat_id_binary
+    with conn.cursor() as cursor:
+        if heartbeat_id_is_binary(cursor):
+            print("uptime_heartbeats.id is already BINARY(16)")
+            return
+
+        cursor.execute(
+            """
+            SELECT COUNT(*) AS n
+            FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'uptime_heartbeats' AND COLUMN_NAME = 'id_bin'
+            """
+        )
+        if not cursor.fetchone()["n"]:
+            cursor.execute("ALTER TABLE uptime_heartbeats ADD COLUMN id_bin BINARY(16) NULL")
+
+        cursor.execute("SELECT id FROM uptime_monitors")
+        monitor_ids = [r["id"] for r in cursor.fetchall()]
+    conn.commit()
+
+    for monitor_id in monitor_ids:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE uptime_heartbeats
+                SET id_bin = UNHEX(REPLACE(id, '-', ''))
+                WHERE monitor_id = %s AND id_bin IS NULL
+                """,
+                (monitor_id,),
+            )
+        conn.commit()
+
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT COLUMN_NAME AS name
+            FROM information_schema.KEY_COLUMN_USAGE
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'uptime_heartbeats' AND CONSTRAINT_NAME = 'PRIMARY'
+            ORDER BY ORDINAL_POSITION
+            """
+        )
+        pk_columns = ", ".join(r["name"] for r in cursor.fetchall())
+        cursor.execute(
+            f"""
+            ALTER TABLE uptime_heartbeats
+                DROP PRIMARY KEY,
+                DROP COLUMN id,
+                CHANGE id_bin id BINARY(16) NOT NULL FIRST,
+                ADD PRIMARY KEY ({pk_columns})
+            """
+        )
+    conn.commit()
+    _heartbeat_id_binary = True
+    print("✅ uptime_heartbeats.id converted to BINARY(16)")
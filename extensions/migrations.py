@@ -0,0 +1,141 @@
+import os
+import time
+from extensions.extensions import get_db_connection
+
+MIGRATION_LOCK_TIMEOUT_SECONDS = int(os.getenv("MIGRATION_LOCK_TIMEOUT_SECONDS", 60))
+MIGRATION_CHUNK_SIZE = int(os.getenv("MIGRATION_CHUNK_SIZE", 1000))
+MIGRATION_CHUNK_PAUSE_SECONDS = float(os.getenv("MIGRATION_CHUNK_PAUSE_SECONDS", 0.05))
+
+_LOCK_NAME = "watchup_schema_migrations"
+
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms INT NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB;
+    """)
+
+
+def applied_versions(cursor):
+    _ensure_version_table(cursor)
+    cursor.execute("SELECT version FROM schema_version")
+    return {r["version"] for r in cursor.fetchall()}
+
+
+def pending_migrations(migrations, applied, target=None):
+    return [
+        m for m in sorted(migrations, key=lambda m: m[0])
+        if m[0] not in applied and (target is None or m[0] <= target)
+    ]
+
+
+def run_migrations(migrations, target=None):
+    """
+    Applies every migration in `migrations` (a list of (version, name,
+    step)) that isn't recorded in schema_version yet, in version order,
+    up to `target` if given. `step(conn)` runs the migration; each one is
+    recorded once it finishes, so an up-to-date database costs one query.
+
+    MySQL commits DDL implicitly, so a step interrupted halfway runs again
+    from the start next time: steps must be safe to re-run. A named lock
+    keeps processes started together from migrating at the same time.
+    Returns the versions applied.
+    """
+    conn = get_db_connection()
+    if conn is None:
+        raise Exception("Failed to connect to database")
+    try:
+        with conn.cursor() as cursor:
+            if not pending_migrations(migrations, applied_versions(cursor), target):
+                conn.commit()
+                return []
+            cursor.execute("SELECT GET_LOCK(%s, %s) AS locked", (_LOCK_NAME, MIGRATION_LOCK_TIMEOUT_SECONDS))
+            if not cursor.fetchone()["locked"]:
+                raise Exception("Timed out waiting for another process to finish migrating")
+        conn.commit()
+
+        done = []
+        try:
+            with conn.cursor() as cursor:
+                # Re-read under the lock: another process may have just finished.
+                pending = pending_migrations(migrations, applied_versions(cursor), target)
+            conn.commit()
+            for version, name, step in pending:
+                print(f"Migrating to {version}: {name}")
+                start = time.monotonic()
+                step(conn)
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO schema_version (version, name, duration_ms) VALUES (%s, %s, %s)",
+                        (version, name, int((time.monotonic() - start) * 1000)),
+                    )
+                conn.commit()
+                done.append(version)
+        finally:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (_LOCK_NAME,))
+            conn.commit()
+        return done
+    finally:
+        conn.close()
+
+
+def migration_status(migrations):
+    """Returns [(version, name, applied_at or None)] in version order."""
+    conn = get_db_connection()
+    if conn is None:
+        raise Exception("Failed to connect to database")
+    try:
+        with conn.cursor() as cursor:
+            _ensure_version_table(cursor)
+            cursor.execute("SELECT version, applied_at FROM schema_version")
+            applied = {r["version"]: r["applied_at"] for r in cursor.fetchall()}
+        conn.commit()
+    finally:
+        conn.close()
+    return [(v, name, applied.get(v)) for v, name, _ in sorted(migrations, key=lambda m: m[0])]
+
+
+def backfill(conn, table, assignments, where, key="id", chunk_size=None, pause_seconds=None):
+    """
+    Online backfill: runs `UPDATE table SET assignments WHERE where` one
+    primary-key range of `chunk_size` rows at a time, committing each
+    range, so no transaction holds many row locks and replicas keep up.
+    `where` must stop matching rows once they are updated; an interrupted
+    backfill then just starts over and skips what is done.
+    Returns the number of rows updated.
+    """
+    chunk_size = int(chunk_size or MIGRATION_CHUNK_SIZE)
+    pause_seconds = MIGRATION_CHUNK_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+    last_key = None
+    updated = 0
+    while True:
+        with conn.cursor() as cursor:
+            if last_key is None:
+                cursor.execute(f"SELECT {key} AS k FROM {table} ORDER BY {key} LIMIT %s", (chunk_size,))
+            else:
+                cursor.execute(
+                    f"SELECT {key} AS k FROM {table} WHERE {key} > %s ORDER BY {key} LIMIT %s",
+                    (last_key, chunk_size),
+                )
+            keys = [r["k"] for r in cursor.fetchall()]
+            if not keys:
+                conn.commit()
+                break
+            cursor.execute(
+                f"UPDATE {table} SET {assignments} WHERE {key} >= %s AND {key} <= %s AND ({where})",
+                (keys[0], keys[-1]),
+            )
+            updated += cursor.rowcount
+        conn.commit()
+        last_key = keys[-1]
+        if len(keys) < chunk_size:
+            break
+        if pause_seconds:
+            time.sleep(pause_seconds)
+    print(f"Backfilled {updated} rows in {table}")
+    return updated
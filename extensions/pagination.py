@@ -0,0 +1,86 @@
+import json
+import base64
+from datetime import datetime
+
+
+def encode_cursor(sort_value, row_id, score=None):
+    """
+    Opaque token for the position after the row (sort_value, row_id), or
+    (score, sort_value, row_id) for results ranked by a score first.
+    """
+    values = [sort_value.isoformat(), row_id] + ([score] if score is not None else [])
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    Returns (datetime, id), or (datetime, id, score) for a ranked cursor;
+    raises ValueError for anything malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+        after = (datetime.fromisoformat(values[0]), str(values[1]))
+        if len(values) == 3:
+            return after + (float(values[2]),)
+        if len(values) != 2:
+            raise ValueError
+        return after
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def page_args(args, default, maximum):
+    """
+    Reads `limit` and `cursor` from the query string. Returns (limit,
+    after), where `after` is None for the first page; raises ValueError
+    with a message fit for a 400 response.
+    """
+    try:
+        limit = int(args.get("limit", default))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    limit = max(1, min(limit, maximum))
+    token = args.get("cursor")
+    return limit, (decode_cursor(token) if token else None)
+
+
+def keyset_condition(time_column, id_column, ascending=False):
+    """
+    Rows strictly after the cursor in (time DESC, id DESC) order, or ASC
+    with ascending=True. Spelled out rather than as a row comparison so
+    MySQL can range-scan the (..., time) index and stop after one page,
+    however deep.
+    """
+    op = ">" if ascending else "<"
+    return f"({time_column} {op} %s OR ({time_column} = %s AND {id_column} {op} %s))"
+
+
+def keyset_params(after):
+    return [after[0], after[0], after[1]]
+
+
+def ranked_keyset_condition(score_column, time_column, id_column):
+    """Rows after a ranked cursor in (score DESC, time DESC, id DESC) order."""
+    return (
+        f"({score_column} < %s OR ({score_column} = %s AND "
+        + keyset_condition(time_column, id_column)
+        + "))"
+    )
+
+
+def ranked_keyset_params(after):
+    return [after[2], after[2]] + keyset_params(after)
+
+
+def paginate(rows, limit, time_key, id_key="id", score_key=None):
+    """
+    Splits rows fetched with LIMIT limit + 1 into (page, next_cursor);
+    next_cursor is None on the last page.
+    """
+    page = rows[:limit]
+    if len(rows) <= limit:
+        return page, None
+    last = page[-1]
+    return page, encode_cursor(last[time_key], last[id_key], last[score_key] if score_key else None)
@@ -0,0 +1,237 @@
+import os
+import re
+from datetime import datetime, timedelta
+from extensions.ids import HEARTBEAT_ID_STORAGE
+
+# "daily", "weekly" or "none". Only affects how uptime_heartbeats is created
+# (or converted with `python index.py --partition-heartbeats`); an existing
+# unpartitioned table is left alone.
+HEARTBEAT_PARTITIONING = os.getenv("HEARTBEAT_PARTITIONING", "daily").lower()
+HEARTBEAT_PARTITIONS_AHEAD = int(os.getenv("HEARTBEAT_PARTITIONS_AHEAD", 7))
+
+_NAME_RE = re.compile(r"^p(\d{8})$")
+
+
+def _period_start(dt, granularity):
+    day = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == "weekly":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def _step(granularity):
+    return timedelta(days=7 if granularity == "weekly" else 1)
+
+
+def _partition_def(start, granularity):
+    end = start + _step(granularity)
+    return f"PARTITION p{start:%Y%m%d} VALUES LESS THAN (UNIX_TIMESTAMP('{end:%Y-%m-%d %H:%M:%S}'))"
+
+
+def partition_clause(first, last, granularity=None):
+    """
+    PARTITION BY clause with one partition per day/week from `first` to
+    `last` plus a MAXVALUE catch-all, so inserts never fail when the
+    partitions ahead haven't been created yet.
+    """
+    granularity = granularity or HEARTBEAT_PARTITIONING
+    start = _period_start(first, granularity)
+    defs = []
+    while start <= last:
+        defs.append(_partition_def(start, granularity))
+        start += _step(granularity)
+    defs.append("PARTITION p_future VALUES LESS THAN MAXVALUE")
+    return "PARTITION BY RANGE (UNIX_TIMESTAMP(checked_at)) (\n    " + ",\n    ".join(defs) + "\n)"
+
+
+def heartbeats_table_sql(granularity=None):
+    """
+    CREATE TABLE for uptime_heartbeats. Partitioned, the primary key leads
+    with checked_at so inserts append to the newest partition. InnoDB does
+    not allow foreign keys on partitioned tables, so they are dropped there.
+    """
+    granularity = granularity or HEARTBEAT_PARTITIONING
+    id_type = "BINARY(16)" if HEARTBEAT_ID_STORAGE == "binary" else "CHAR(36)"
+    if granularity not in ("daily", "weekly"):
+        return f"""
+            CREATE TABLE IF NOT EXISTS uptime_heartbeats (
+                id {id_type} PRIMARY KEY,
+                project_id CHAR(36) NOT NULL,
+                monitor_id CHAR(36) NOT NULL,
+                status VARCHAR(10) NOT NULL,
+                status_code INT,
+                response_time_ms INT,
+                error_message TEXT,
+                dns_ms INT NULL,
+                connect_ms INT NULL,
+                tls_ms INT NULL,
+                ttfb_ms INT NULL,
+                checked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (project_id) REFERENCES projects(id),
+                FOREIGN KEY (monitor_id) REFERENCES uptime_monitors(id),
+                KEY idx_uptime_hb_monitor_time (monitor_id, checked_at)
+            ) ENGINE=InnoDB;
+        """
+
+    now = datetime.now()
+    return f"""
+        CREATE TABLE IF NOT EXISTS uptime_heartbeats (
+            id {id_type} NOT NULL,
+            project_id CHAR(36) NOT NULL,
+            monitor_id CHAR(36) NOT NULL,
+            status VARCHAR(10) NOT NULL,
+            status_code INT,
+            response_time_ms INT,
+            error_message TEXT,
+            dns_ms INT NULL,
+            connect_ms INT NULL,
+            tls_ms INT NULL,
+            ttfb_ms INT NULL,
+            checked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (checked_at, id),
+            KEY idx_uptime_hb_monitor_time (monitor_id, checked_at),
+            KEY idx_uptime_hb_project_time (project_id, checked_at)
+        ) ENGINE=InnoDB
+        {partition_clause(now, now + timedelta(days=HEARTBEAT_PARTITIONS_AHEAD), granularity)};
+    """
+
+
+def list_partitions(cursor):
+    """Returns [(name, period_start)] for the dated partitions, oldest first."""
+    cursor.execute(
+        """
+        SELECT PARTITION_NAME AS name
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'uptime_heartbeats' AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+        """
+    )
+    result = []
+    for row in cursor.fetchall():
+        m = _NAME_RE.match(row["name"])
+        if m:
+            result.append((row["name"], datetime.strptime(m.group(1), "%Y%m%d")))
+    return result
+
+
+def _granularity_of(partitions):
+    if len(partitions) >= 2 and (partitions[1][1] - partitions[0][1]).days == 7:
+        return "weekly"
+    return "daily" if len(partitions) >= 2 else HEARTBEAT_PARTITIONING
+
+
+def _future_partitions(partitions, ahead_days):
+    """(definitions, names) of the dated partitions missing up to `ahead_days` ahead."""
+    granularity = _granularity_of(partitions)
+    ahead_days = HEARTBEAT_PARTITIONS_AHEAD if ahead_days is None else ahead_days
+
+    horizon = datetime.now() + timedelta(days=ahead_days)
+    start = partitions[-1][1] + _step(granularity)
+    defs, names = [], []
+    while start <= horizon:
+        defs.append(_partition_def(start, granularity))
+        names.append(f"p{start:%Y%m%d}")
+        start += _step(granularity)
+    return defs, names
+
+
+def ensure_future_partitions(cursor, ahead_days=None):
+    """
+    Splits p_future so dated partitions exist `ahead_days` into the future.
+    Cheap as long as p_future is empty, which it is while this keeps up,
+    and a single information_schema read when nothing is missing. Returns
+    the names added (nothing if the table isn't partitioned, or another
+    process is adding them right now).
+    """
+    partitions = list_partitions(cursor)
+    if not partitions or not _future_partitions(partitions, ahead_days)[0]:
+        return []
+    cursor.execute("SELECT GET_LOCK('uptime_heartbeats_partitions', 0) AS locked")
+    if not cursor.fetchone()["locked"]:
+        return []
+    try:
+        # Re-read under the lock: another process may have just added them.
+        defs, names = _future_partitions(list_partitions(cursor), ahead_days)
+        if defs:
+            cursor.execute(
+                "ALTER TABLE uptime_heartbeats REORGANIZE PARTITION p_future INTO ("
+                + ", ".join(defs)
+                + ", PARTITION p_future VALUES LESS THAN MAXVALUE)"
+            )
+        return names
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK('uptime_heartbeats_partitions')")
+        cursor.fetchall()
+
+
+def drop_expired_partitions(cursor, before, rolled_up_since):
+    """
+    Drops every dated partition whose whole range ends at or before
+    `before`. A partition that still holds heartbeats older than
+    `rolled_up_since` (not in the rollups yet) is skipped and left to the
+    chunked retention delete, which downsamples those rows first.
+    """
+    partitions = list_partitions(cursor)
+    if not partitions:
+        return []
+    granularity = _granularity_of(partitions)
+
+    dropped = []
+    for name, start in partitions:
+        end = start + _step(granularity)
+        if end > before:
+            break
+        if start < rolled_up_since:
+            cursor.execute(
+                f"SELECT 1 FROM uptime_heartbeats PARTITION ({name}) WHERE checked_at < %s LIMIT 1",
+                (rolled_up_since,),
+            )
+            if cursor.fetchone():
+                continue
+        cursor.execute(f"ALTER TABLE uptime_heartbeats DROP PARTITION {name}")
+        dropped.append(name)
+    return dropped
+
+
+def convert_heartbeats_to_partitioned(conn, granularity=None):
+    """
+    One-off conversion of an existing unpartitioned uptime_heartbeats:
+    drops its foreign keys, moves the primary key to (checked_at, id) and
+    partitions it. This rebuilds the table, so run it in a quiet window.
+    """
+    granularity = granularity or HEARTBEAT_PARTITIONING
+    if granularity not in ("daily", "weekly"):
+        raise ValueError("HEARTBEAT_PARTITIONING must be 'daily' or 'weekly' to convert")
+
+    with conn.cursor() as cursor:
+        if list_partitions(cursor):
+            print("uptime_heartbeats is already partitioned")
+            return
+
+        cursor.execute(
+            """
+            SELECT CONSTRAINT_NAME AS name
+            FROM information_schema.TABLE_CONSTRAINTS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'uptime_heartbeats'
+              AND CONSTRAINT_TYPE = 'FOREIGN KEY'
+            """
+        )
+        for row in cursor.fetchall():
+            cursor.execute(f"ALTER TABLE uptime_heartbeats DROP FOREIGN KEY {row['name']}")
+
+        cursor.execute("SELECT MIN(checked_at) AS oldest FROM uptime_heartbeats")
+        row = cursor.fetchone()
+        now = datetime.now()
+        oldest = (row and row["oldest"]) or now
+
+        cursor.execute(
+            f"""
+            ALTER TABLE uptime_heartbeats
+                MODIFY checked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                DROP PRIMARY KEY,
+                ADD PRIMARY KEY (checked_at, id)
+            {partition_clause(oldest, now + timedelta(days=HEARTBEAT_PARTITIONS_AHEAD), granularity)}
+            """
+        )
+    conn.commit()
+    print("✅ uptime_heartbeats converted to partitioned storage")
@@ -0,0 +1,151 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class MemoryBucketStore:
+    """
+    Token buckets for this process only. Each key holds (tokens, updated,
+    full_at). A bucket that has refilled completely is equivalent to no
+    bucket at all, so it is evicted; `max_keys` caps the rest (LRU).
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max(1, int(max_keys))
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now, cost=1.0):
+        with self._lock:
+            tokens, updated, _ = self._buckets.pop(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            self._evict(now)
+            return allowed
+
+    def _evict(self, now):
+        # Least recently used first; two probes per call keep this O(1).
+        for _ in range(2):
+            if not self._buckets:
+                return
+            key, (_, _, full_at) = next(iter(self._buckets.items()))
+            if full_at > now:
+                break
+            del self._buckets[key]
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets in a SQLite file, so every gunicorn worker on the host
+    shares the same counts. Each take() is one short IMMEDIATE transaction;
+    refilled buckets are purged every `purge_every` calls.
+    """
+
+    def __init__(self, path, purge_every=1000):
+        self.path = path
+        self.purge_every = max(1, int(purge_every))
+        self._local = threading.local()
+        self._calls = 0
+        with self._conn() as db:
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    full_at REAL NOT NULL
+                )
+                """
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS idx_buckets_full_at ON buckets (full_at)")
+
+    def _conn(self):
+        db = getattr(self._local, "db", None)
+        if db is None or getattr(self._local, "pid", None) != os.getpid():
+            db = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+            self._local.pid = os.getpid()
+        return db
+
+    def take(self, key, capacity, rate, now, cost=1.0):
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            db.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)",
+                (key, tokens, now, now + (capacity - tokens) / rate),
+            )
+            self._calls += 1
+            if self._calls % self.purge_every == 0:
+                db.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+        return allowed
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter with named policies: policy -> (limit, per_seconds).
+    A key may burst up to `limit` requests and refills at limit/per_seconds.
+    """
+
+    def __init__(self, store, policies):
+        self.store = store
+        self.policies = dict(policies)
+        self._lock = threading.Lock()
+        self._counters = {"allowed": 0, "limited": 0, "errors": 0}
+
+    def allow(self, key, policy, cost=1):
+        """Takes `cost` tokens (capped at the burst size) from key's bucket."""
+        limit, per_seconds = self.policies[policy]
+        cost = min(cost, limit)
+        try:
+            allowed = self.store.take(
+                f"{policy}:{key}", float(limit), float(limit) / float(per_seconds), time.time(), cost=float(cost)
+            )
+        except Exception as e:
+            # Fail open: a broken shared store must not take the API down.
+            print(f"Rate limiter error: {e}")
+            with self._lock:
+                self._counters["errors"] += 1
+            return True
+        with self._lock:
+            self._counters["allowed" if allowed else "limited"] += 1
+        return allowed
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+        data["active_keys"] = len(self.store)
+        data["policies"] = {name: {"limit": l, "per_seconds": p} for name, (l, p) in self.policies.items()}
+        return data
+
+
+def store_from_env(spec=None):
+    """RATE_LIMIT_BACKEND: "memory" (default) or "sqlite:/path/to/buckets.db"."""
+    spec = spec or os.getenv("RATE_LIMIT_BACKEND", "memory")
+    if spec.startswith("sqlite:"):
+        return SQLiteBucketStore(spec[len("sqlite:"):])
+    return MemoryBucketStore(max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000)))
@@ -0,0 +1,48 @@
+import re
+from extensions.sql import placeholders
+
+# Longer words are indexed (and searched) by their first SEARCH_TERM_MAX_CHARS
+# characters; an event indexes at most SEARCH_MAX_TERMS_PER_EVENT distinct words.
+SEARCH_TERM_MAX_CHARS = 32
+SEARCH_MAX_TERMS_PER_EVENT = 64
+
+_WORD = re.compile(r"\w+")
+
+
+def search_terms(text):
+    """Distinct lower-cased words of text, in order, cut to SEARCH_TERM_MAX_CHARS."""
+    seen = {}
+    for word in _WORD.findall((text or "").lower()):
+        seen.setdefault(word[:SEARCH_TERM_MAX_CHARS], None)
+    return list(seen)
+
+
+def event_terms(message, source):
+    return search_terms(f"{message or ''} {source or ''}")[:SEARCH_MAX_TERMS_PER_EVENT]
+
+
+def index_events(cursor, events):
+    """
+    Adds event_terms rows for events ({"id", "project_id", "message",
+    "source", "created_at"}), in the caller's transaction. Re-indexing an
+    event is harmless.
+    """
+    rows = [
+        (e["project_id"], term, e["created_at"], e["id"])
+        for e in events
+        for term in event_terms(e["message"], e["source"])
+    ]
+    if not rows:
+        return
+    cursor.execute(
+        "INSERT IGNORE INTO event_terms (project_id, term, created_at, event_id) VALUES " + placeholders(4, len(rows)),
+        [v for r in rows for v in r],
+    )
+
+
+def index_event(cursor, event_id):
+    """index_events() for one event just inserted, read back for its stored created_at."""
+    cursor.execute("SELECT id, project_id, message, source, created_at FROM events WHERE id = %s", (event_id,))
+    event = cursor.fetchone()
+    if event:
+        index_events(cursor, [event])
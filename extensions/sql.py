@@ -0,0 +1,9 @@
+def placeholders(n_cols, n_rows):
+    """`(%s, ...), (%s, ...)` for a multi-row INSERT of n_rows rows of n_cols values."""
+    row = "(" + ", ".join(["%s"] * n_cols) + ")"
+    return ", ".join([row] * n_rows)
+
+
+def in_list(n):
+    """`%s, %s, ...` for an `IN (...)` of n values."""
+    return ", ".join(["%s"] * n)
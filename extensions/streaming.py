@@ -0,0 +1,110 @@
+import os
+import json
+import threading
+import pymysql
+from flask import Response, jsonify
+
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", 500))
+
+# Each stream keeps a pooled connection for the whole download; keeping
+# them below DB_POOL_MAX_SIZE leaves connections for ordinary requests.
+STREAM_MAX_CONCURRENT = int(os.getenv("STREAM_MAX_CONCURRENT", 4))
+
+_stream_slots = threading.BoundedSemaphore(max(1, STREAM_MAX_CONCURRENT))
+
+
+def wants_stream(args):
+    """True when the query string asks for the whole result set streamed (`stream=1`)."""
+    return args.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def fetch_chunks(cursor, chunk_rows=None):
+    """Yields lists of up to chunk_rows rows from an executed cursor until it is exhausted."""
+    while True:
+        rows = cursor.fetchmany(chunk_rows or STREAM_CHUNK_ROWS)
+        if not rows:
+            return
+        yield rows
+
+
+def stream_query(conn, sql, params, body, mimetype, headers=None):
+    """
+    Runs `sql` on an unbuffered (server-side) cursor and returns a response
+    whose body is `body(cursor)`, a generator that reads the rows (see
+    fetch_chunks) and yields the output piece by piece, so memory stays
+    flat however many rows match.
+
+    Takes ownership of `conn`: it stays checked out of the pool while the
+    body is sent and is released when the response is closed, even if the
+    client goes away early. The query runs before this returns, so SQL
+    errors still surface to the caller. An error mid-stream is logged and
+    re-raised, so the server aborts the response instead of ending it as
+    if it were complete. A body that didn't run to the end leaves rows
+    unread on the connection; it is discarded rather than drained.
+
+    At most STREAM_MAX_CONCURRENT streams run per process; past that,
+    `conn` is released at once and the response is a 503 with Retry-After.
+    """
+    if not _stream_slots.acquire(blocking=False):
+        conn.close()
+        response = jsonify({"error": "Too many streams in progress, try again later"})
+        response.headers['Retry-After'] = "5"
+        response.status_code = 503
+        return response
+
+    cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+    try:
+        cursor.execute(sql, params)
+    except Exception:
+        cursor.close()
+        conn.close()
+        _stream_slots.release()
+        raise
+
+    finished = []
+
+    def generate():
+        try:
+            yield from body(cursor)
+        except Exception as e:
+            print("Stream error:", e)
+            raise
+        finished.append(True)
+
+    def cleanup():
+        try:
+            if not finished:
+                conn.discard()
+                return
+            try:
+                cursor.close()
+            except Exception as e:
+                print("Stream cleanup error:", e)
+            conn.close()
+        finally:
+            _stream_slots.release()
+
+    response = Response(generate(), mimetype=mimetype, headers=headers)
+    response.call_on_close(cleanup)
+    return response
+
+
+def stream_json(conn, sql, params, key, format_row, head=None, tail=None):
+    """
+    stream_query() for list endpoints: writes {**head, key: [format_row(row),
+    ...], **tail}, STREAM_CHUNK_ROWS rows at a time. An error mid-stream
+    aborts the response, and the body read so far is invalid JSON.
+    """
+    opening = json.dumps(head or {})[:-1] + (", " if head else "") + json.dumps(key) + ": ["
+    closing = "]" + (", " + json.dumps(tail)[1:] if tail else "}")
+
+    def body(cursor):
+        yield opening
+        first = True
+        for rows in fetch_chunks(cursor):
+            chunk = ", ".join(json.dumps(format_row(row), default=str) for row in rows)
+            yield chunk if first else ", " + chunk
+            first = False
+        yield closing
+
+    return stream_query(conn, sql, params, body, "application/json")
@@ -0,0 +1,16 @@
+from datetime import datetime
+
+
+def parse_time(value, name):
+    """
+    ISO-8601 timestamp from a request or command-line argument as a naive
+    local datetime, like the TIMESTAMP columns it is compared with; raises
+    ValueError naming the argument.
+    """
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO-8601 timestamp")
+    if dt.tzinfo is not None:
+        dt = dt.astimezone().replace(tzinfo=None)
+    return dt
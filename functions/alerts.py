@@ -1,16 +1,49 @@
 from extensions.extensions import get_db_connection
 from flask import Blueprint, request, jsonify
 from functions.projects import login_required
+from functions.response_cache import cached_response
+from extensions.pagination import page_args, keyset_condition, keyset_params, paginate
+from extensions.streaming import wants_stream, stream_json
 
 alerts_bp = Blueprint("alerts", __name__)
 
+ALERTS_PAGE_DEFAULT = 50
+ALERTS_PAGE_MAX = 200
+
+def _format_alert(alert):
+    """Maps an uptime_incidents row to the alert shape the frontend expects."""
+    # Map started_reason to severity
+    severity = "critical" if alert["started_reason"] == "down" else "warning"
+    
+    # Construct title
+    title = f"Monitor {alert['started_reason']}: {alert['last_error'] or 'Unknown error'}"
+    
+    return {
+        "id": alert["id"],
+        "projectId": alert["project_id"],
+        "title": title,
+        "service": alert["service_name"] or alert["service_url"] or "Application Error",
+        "severity": severity,
+        "status": "open" if alert["status"] == "open" else "resolved",
+        "time": alert["started_at"].strftime("%Y-%m-%d %H:%M:%S") if alert["started_at"] else None,
+        "created_at_iso": alert["started_at"].isoformat() if alert["started_at"] else None
+    }
+
 @alerts_bp.route("/", methods=["GET"])
 @login_required
+@cached_response("alerts")
 def get_alerts():
     """
     Returns a list of alerts for the user's subscribed projects.
     Supports filtering by status (open/resolved) and severity (critical/warning/low).
+    Newest first, one page at a time: pass `next_cursor` back as `cursor`.
+    With `stream=1`, every alert from `cursor` on is streamed in one response.
     """
+    try:
+        limit, after = page_args(request.args, ALERTS_PAGE_DEFAULT, ALERTS_PAGE_MAX)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         user_id = request.user_id
         conn = get_db_connection()
@@ -21,78 +54,69 @@ def get_alerts():
         status_filter = request.args.get("status") # 'active' (open) or 'resolved'
         severity_filter = request.args.get("severity") # 'critical', 'warning', 'low'
 
-        try:
-            with conn.cursor() as cursor:
-                # Base Query
-                # Maps uptime_incidents to alert structure
-                query = """
-                    SELECT 
-                        i.id,
-                        i.project_id,
-                        i.started_reason,
-                        i.last_error,
-                        i.status,
-                        i.started_at,
-                        i.resolved_at,
-                        m.name as service_name,
-                        m.url as service_url
-                    FROM uptime_incidents i
-                    JOIN uptime_monitors m ON i.monitor_id = m.id
-                    JOIN subscriptions s ON m.project_id = s.project_id
-                    WHERE s.user_id = %s
-                """
-                params = [user_id]
+        # Base Query
+        # Maps uptime_incidents to alert structure
+        query = """
+            SELECT 
+                i.id,
+                i.project_id,
+                i.started_reason,
+                i.last_error,
+                i.status,
+                i.started_at,
+                i.resolved_at,
+                m.name as service_name,
+                m.url as service_url
+            FROM uptime_incidents i
+            JOIN uptime_monitors m ON i.monitor_id = m.id
+            JOIN subscriptions s ON m.project_id = s.project_id
+            WHERE s.user_id = %s
+        """
+        params = [user_id]
 
-                # Apply Filters
-                if status_filter:
-                    if status_filter == 'open' or status_filter == 'active':
-                        query += " AND i.status = 'open'"
-                    elif status_filter == 'resolved':
-                         query += " AND i.status = 'resolved'"
-                    else:
-                         query += " AND i.status = %s"
-                         params.append(status_filter)
-                
-                # Map severity filter to started_reason
-                # 'critical' -> 'down'
-                # 'warning' -> 'degraded' (if supported)
-                if severity_filter:
-                    if severity_filter == 'critical':
-                        query += " AND i.started_reason = 'down'"
-                    elif severity_filter == 'warning':
-                         query += " AND i.started_reason != 'down'" # Assuming anything else is warning
-                    else:
-                         pass # low severity not strictly mapped yet
+        # Apply Filters
+        if status_filter:
+            if status_filter == 'open' or status_filter == 'active':
+                query += " AND i.status = 'open'"
+            elif status_filter == 'resolved':
+                 query += " AND i.status = 'resolved'"
+            else:
+                 query += " AND i.status = %s"
+                 params.append(status_filter)
+        
+        # Map severity filter to started_reason
+        # 'critical' -> 'down'
+        # 'warning' -> 'degraded' (if supported)
+        if severity_filter:
+            if severity_filter == 'critical':
+                query += " AND i.started_reason = 'down'"
+            elif severity_filter == 'warning':
+                 query += " AND i.started_reason != 'down'" # Assuming anything else is warning
+            else:
+                 pass # low severity not strictly mapped yet
 
-                query += " ORDER BY i.started_at DESC"
+        if after:
+            query += " AND " + keyset_condition("i.started_at", "i.id")
+            params.extend(keyset_params(after))
 
-                cursor.execute(query, tuple(params))
-                alerts = cursor.fetchall()
+        if wants_stream(request.args):
+            query += " ORDER BY i.started_at DESC, i.id DESC"
+            return stream_json(conn, query, tuple(params), "alerts", _format_alert, tail={"next_cursor": None})
 
-                # Format response to match frontend expectations
-                formatted_alerts = []
-                for alert in alerts:
-                    # Map started_reason to severity
-                    severity = "critical" if alert["started_reason"] == "down" else "warning"
-                    
-                    # Construct title
-                    title = f"Monitor {alert['started_reason']}: {alert['last_error'] or 'Unknown error'}"
-                    
-                    formatted_alerts.append({
-                        "id": alert["id"],
-                        "projectId": alert["project_id"],
-                        "title": title,
-                        "service": alert["service_name"] or alert["service_url"] or "Application Error",
-                        "severity": severity,
-                        "status": "open" if alert["status"] == "open" else "resolved",
-                        "time": alert["started_at"].strftime("%Y-%m-%d %H:%M:%S") if alert["started_at"] else None,
-                        "created_at_iso": alert["started_at"].isoformat() if alert["started_at"] else None
-                    })
+        query += " ORDER BY i.started_at DESC, i.id DESC LIMIT %s"
+        params.append(limit + 1)
 
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(query, tuple(params))
+                alerts, next_cursor = paginate(cursor.fetchall(), limit, "started_at")
         finally:
             conn.close()
 
-        return jsonify({"alerts": formatted_alerts}), 200
+        # Format response to match frontend expectations
+        formatted_alerts = [_format_alert(alert) for alert in alerts]
+
+        return jsonify({"alerts": formatted_alerts, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         print("Get alerts error:", e)
@@ -4,7 +4,7 @@ import bcrypt
 import jwt
 import datetime
 from datetime import timedelta
-import uuid
+from extensions.ids import new_id
 import secrets
 
 auth_bp = Blueprint("auth", __name__)
@@ -126,7 +126,7 @@ def register():
 
                 # Hash password
                 hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-                user_id = str(uuid.uuid4())
+                user_id = new_id()
 
                 # Insert user (role_id = 3 for normal user, adjust as needed)
                 # DB Columns: id, name, email, password_hash
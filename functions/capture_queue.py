@@ -0,0 +1,198 @@
+import os
+import time
+import atexit
+import threading
+from collections import deque
+import pymysql
+from extensions.extensions import get_db_connection
+from functions.issues import record_issues
+
+CAPTURE_QUEUE_MAX_EVENTS = int(os.getenv("CAPTURE_QUEUE_MAX_EVENTS", 10000))
+CAPTURE_WRITE_BATCH_SIZE = int(os.getenv("CAPTURE_WRITE_BATCH_SIZE", 500))
+CAPTURE_WRITE_FLUSH_SECONDS = float(os.getenv("CAPTURE_WRITE_FLUSH_SECONDS", 0.5))
+CAPTURE_WRITE_RETRY_SECONDS = float(os.getenv("CAPTURE_WRITE_RETRY_SECONDS", 2.0))
+CAPTURE_WRITE_MAX_ATTEMPTS = int(os.getenv("CAPTURE_WRITE_MAX_ATTEMPTS", 3))
+CAPTURE_DEAD_LETTER_MAX = int(os.getenv("CAPTURE_DEAD_LETTER_MAX", 100))
+
+# Errors that say nothing about the rows themselves: the server is gone,
+# overloaded, or the statement lost a lock race.
+_TRANSIENT_DB_ERRORS = {1040, 1205, 1213, 2003, 2006, 2013}
+
+
+def _is_transient(error):
+    if isinstance(error, pymysql.err.InterfaceError):
+        return True
+    return isinstance(error, pymysql.err.OperationalError) and bool(error.args) and error.args[0] in _TRANSIENT_DB_ERRORS
+
+
+class CaptureQueue:
+    """
+    Bounded in-process queue of SDK error events, drained by one daemon
+    thread that folds up to `batch_size` events per statement into their
+    grouped issues (see functions.issues.record_issues).
+
+    offer() is all-or-nothing: a batch that doesn't fit is rejected as a
+    whole so the client can retry it later. A failed write is put back at
+    the front while there is room, and the writer backs off before trying
+    again; anything that doesn't fit then is dropped and counted.
+
+    Failures that come from the database being unavailable are retried
+    for as long as it takes. A batch whose write fails for any other
+    reason CAPTURE_WRITE_MAX_ATTEMPTS times in a row is split in halves
+    until the records that can't be written (an out-of-range timestamp,
+    a project deleted since) are isolated; those are dead-lettered, the
+    rest are written, and the queue moves on.
+    """
+
+    def __init__(self, max_events=None, batch_size=None, flush_seconds=None):
+        self.max_events = max(1, int(max_events or CAPTURE_QUEUE_MAX_EVENTS))
+        self.batch_size = max(1, int(batch_size or CAPTURE_WRITE_BATCH_SIZE))
+        self.flush_seconds = float(flush_seconds if flush_seconds is not None else CAPTURE_WRITE_FLUSH_SECONDS)
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+        self._attempts = 0
+        self._dead_letters = deque(maxlen=CAPTURE_DEAD_LETTER_MAX)
+        self._counters = {
+            "accepted": 0, "rejected": 0, "written": 0, "dropped": 0, "failed_writes": 0, "dead_lettered": 0,
+        }
+
+    def offer(self, records):
+        """Queues every record or none of them; returns whether they were queued."""
+        with self._cond:
+            if len(self._items) + len(records) > self.max_events:
+                self._counters["rejected"] += len(records)
+                return False
+            self._items.extend(records)
+            self._counters["accepted"] += len(records)
+            self._ensure_writer()
+            if len(self._items) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def _ensure_writer(self):
+        # Started lazily, and again after a fork (gunicorn --preload), since
+        # threads don't survive into the child.
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+            self._thread.start()
+
+    def _take(self):
+        with self._cond:
+            if len(self._items) < self.batch_size and not self._stopping:
+                self._cond.wait(self.flush_seconds)
+            n = min(self.batch_size, len(self._items))
+            return [self._items.popleft() for _ in range(n)]
+
+    def _requeue(self, batch):
+        with self._cond:
+            room = self.max_events - len(self._items)
+            keep = batch[:max(0, room)]
+            self._items.extendleft(reversed(keep))
+            self._counters["dropped"] += len(batch) - len(keep)
+
+    def _dead_letter(self, records, error):
+        print(f"Capture writer: dead-lettering {len(records)} events: {error}")
+        with self._cond:
+            self._dead_letters.extend(records)
+            self._counters["dead_lettered"] += len(records)
+
+    def _isolate(self, batch, error):
+        """
+        Writes what it can of a batch that keeps failing, halving it until
+        the failing records are alone. Returns the records still to be
+        written when the database became unavailable part way, else [].
+        """
+        if len(batch) == 1:
+            self._dead_letter(batch, error)
+            return []
+        mid = len(batch) // 2
+        halves = [batch[:mid], batch[mid:]]
+        for i, half in enumerate(halves):
+            error = self.write(half)
+            if error is None:
+                continue
+            if _is_transient(error):
+                return [r for h in halves[i:] for r in h]
+            left = self._isolate(half, error)
+            if left:
+                return left + [r for h in halves[i + 1:] for r in h]
+        return []
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                if self._stopping:
+                    return
+                continue
+            error = self.write(batch)
+            if error is None:
+                self._attempts = 0
+                continue
+            if not _is_transient(error):
+                self._attempts += 1
+                if self._attempts >= CAPTURE_WRITE_MAX_ATTEMPTS:
+                    self._attempts = 0
+                    batch = self._isolate(batch, error)
+                    if not batch:
+                        continue
+            if self._stopping:
+                with self._cond:
+                    self._counters["dropped"] += len(batch)
+                return
+            self._requeue(batch)
+            time.sleep(CAPTURE_WRITE_RETRY_SECONDS)
+
+    def write(self, batch):
+        """
+        Writes a batch in one transaction. Returns None when it was
+        written, else the error.
+        """
+        conn = get_db_connection()
+        if not conn:
+            with self._cond:
+                self._counters["failed_writes"] += 1
+            return pymysql.err.InterfaceError("no database connection")
+        try:
+            with conn.cursor() as cursor:
+                record_issues(cursor, batch)
+            conn.commit()
+        except Exception as e:
+            print(f"Capture writer: write of {len(batch)} events failed: {e}")
+            with self._cond:
+                self._counters["failed_writes"] += 1
+            return e
+        finally:
+            conn.close()
+        with self._cond:
+            self._counters["written"] += len(batch)
+        return None
+
+    def close(self, timeout=5.0):
+        """Flushes what is queued; called at interpreter exit."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+    def dead_letters(self):
+        """The last CAPTURE_DEAD_LETTER_MAX records that were given up on."""
+        with self._cond:
+            return list(self._dead_letters)
+
+    def stats(self):
+        with self._cond:
+            data = dict(self._counters)
+            data["depth"] = len(self._items)
+            data["max_events"] = self.max_events
+        return data
+
+
+capture_queue = CaptureQueue()
+atexit.register(capture_queue.close)
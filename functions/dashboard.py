@@ -1,12 +1,19 @@
 from extensions.extensions import get_db_connection
 from flask import Blueprint, request, jsonify
 from functions.projects import login_required
+from functions.rollups import rollup_rows_sql
+from functions.response_cache import cached_response
+from extensions.pagination import page_args, keyset_condition, keyset_params, paginate
 import datetime
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
+ACTIVITY_PAGE_DEFAULT = 10
+ACTIVITY_PAGE_MAX = 100
+
 @dashboard_bp.route("/stats", methods=["GET"])
 @login_required
+@cached_response("dashboard.stats")
 def get_dashboard_stats():
     """
     Returns aggregated stats for the user's projects/monitors.
@@ -49,34 +56,27 @@ def get_dashboard_stats():
                     stats["active_alerts"] = alerts_data["count"]
                     stats["critical_alerts"] = alerts_data["critical_count"] or 0
 
-                # 2. Avg Response (last 24h)
-                query_avg_resp = """
-                    SELECT AVG(mc.response_time_ms) as avg_resp
-                    FROM uptime_heartbeats mc
-                    JOIN uptime_monitors m ON mc.monitor_id = m.id
-                    JOIN subscriptions s ON m.project_id = s.project_id
-                    WHERE s.user_id = %s AND mc.checked_at > NOW() - INTERVAL 1 DAY
-                """
-                cursor.execute(query_avg_resp, (user_id,))
-                resp_data = cursor.fetchone()
-                if resp_data and resp_data["avg_resp"]:
-                    stats["avg_response"] = f"{int(resp_data['avg_resp'])}ms"
-
-                # 3. Uptime (last 24h)
-                # (Active Checks / Total Checks) * 100
-                query_uptime = """
-                    SELECT 
-                        COUNT(*) as total,
-                        SUM(CASE WHEN mc.status = 'up' THEN 1 ELSE 0 END) as up_count
-                    FROM uptime_heartbeats mc
-                    JOIN uptime_monitors m ON mc.monitor_id = m.id
-                    JOIN subscriptions s ON m.project_id = s.project_id
-                    WHERE s.user_id = %s AND mc.checked_at > NOW() - INTERVAL 1 DAY
+                # 2 + 3. Avg Response and Uptime (last 24h), from the
+                # heartbeat rollups rather than raw uptime_heartbeats rows.
+                rollup_sql, rollup_params = rollup_rows_sql(
+                    datetime.datetime.now() - datetime.timedelta(days=1),
+                    columns="check_count, up_count, latency_count, latency_sum",
+                    where="project_id IN (SELECT project_id FROM subscriptions WHERE user_id = %s)",
+                    where_params=(user_id,),
+                )
+                query_window = f"""
+                    SELECT
+                        SUM(r.check_count) as total,
+                        SUM(r.up_count) as up_count,
+                        SUM(r.latency_sum) / NULLIF(SUM(r.latency_count), 0) as avg_resp
+                    FROM ({rollup_sql}) r
                 """
-                cursor.execute(query_uptime, (user_id,))
-                uptime_data = cursor.fetchone()
-                if uptime_data and uptime_data["total"] > 0:
-                    uptime_pct = (uptime_data["up_count"] / uptime_data["total"]) * 100
+                cursor.execute(query_window, tuple(rollup_params))
+                window_data = cursor.fetchone()
+                if window_data and window_data["avg_resp"]:
+                    stats["avg_response"] = f"{int(window_data['avg_resp'])}ms"
+                if window_data and window_data["total"]:
+                    uptime_pct = (window_data["up_count"] / window_data["total"]) * 100
                     stats["uptime_24h"] = f"{uptime_pct:.2f}%"
 
         finally:
@@ -90,6 +90,7 @@ def get_dashboard_stats():
 
 @dashboard_bp.route("/charts", methods=["GET"])
 @login_required
+@cached_response("dashboard.charts")
 def get_dashboard_charts():
     """
     Returns data for:
@@ -109,16 +110,15 @@ def get_dashboard_charts():
 
         try:
             with conn.cursor() as cursor:
-                # Latency History (Last 50 checks aggregated or raw?)
-                # Let's get the last 50 checks across all monitors (average per time bucket would be better but keeping it simple)
+                # Latency History: average across the user's monitors per
+                # minute, newest 50 minutes with data (from minute rollups)
                 query_latency = """
-                    SELECT mc.checked_at, AVG(mc.response_time_ms) as avg_resp
-                    FROM uptime_heartbeats mc
-                    JOIN uptime_monitors m ON mc.monitor_id = m.id
-                    JOIN subscriptions s ON m.project_id = s.project_id
-                    WHERE s.user_id = %s
-                    GROUP BY mc.checked_at
-                    ORDER BY mc.checked_at DESC
+                    SELECT r.bucket_start as checked_at, SUM(r.latency_sum) / NULLIF(SUM(r.latency_count), 0) as avg_resp
+                    FROM uptime_rollup_minute r
+                    WHERE r.project_id IN (SELECT project_id FROM subscriptions WHERE user_id = %s)
+                      AND r.bucket_start > NOW() - INTERVAL 1 DAY
+                    GROUP BY r.bucket_start
+                    ORDER BY r.bucket_start DESC
                     LIMIT 50
                 """
                 cursor.execute(query_latency, (user_id,))
@@ -139,8 +139,13 @@ def get_dashboard_charts():
 @login_required
 def get_dashboard_activity():
     """
-    Returns recent activity feed.
+    Returns recent activity feed, newest first, one page at a time.
     """
+    try:
+        limit, after = page_args(request.args, ACTIVITY_PAGE_DEFAULT, ACTIVITY_PAGE_MAX)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     try:
         user_id = request.user_id
         conn = get_db_connection()
@@ -150,20 +155,38 @@ def get_dashboard_activity():
         activities = []
         try:
             with conn.cursor() as cursor:
-                query = """
-                    SELECT * FROM activities 
-                    WHERE user_id = %s OR project_id IN (
-                        SELECT project_id FROM subscriptions WHERE user_id = %s
-                    )
-                    ORDER BY created_at DESC
-                    LIMIT 10
+                # Two index-ordered branches instead of one OR, which
+                # can't use either activities index. Each branch resumes
+                # from the cursor on its own index.
+                own_after = ("AND " + keyset_condition("created_at", "id")) if after else ""
+                sub_after = ("AND " + keyset_condition("a.created_at", "a.id")) if after else ""
+                query = f"""
+                    SELECT * FROM (
+                        (SELECT * FROM activities
+                         WHERE user_id = %s {own_after}
+                         ORDER BY created_at DESC, id DESC
+                         LIMIT %s)
+                        UNION
+                        (SELECT a.* FROM activities a
+                         JOIN subscriptions s ON a.project_id = s.project_id
+                         WHERE s.user_id = %s {sub_after}
+                         ORDER BY a.created_at DESC, a.id DESC
+                         LIMIT %s)
+                    ) recent
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
                 """
-                cursor.execute(query, (user_id, user_id))
-                activities = cursor.fetchall()
+                branch_params = keyset_params(after) if after else []
+                cursor.execute(query, (
+                    user_id, *branch_params, limit + 1,
+                    user_id, *branch_params, limit + 1,
+                    limit + 1,
+                ))
+                activities, next_cursor = paginate(cursor.fetchall(), limit, "created_at")
         finally:
             conn.close()
             
-        return jsonify({"activities": activities}), 200
+        return jsonify({"activities": activities, "next_cursor": next_cursor}), 200
 
     except Exception as e:
         print("Dashboard activity error:", e)
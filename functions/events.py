@@ -1,12 +1,23 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify
 from extensions.extensions import get_db_connection
 from functions.dashboard import login_required
-import uuid
+from extensions.ids import new_id
+from extensions.streaming import wants_stream, stream_json
+from extensions.times import parse_time
+from extensions.search import search_terms, index_event
+from extensions.sql import in_list
+from extensions.pagination import (
+    page_args, keyset_condition, keyset_params, ranked_keyset_condition, ranked_keyset_params, paginate,
+)
 import pymysql
 from datetime import datetime
 
 events_bp = Blueprint('events', __name__)
 
+EVENTS_PAGE_DEFAULT = 50
+EVENTS_PAGE_MAX = 200
+EVENTS_SEARCH_MAX_TERMS = 8
+
 def format_time_ago(dt):
     if not dt:
         return "Never"
@@ -20,56 +31,168 @@ def format_time_ago(dt):
         return f"{int(diff.total_seconds() // 3600)}h ago"
     return f"{diff.days}d ago"
 
+def _format_event(event, search=False):
+    item = {
+        "id": event['id'],
+        "type": event['type'],
+        "message": event['message'],
+        "source": event['source'],
+        "time": format_time_ago(event['created_at']),
+        "projectId": event['project_id']
+    }
+    if search:
+        item["score"] = round(event['score'], 4)
+    return item
+
+def _search_sql(project_ids, terms, since, until):
+    """
+    Matches from event_terms (see extensions/search.py): per word, a range
+    read of (project_id, term) for every word starting with it, in the
+    user's projects only. Events hit by every word are kept; the score is
+    the number of words plus one for each that matched a whole word.
+    Returns (sql, params) of a derived table of (event_id, score).
+    """
+    time_filter = ""
+    time_params = []
+    if since:
+        time_filter += " AND created_at >= %s"
+        time_params.append(since)
+    if until:
+        time_filter += " AND created_at < %s"
+        time_params.append(until)
+
+    hits, params = [], []
+    for k, term in enumerate(terms):
+        hits.append(
+            f"SELECT event_id, {k} AS k, term = %s AS whole FROM event_terms "
+            f"WHERE project_id IN ({in_list(len(project_ids))}) AND term LIKE %s{time_filter}"
+        )
+        params += [term, *project_ids, term.replace("_", "\\_") + "%", *time_params]
+    sql = f"""
+        SELECT event_id, {len(terms)} + CAST(SUM(whole) AS SIGNED) AS score
+        FROM ({" UNION ALL ".join(hits)}) h
+        GROUP BY event_id
+        HAVING COUNT(DISTINCT k) = {len(terms)}
+    """
+    return sql, params
+
+def _time_arg(name):
+    """Optional ISO-8601 query parameter as a naive local datetime."""
+    value = request.args.get(name)
+    return parse_time(value, name) if value else None
+
 @events_bp.route('/', methods=['GET'])
 @login_required
 def get_events():
-    conn = get_db_connection()
-    cursor = conn.cursor(pymysql.cursors.DictCursor)
-    
+    """
+    Events from the user's projects, filtered by `type` and a `since` /
+    `until` time range. With `q`, a search over message and source (every
+    word must match, as a word or prefix) through the event_terms index,
+    ranked by relevance unless `sort=recent`. Paged with
+    `cursor`/`next_cursor`; `stream=1` streams every match from `cursor`
+    on in one response.
+    """
     try:
-        # Get query parameters
-        search_query = request.args.get('q', '').lower()
-        filter_type = request.args.get('type')
-        limit = int(request.args.get('limit', 50))
-        
+        limit, after = page_args(request.args, EVENTS_PAGE_DEFAULT, EVENTS_PAGE_MAX)
+        since = _time_arg('since')
+        until = _time_arg('until')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Get query parameters
+    terms = search_terms(request.args.get('q', ''))[:EVENTS_SEARCH_MAX_TERMS]
+    search = bool(terms)
+    ranked = search and request.args.get('sort') != 'recent'
+    filter_type = request.args.get('type')
+    if after and len(after) != (3 if ranked else 2):
+        return jsonify({"error": "Invalid cursor"}), 400
+
+    # Apply filters
+    filters = ""
+    filter_params = []
+    if filter_type:
+        filters += " AND e.type = %s"
+        filter_params.append(filter_type)
+
+    if since:
+        filters += " AND e.created_at >= %s"
+        filter_params.append(since)
+
+    if until:
+        filters += " AND e.created_at < %s"
+        filter_params.append(until)
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+
+    if search:
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT project_id FROM subscriptions WHERE user_id = %s", (request.user_id,))
+                project_ids = sorted({r['project_id'] for r in cursor.fetchall()})
+        except Exception as e:
+            print(f"Error fetching events: {e}")
+            conn.close()
+            return jsonify({"error": "Internal server error"}), 500
+        if not project_ids:
+            conn.close()
+            return jsonify({"events": [], "next_cursor": None}), 200
+        matches_sql, matches_params = _search_sql(project_ids, terms, since, until)
+        sql = f"""
+            SELECT e.id, e.type, e.message, e.source, e.created_at, e.project_id, m.score
+            FROM ({matches_sql}) m
+            JOIN events e ON e.id = m.event_id
+            WHERE e.project_id IN ({in_list(len(project_ids))}){filters}
+        """
+        params = matches_params + project_ids + filter_params
+    else:
         # Base query joining subscriptions to ensure user access
-        sql = """
+        sql = f"""
             SELECT e.id, e.type, e.message, e.source, e.created_at, e.project_id
             FROM events e
             JOIN subscriptions s ON e.project_id = s.project_id
-            WHERE s.user_id = %s
+            WHERE s.user_id = %s{filters}
         """
-        params = [request.user_id]
-        
-        # Apply filters
-        if search_query:
-            sql += " AND (LOWER(e.message) LIKE %s OR LOWER(e.source) LIKE %s)"
-            params.extend([f"%{search_query}%", f"%{search_query}%"])
-            
-        if filter_type:
-            sql += " AND e.type = %s"
-            params.append(filter_type)
-            
-        # Sorting and Limit
-        sql += " ORDER BY e.created_at DESC LIMIT %s"
-        params.append(limit)
+        params = [request.user_id] + filter_params
+
+    # Sorting and Limit (one extra row tells whether there is a next page)
+    if ranked:
+        if after:
+            sql += " AND " + ranked_keyset_condition("m.score", "e.created_at", "e.id")
+            params.extend(ranked_keyset_params(after))
+        sql += " ORDER BY m.score DESC, e.created_at DESC, e.id DESC"
+    else:
+        if after:
+            sql += " AND " + keyset_condition("e.created_at", "e.id")
+            params.extend(keyset_params(after))
+        sql += " ORDER BY e.created_at DESC, e.id DESC"
+
+    if wants_stream(request.args):
+        try:
+            return stream_json(
+                conn, sql, tuple(params), "events", lambda event: _format_event(event, search),
+                tail={"next_cursor": None},
+            )
+        except Exception as e:
+            print(f"Error fetching events: {e}")
+            return jsonify({"error": "Internal server error"}), 500
+
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    
+    try:
+        sql += " LIMIT %s"
+        params.append(limit + 1)
         
         cursor.execute(sql, tuple(params))
-        events_data = cursor.fetchall()
+        events_data, next_cursor = paginate(
+            cursor.fetchall(), limit, "created_at", score_key="score" if ranked else None
+        )
         
         # Format response
-        result = []
-        for event in events_data:
-            result.append({
-                "id": event['id'],
-                "type": event['type'],
-                "message": event['message'],
-                "source": event['source'],
-                "time": format_time_ago(event['created_at']),
-                "projectId": event['project_id']
-            })
+        result = [_format_event(event, search) for event in events_data]
             
-        return jsonify(result), 200
+        return jsonify({"events": result, "next_cursor": next_cursor}), 200
         
     except Exception as e:
         print(f"Error fetching events: {e}")
@@ -103,11 +226,12 @@ def create_event():
         if not cursor.fetchone():
             return jsonify({"error": "Unauthorized"}), 403
             
-        event_id = str(uuid.uuid4())
+        event_id = new_id()
         cursor.execute("""
             INSERT INTO events (id, project_id, type, message, source)
             VALUES (%s, %s, %s, %s, %s)
         """, (event_id, project_id, event_type, message, source))
+        index_event(cursor, event_id)
         
         conn.commit()
         return jsonify({"message": "Event created", "id": event_id}), 201
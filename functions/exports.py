@@ -0,0 +1,256 @@
+import os
+import io
+import csv
+import json
+import gzip
+import argparse
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+from extensions.extensions import get_db_connection
+from extensions.ids import heartbeat_id_is_binary, bytes_to_id, id_to_bytes
+from extensions.pagination import keyset_condition, keyset_params
+from extensions.streaming import fetch_chunks, stream_query
+from extensions.times import parse_time
+from functions.projects import login_required
+import pymysql
+
+exports_bp = Blueprint("exports", __name__)
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", 5000))
+EXPORT_DEFAULT_DAYS = int(os.getenv("EXPORT_DEFAULT_DAYS", 30))
+# MySQL drops an unbuffered query whose client stops reading for longer
+# than net_write_timeout (default 60s); a slow download must not do that.
+EXPORT_NET_WRITE_TIMEOUT_SECONDS = int(os.getenv("EXPORT_NET_WRITE_TIMEOUT_SECONDS", 3600))
+
+# Rows come out in (time, id) order, so the time and id of the last row
+# written are all it takes to resume an export.
+EXPORT_DATASETS = {
+    "heartbeats": {
+        "table": "uptime_heartbeats",
+        "time": "checked_at",
+        "columns": [
+            "id", "monitor_id", "status", "status_code", "response_time_ms",
+            "dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "error_message", "checked_at",
+        ],
+    },
+    "incidents": {
+        "table": "uptime_incidents",
+        "time": "started_at",
+        "columns": [
+            "id", "monitor_id", "status", "started_at", "resolved_at", "started_reason",
+            "resolved_reason", "last_error", "fingerprint", "occurrences", "last_seen_at",
+        ],
+    },
+}
+
+EXPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def parse_after(value):
+    """`<time>,<id>` of the last row already received -> (datetime, id)."""
+    time_part, sep, row_id = value.rpartition(",")
+    if not sep or not row_id:
+        raise ValueError("after must be '<time>,<id>' of the last row received")
+    return parse_time(time_part, "after"), row_id
+
+
+def export_query(cursor, dataset, project_id, start, end, monitor_id=None, after=None):
+    """(sql, params) for one project's rows of `dataset` with start <= time < end, after `after`."""
+    spec = EXPORT_DATASETS[dataset]
+    time_col = spec["time"]
+    sql = f"""
+        SELECT {", ".join(spec["columns"])}
+        FROM {spec["table"]}
+        WHERE project_id = %s AND {time_col} >= %s AND {time_col} < %s
+    """
+    params = [project_id, start, end]
+    if monitor_id:
+        sql += " AND monitor_id = %s"
+        params.append(monitor_id)
+    if after:
+        after_id = after[1]
+        if dataset == "heartbeats" and heartbeat_id_is_binary(cursor):
+            after_id = id_to_bytes(after_id)
+        sql += " AND " + keyset_condition(time_col, "id", ascending=True)
+        params.extend(keyset_params((after[0], after_id)))
+    sql += f" ORDER BY {time_col}, id"
+    return sql, params
+
+
+def _format_row(row):
+    out = {}
+    for key, value in row.items():
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, (bytes, bytearray)):
+            value = bytes_to_id(value)
+        out[key] = value
+    return out
+
+
+def export_chunks(cursor, dataset, fmt="ndjson", compress=False, header=True):
+    """
+    Encodes the rows of an executed export query, EXPORT_CHUNK_ROWS at a
+    time. Yields (data, after) where `after` is the resume position
+    `<time>,<id>` once all of `data` has been written. With compress, each
+    chunk is a complete gzip member; concatenated members are one valid
+    gzip file, so output can be cut and resumed at any chunk boundary.
+    """
+    spec = EXPORT_DATASETS[dataset]
+
+    def encode(text):
+        data = text.encode()
+        return gzip.compress(data, mtime=0) if compress else data
+
+    if fmt == "csv" and header:
+        yield encode(",".join(spec["columns"]) + "\r\n"), None
+
+    for rows in fetch_chunks(cursor, EXPORT_CHUNK_ROWS):
+        rows = [_format_row(r) for r in rows]
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            writer.writerows([r.get(c) for c in spec["columns"]] for r in rows)
+            text = buf.getvalue()
+        else:
+            text = "".join(json.dumps(r) + "\n" for r in rows)
+        last = rows[-1]
+        yield encode(text), f"{last[spec['time']]},{last['id']}"
+
+
+def _prepare(conn):
+    # Stays set on the pooled connection afterwards, which is harmless.
+    with conn.cursor() as cursor:
+        cursor.execute("SET SESSION net_write_timeout = %s", (EXPORT_NET_WRITE_TIMEOUT_SECONDS,))
+
+
+@exports_bp.route("/<dataset>", methods=["GET"])
+@login_required
+def export_dataset(dataset):
+    """
+    Streams a project's heartbeats or incidents as CSV or NDJSON, oldest
+    first. Query params: projectId (required), monitorId, from/to (ISO,
+    default the last EXPORT_DEFAULT_DAYS days), format (ndjson|csv),
+    gzip=1, and after=<time>,<id> to resume after the last row received
+    (the CSV header is left out then).
+    """
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({"error": "Unknown dataset"}), 404
+
+    project_id = request.args.get("projectId")
+    fmt = request.args.get("format", "ndjson")
+    compress = request.args.get("gzip", "").lower() in ("1", "true", "yes")
+    if not project_id:
+        return jsonify({"error": "projectId is required"}), 400
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    try:
+        end = parse_time(request.args["to"], "to") if request.args.get("to") else datetime.now()
+        start = (
+            parse_time(request.args["from"], "from") if request.args.get("from")
+            else end - timedelta(days=EXPORT_DEFAULT_DAYS)
+        )
+        after = parse_after(request.args["after"]) if request.args.get("after") else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({"error": "Database connection failed"}), 500
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM subscriptions WHERE user_id = %s AND project_id = %s",
+                    (request.user_id, project_id),
+                )
+                if not cursor.fetchone():
+                    conn.close()
+                    return jsonify({"error": "Unauthorized"}), 403
+                sql, params = export_query(
+                    cursor, dataset, project_id, start, end, request.args.get("monitorId"), after
+                )
+            _prepare(conn)
+        except Exception:
+            conn.close()
+            raise
+
+        filename = f"{dataset}-{project_id}.{fmt}" + (".gz" if compress else "")
+        return stream_query(
+            conn, sql, tuple(params),
+            lambda cursor: (data for data, _ in export_chunks(cursor, dataset, fmt, compress, header=not after)),
+            "application/gzip" if compress else EXPORT_FORMATS[fmt],
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+    except Exception as e:
+        print("Export error:", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+
+def export_command(args):
+    """
+    `python index.py --export <heartbeats|incidents> --project ID --output PATH [...]`
+
+    Writes to PATH and checkpoints PATH.progress after every chunk; after
+    an interruption, rerun with --resume to cut the file back to the last
+    checkpoint and carry on from there.
+    """
+    parser = argparse.ArgumentParser(prog="index.py --export")
+    parser.add_argument("dataset", choices=sorted(EXPORT_DATASETS))
+    parser.add_argument("--project", required=True)
+    parser.add_argument("--monitor")
+    parser.add_argument("--from", dest="start", help="ISO time (default: --to minus EXPORT_DEFAULT_DAYS)")
+    parser.add_argument("--to", dest="end", help="ISO time (default: now)")
+    parser.add_argument("--format", choices=sorted(EXPORT_FORMATS), default="ndjson")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--output", required=True)
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted export into --output")
+    opts = parser.parse_args(args)
+
+    progress_path = opts.output + ".progress"
+    job = {
+        "dataset": opts.dataset, "project": opts.project, "monitor": opts.monitor,
+        "format": opts.format, "gzip": opts.gzip,
+    }
+    if opts.resume:
+        with open(progress_path) as f:
+            state = json.load(f)
+        if state["job"] != job:
+            raise SystemExit(f"{progress_path} is for a different export: {state['job']}")
+        start, end = parse_time(state["from"], "from"), parse_time(state["to"], "to")
+        after = parse_after(state["after"]) if state["after"] else None
+        written = state["bytes"]
+    else:
+        end = parse_time(opts.end, "--to") if opts.end else datetime.now()
+        start = parse_time(opts.start, "--from") if opts.start else end - timedelta(days=EXPORT_DEFAULT_DAYS)
+        state = {"job": job, "from": start.isoformat(), "to": end.isoformat(), "after": None, "bytes": 0}
+        after, written = None, 0
+
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            sql, params = export_query(cursor, opts.dataset, opts.project, start, end, opts.monitor, after)
+        _prepare(conn)
+        with open(opts.output, "r+b" if opts.resume else "wb") as out:
+            out.truncate(written)
+            out.seek(written)
+            with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+                cursor.execute(sql, params)
+                for data, position in export_chunks(cursor, opts.dataset, opts.format, opts.gzip, header=written == 0):
+                    out.write(data)
+                    written += len(data)
+                    if position is None:
+                        continue
+                    out.flush()
+                    os.fsync(out.fileno())
+                    state.update(after=position, bytes=written)
+                    with open(progress_path + ".tmp", "w") as f:
+                        json.dump(state, f)
+                    os.replace(progress_path + ".tmp", progress_path)
+                    print(f"  {written:,} bytes, up to {position.split(',')[0]}")
+    finally:
+        conn.close()
+    if os.path.exists(progress_path):
+        os.remove(progress_path)
+    print(f"✅ Exported {opts.dataset} to {opts.output} ({written:,} bytes)")
@@ -0,0 +1,208 @@
+import os
+import time
+import random
+import atexit
+import datetime
+import threading
+from collections import OrderedDict
+from extensions.extensions import get_db_connection
+from extensions.sql import placeholders
+
+
+def _quota(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return None if value.lower() in ("", "none", "unlimited") else int(value)
+
+
+# Per plan: events accepted per project per day (None = unlimited), and the
+# events/minute above which a project's events are sampled down to that
+# rate. The plan is the one sdk_auth_required resolves.
+INGEST_POLICIES = {
+    "free": {
+        "daily_quota": _quota("INGEST_FREE_DAILY_QUOTA", 10000),
+        "sample_above_per_minute": _quota("INGEST_FREE_SAMPLE_ABOVE_PER_MINUTE", 100),
+    },
+    "paid": {
+        "daily_quota": _quota("INGEST_PAID_DAILY_QUOTA", None),
+        "sample_above_per_minute": _quota("INGEST_PAID_SAMPLE_ABOVE_PER_MINUTE", 1000),
+    },
+}
+
+INGEST_FLUSH_SECONDS = float(os.getenv("INGEST_FLUSH_SECONDS", 10))
+INGEST_MAX_PROJECTS = int(os.getenv("INGEST_MAX_PROJECTS", 100000))
+
+_COUNTERS = ("accepted", "sampled_out", "over_quota")
+
+
+class IngestionGate:
+    """
+    Decides in memory, per event, whether a captured SDK event is kept:
+    dropped once the project's daily quota is used up, otherwise sampled
+    with probability threshold / rate while its rate (sliding one-minute
+    estimate) is above the plan's threshold. Kept events carry the inverse
+    sample rate as their weight so issue occurrence counts stay estimates
+    of the real volume.
+
+    Counts are flushed to ingestion_stats every INGEST_FLUSH_SECONDS by a
+    daemon thread, which also reads back each project's total for the day
+    so the quota is shared (approximately) across processes.
+    """
+
+    def __init__(self, policies=None, max_projects=None, flush_seconds=None):
+        self.policies = policies or INGEST_POLICIES
+        self.max_projects = max(1, int(max_projects or INGEST_MAX_PROJECTS))
+        self.flush_seconds = float(flush_seconds if flush_seconds is not None else INGEST_FLUSH_SECONDS)
+        self._state = OrderedDict()  # project_id -> state dict, LRU
+        self._pending = {}  # (project_id, day) -> unflushed counters
+        self._totals = dict.fromkeys(_COUNTERS, 0)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def _project(self, project_id, today, now):
+        state = self._state.pop(project_id, None)
+        if state is None or state["day"] != today:
+            state = {"day": today, "used": 0, "window_start": now, "window": 0, "prev_window": 0}
+        self._state[project_id] = state
+        while len(self._state) > self.max_projects:
+            self._state.popitem(last=False)
+        return state
+
+    def _rate(self, state, now):
+        """Events per minute over the last minute, counting this one."""
+        elapsed = now - state["window_start"]
+        if elapsed >= 120:
+            state["window_start"], state["window"], state["prev_window"] = now, 0, 0
+        elif elapsed >= 60:
+            state["window_start"] += 60
+            state["prev_window"], state["window"] = state["window"], 0
+        state["window"] += 1
+        frac = (now - state["window_start"]) / 60.0
+        return state["prev_window"] * (1 - frac) + state["window"]
+
+    def admit(self, project_id, plan, count=1):
+        """
+        Returns one (outcome, weight) per event. outcome is "accepted",
+        "sampled_out" or "over_quota"; weight is the inverse of the
+        probability an accepted event was kept with (0 when dropped).
+        """
+        policy = self.policies[plan]
+        quota = policy["daily_quota"]
+        threshold = policy["sample_above_per_minute"]
+        today = datetime.date.today()
+        now = time.monotonic()
+
+        weights = []
+        with self._lock:
+            state = self._project(project_id, today, now)
+            pending = self._pending.setdefault((project_id, today), dict.fromkeys(_COUNTERS, 0))
+            for _ in range(count):
+                if quota is not None and state["used"] >= quota:
+                    outcome, weight = "over_quota", 0
+                else:
+                    rate = self._rate(state, now)
+                    keep = 1.0 if threshold is None or rate <= threshold else threshold / rate
+                    if keep < 1.0 and random.random() >= keep:
+                        outcome, weight = "sampled_out", 0
+                    else:
+                        outcome, weight = "accepted", 1.0 / keep
+                        state["used"] += 1
+                pending[outcome] += 1
+                self._totals[outcome] += 1
+                weights.append((outcome, weight))
+            self._ensure_flusher()
+        return weights
+
+    def refund(self, project_id, count=1):
+        """
+        Takes back `count` accepted events that were never stored (the
+        write failed or the queue was full), so they don't use up quota
+        or count as accepted, and a client retry is counted once.
+        """
+        with self._lock:
+            state = self._state.get(project_id)
+            if state is None:
+                return
+            state["used"] = max(0, state["used"] - count)
+            pending = self._pending.setdefault((project_id, state["day"]), dict.fromkeys(_COUNTERS, 0))
+            pending["accepted"] -= count
+            self._totals["accepted"] -= count
+
+    def _ensure_flusher(self):
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="ingestion-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+
+        conn = get_db_connection()
+        if not conn:
+            self._restore(pending)
+            return
+        try:
+            keys = sorted(pending)
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO ingestion_stats (project_id, day, accepted, sampled_out, over_quota)
+                    VALUES {placeholders(5, len(keys))}
+                    ON DUPLICATE KEY UPDATE
+                        accepted = accepted + VALUES(accepted),
+                        sampled_out = sampled_out + VALUES(sampled_out),
+                        over_quota = over_quota + VALUES(over_quota)
+                    """,
+                    [v for k in keys for v in (k[0], k[1], *(pending[k][c] for c in _COUNTERS))],
+                )
+                cursor.execute(
+                    f"""
+                    SELECT project_id, day, accepted FROM ingestion_stats
+                    WHERE (project_id, day) IN ({placeholders(2, len(keys))})
+                    """,
+                    [v for k in keys for v in k],
+                )
+                totals = cursor.fetchall()
+            conn.commit()
+        except Exception as e:
+            print(f"Ingestion stats flush failed: {e}")
+            self._restore(pending)
+            return
+        finally:
+            conn.close()
+
+        # Other processes' accepted events count against the quota too.
+        with self._lock:
+            for row in totals:
+                state = self._state.get(row["project_id"])
+                if state is not None and state["day"] == row["day"]:
+                    unflushed = self._pending.get((row["project_id"], row["day"]), {}).get("accepted", 0)
+                    state["used"] = max(state["used"], int(row["accepted"]) + unflushed)
+
+    def _restore(self, pending):
+        with self._lock:
+            for key, counts in pending.items():
+                target = self._pending.setdefault(key, dict.fromkeys(_COUNTERS, 0))
+                for c in _COUNTERS:
+                    target[c] += counts[c]
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._totals)
+            data["projects"] = len(self._state)
+            data["unflushed_keys"] = len(self._pending)
+        return data
+
+
+ingestion_gate = IngestionGate()
+atexit.register(ingestion_gate.flush)
@@ -0,0 +1,191 @@
+import os
+import re
+import hashlib
+import datetime
+from extensions.ids import new_id
+from extensions.cache import TTLCache
+from extensions.sql import placeholders
+from extensions.times import parse_time
+from functions.live import record_live_event
+
+ISSUE_STACK_FRAMES = int(os.getenv("ISSUE_STACK_FRAMES", 12))
+
+# (project_id, fingerprint) -> uptime_incidents.id of the grouped issue.
+# Only saves the id lookup after an upsert; a stale entry (issue deleted
+# since) costs a wrong id in one response, never a lost occurrence.
+_issue_cache = TTLCache(
+    maxsize=int(os.getenv("ISSUE_CACHE_SIZE", 50000)),
+    ttl=float(os.getenv("ISSUE_CACHE_TTL", 600)),
+)
+
+_UUID_RE = re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.I)
+_HEX_RE = re.compile(r"\b(?:0x)?[0-9a-f]{8,}\b", re.I)
+_NUM_RE = re.compile(r"\d+")
+_ORIGIN_RE = re.compile(r"[a-z][a-z0-9+.-]*://[^/\s)]+", re.I)
+_QUERY_RE = re.compile(r"[?#][^\s):]*")
+_LINE_COL_RE = re.compile(r"(:\d+)+(?=\)?\s*$)")
+# Content hashes in bundle names: main.3f2a1b9c.js, chunk-5e6f7a8b.js
+_BUNDLE_HASH_RE = re.compile(r"[.-][0-9a-f]{6,}(?=\.[a-z]+\b)", re.I)
+
+_ISSUE_COLUMNS = (
+    "id", "project_id", "monitor_id", "status", "started_at", "started_reason",
+    "last_error", "fingerprint", "occurrences", "last_seen_at",
+)
+
+
+def _normalize_message(message):
+    message = _UUID_RE.sub("<uuid>", message)
+    message = _HEX_RE.sub("<hex>", message)
+    return _NUM_RE.sub("<n>", message).strip()
+
+
+def _normalize_stack(stack, message=""):
+    """
+    Keeps the top ISSUE_STACK_FRAMES frames of a JS stack trace without
+    what changes between deploys and hosts: origins, query strings, bundle
+    content hashes and line/column numbers.
+    """
+    frames = []
+    for line in stack.splitlines():
+        line = line.strip()
+        if not line or (not frames and message and message in line):
+            # Chrome repeats "TypeError: <message>" as the first line.
+            continue
+        line = _ORIGIN_RE.sub("", line)
+        line = _QUERY_RE.sub("", line)
+        line = _LINE_COL_RE.sub("", line)
+        line = _BUNDLE_HASH_RE.sub("", line)
+        frames.append(line)
+        if len(frames) >= ISSUE_STACK_FRAMES:
+            break
+    return "\n".join(frames)
+
+
+def fingerprint(event_type, message, stack):
+    """40-character grouping key for an SDK error."""
+    key = "\n".join([event_type or "", _normalize_message(message or ""), _normalize_stack(stack or "", message or "")])
+    return hashlib.sha1(key.encode("utf-8", "replace")).hexdigest()
+
+
+def _parse_timestamp(value):
+    """SDK ISO timestamps as naive local time (like datetime.now()); now if missing or invalid."""
+    if value:
+        try:
+            return parse_time(str(value), "timestamp")
+        except ValueError:
+            pass
+    return datetime.datetime.now()
+
+
+def incident_record(data, project_id):
+    """Maps one SDK error payload to an uptime_incidents row."""
+    event_type = data.get("type", "unknown_error")
+    message = data.get("message", "No message provided")
+    stack = data.get("stack", "")
+    component_stack = data.get("componentStack", "")
+    url = data.get("url", "")
+    user_agent = data.get("userAgent", "")
+    timestamp = data.get("timestamp") # ISO string
+
+    # Format details into last_error
+    details = f"{message}\n\nURL: {url}\nUser Agent: {user_agent}"
+    if stack:
+        details += f"\nStack: {stack}"
+    if component_stack:
+        details += f"\nComponent Stack: {component_stack}"
+
+    return {
+        "id": new_id(),
+        "project_id": project_id,
+        "monitor_id": None,
+        "status": "open",
+        "started_at": _parse_timestamp(timestamp),
+        "started_reason": str(event_type)[:50],
+        "last_error": details,
+        "fingerprint": fingerprint(str(event_type), str(message), str(stack or "")),
+    }
+
+
+def record_issues(cursor, records):
+    """
+    Folds incident records into one grouped issue per (project_id,
+    fingerprint) with a single multi-row upsert: a new fingerprint inserts
+    an issue, a known one adds to its occurrences, moves last_seen_at and
+    last_error forward, and reopens it if it was resolved. A record's
+    optional "weight" (inverse sample rate) is what it adds to occurrences.
+
+    Returns {(project_id, fingerprint): issue_id}.
+    """
+    groups = {}
+    for r in records:
+        key = (r["project_id"], r["fingerprint"])
+        g = groups.get(key)
+        if g is None:
+            groups[key] = dict(r, occurrences=r.get("weight", 1), last_seen_at=r["started_at"])
+            continue
+        g["occurrences"] += r.get("weight", 1)
+        g["started_at"] = min(g["started_at"], r["started_at"])
+        if r["started_at"] >= g["last_seen_at"]:
+            g["last_seen_at"] = r["started_at"]
+            g["last_error"] = r["last_error"]
+    if not groups:
+        return {}
+
+    # Sorted so concurrent writers lock the unique index in the same order.
+    keys = sorted(groups)
+    rows = [dict(groups[k], occurrences=max(1, round(groups[k]["occurrences"]))) for k in keys]
+    # Assignments run left to right, so last_error compares against the
+    # old last_seen_at before it is moved.
+    cursor.execute(
+        f"""
+        INSERT INTO uptime_incidents ({', '.join(_ISSUE_COLUMNS)})
+        VALUES {placeholders(len(_ISSUE_COLUMNS), len(rows))}
+        ON DUPLICATE KEY UPDATE
+            last_error = IF(VALUES(last_seen_at) >= COALESCE(last_seen_at, started_at), VALUES(last_error), last_error),
+            last_seen_at = GREATEST(COALESCE(last_seen_at, started_at), VALUES(last_seen_at)),
+            occurrences = occurrences + VALUES(occurrences),
+            status = 'open',
+            resolved_at = NULL,
+            resolved_reason = NULL
+        """,
+        [r[c] for r in rows for c in _ISSUE_COLUMNS],
+    )
+    # Read before the live-event INSERTs below replace it.
+    affected = cursor.rowcount
+
+    # Lets open streams and cached alert counts know (one event per project).
+    for project_id in sorted({k[0] for k in keys}):
+        record_live_event(cursor, project_id, "issues.updated", {
+            "projectId": project_id,
+            "fingerprints": [k[1] for k in keys if k[0] == project_id],
+        })
+
+    # An inserted row counts 1 and an updated one 2, so this holds exactly
+    # when every fingerprint was new and kept the id generated for it.
+    if affected == len(rows):
+        ids = {k: groups[k]["id"] for k in keys}
+    else:
+        ids = {}
+        for k in keys:
+            cached = _issue_cache.get(k)
+            if cached is not None:
+                ids[k] = cached
+        missing = [k for k in keys if k not in ids]
+        if missing:
+            cursor.execute(
+                f"""
+                SELECT id, project_id, fingerprint FROM uptime_incidents
+                WHERE (project_id, fingerprint) IN ({placeholders(2, len(missing))})
+                """,
+                [v for k in missing for v in k],
+            )
+            for row in cursor.fetchall():
+                ids[(row["project_id"], row["fingerprint"])] = row["id"]
+
+    for k, issue_id in ids.items():
+        _issue_cache.set(k, issue_id)
+    return ids
+
+
+def issue_cache_stats():
+    return _issue_cache.stats()
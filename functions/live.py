@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import queue
+import threading
+from collections import deque
+from extensions.extensions import get_db_connection
+from extensions.sql import placeholders
+
+LIVE_HEARTBEATS = os.getenv("LIVE_HEARTBEATS", "on").lower() not in ("0", "off", "false", "no")
+LIVE_POLL_SECONDS = float(os.getenv("LIVE_POLL_SECONDS", 1.0))
+LIVE_KEEPALIVE_SECONDS = float(os.getenv("LIVE_KEEPALIVE_SECONDS", 15))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", 1000))
+LIVE_SUBSCRIBER_QUEUE = int(os.getenv("LIVE_SUBSCRIBER_QUEUE", 1000))
+LIVE_REPLAY_EVENTS = int(os.getenv("LIVE_REPLAY_EVENTS", 5000))
+LIVE_EVENTS_KEEP_SECONDS = int(os.getenv("LIVE_EVENTS_KEEP_SECONDS", 300))
+LIVE_GAP_WAIT_SECONDS = float(os.getenv("LIVE_GAP_WAIT_SECONDS", 5.0))
+
+_TRIM_EVERY_SECONDS = 60
+_TAIL_BATCH = 1000
+
+
+def _iso(dt):
+    return dt.isoformat() if dt is not None else None
+
+
+def record_live_events(cursor, batch):
+    """
+    Adds the live events for a batch of uptime results (see
+    UptimeResultWriter.add for the record keys) to live_events, in the
+    writer's transaction, so only committed results are streamed.
+    """
+    rows = []
+    for r in batch:
+        base = {"monitorId": r["monitor_id"], "projectId": r["project_id"]}
+        if LIVE_HEARTBEATS:
+            rows.append((r["project_id"], "heartbeat", dict(
+                base,
+                status=r["hb_status"],
+                statusCode=r["status_code"],
+                responseTimeMs=r["response_time_ms"],
+                checkedAt=_iso(r["checked_at"]),
+            )))
+        if r["prev_status"] != r["new_status"]:
+            rows.append((r["project_id"], "monitor.status", dict(
+                base, previous=r["prev_status"], status=r["new_status"], checkedAt=_iso(r["checked_at"]),
+            )))
+            if r["new_status"] == "down":
+                rows.append((r["project_id"], "incident.opened", dict(
+                    base, error=r["error_message"], startedAt=_iso(r["checked_at"]),
+                )))
+            elif r["prev_status"] == "down":
+                rows.append((r["project_id"], "incident.resolved", dict(
+                    base, resolvedAt=_iso(r["checked_at"]),
+                )))
+    if not rows:
+        return
+    cursor.execute(
+        "INSERT INTO live_events (project_id, kind, payload) VALUES "
+        + placeholders(3, len(rows)),
+        [v for project_id, kind, data in rows for v in (project_id, kind, json.dumps(data))],
+    )
+
+
+def record_live_event(cursor, project_id, kind, data):
+    """Adds one event (streamed and used for cache invalidation) in the caller's transaction."""
+    cursor.execute(
+        "INSERT INTO live_events (project_id, kind, payload) VALUES (%s, %s, %s)",
+        (project_id, kind, json.dumps(data)),
+    )
+
+
+class Subscription:
+    def __init__(self, project_ids, queue_size):
+        self.project_ids = frozenset(project_ids)
+        self.overflowed = False
+        self.resumed = False  # replayed from Last-Event-ID; no snapshot needed
+        self._queue = queue.Queue(maxsize=queue_size)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # Too slow to keep up: the stream ends and the client resumes
+            # from its Last-Event-ID out of the replay buffer.
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Next event, or None after `timeout` seconds without one."""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class LiveBroker:
+    """
+    In-process fan-out of live monitor events to SSE subscribers, keyed
+    by project. One daemon thread per process tails live_events (written
+    by the uptime worker) and publishes each new row, so the database sees
+    one small indexed query per poll however many streams are open.
+
+    The last `replay_size` events stay in memory so a reconnecting client
+    can resume from its Last-Event-ID, as long as no event after that id
+    has left the buffer (or was recorded before this process started
+    tailing); the subscription says whether it resumed. Rows come in id order, but an id
+    can commit after a higher one; the tail waits up to
+    LIVE_GAP_WAIT_SECONDS for a missing id before moving past it.
+    """
+
+    def __init__(self, max_subscribers=None, queue_size=None, replay_size=None, poll_seconds=None):
+        self.max_subscribers = max(1, int(max_subscribers or LIVE_MAX_SUBSCRIBERS))
+        self.queue_size = max(1, int(queue_size or LIVE_SUBSCRIBER_QUEUE))
+        self.poll_seconds = float(poll_seconds if poll_seconds is not None else LIVE_POLL_SECONDS)
+        self._recent = deque(maxlen=max(1, int(replay_size or LIVE_REPLAY_EVENTS)))
+        self._by_project = {}  # project_id -> set of Subscription
+        self._listeners = []
+        self._count = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._floor = None  # every id <= floor has been published
+        self._replay_after = None  # every event after this id is in _recent or still to come
+        self._seen = set()  # ids > floor already published
+        self._gap_since = None
+        self._last_trim = 0.0
+        self._counters = {"published": 0, "overflowed": 0, "rejected": 0, "tail_errors": 0}
+
+    def add_listener(self, callback):
+        """callback(event) runs on the tail thread for every event published."""
+        self._listeners.append(callback)
+
+    def start(self):
+        """Starts tailing live_events without a subscriber (e.g. for listeners)."""
+        with self._lock:
+            self._ensure_tail()
+
+    def subscribe(self, project_ids, last_event_id=None):
+        """Returns a Subscription, or None when the process is at its limit."""
+        sub = Subscription(project_ids, self.queue_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self._counters["rejected"] += 1
+                return None
+            for project_id in sub.project_ids:
+                self._by_project.setdefault(project_id, set()).add(sub)
+            self._count += 1
+            sub.resumed = (
+                last_event_id is not None
+                and self._replay_after is not None
+                and last_event_id >= self._replay_after
+            )
+            if sub.resumed:
+                for event in self._recent:
+                    if event["id"] > last_event_id and event["project_id"] in sub.project_ids:
+                        sub.put(event)
+            self._ensure_tail()
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for project_id in sub.project_ids:
+                subs = self._by_project.get(project_id)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._by_project[project_id]
+            self._count -= 1
+            if sub.overflowed:
+                self._counters["overflowed"] += 1
+
+    def publish(self, event):
+        """event: {"id", "project_id", "kind", "data" (JSON text)}"""
+        with self._lock:
+            if len(self._recent) == self._recent.maxlen:
+                self._replay_after = max(self._replay_after, self._recent[0]["id"])
+            self._recent.append(event)
+            self._counters["published"] += 1
+            for sub in self._by_project.get(event["project_id"], ()):
+                sub.put(event)
+        for callback in self._listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                print("Live event listener error:", e)
+
+    def _ensure_tail(self):
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._floor = None
+            self._seen = set()
+            self._replay_after = None
+            self._recent.clear()
+            self._thread = threading.Thread(target=self._run, name="live-tail", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print("Live events tail error:", e)
+                with self._lock:
+                    self._counters["tail_errors"] += 1
+            time.sleep(self.poll_seconds)
+
+    def poll(self):
+        conn = get_db_connection()
+        if not conn:
+            return
+        try:
+            with conn.cursor() as cursor:
+                if self._floor is None:
+                    # Start from now; older events are not replayed.
+                    cursor.execute("SELECT COALESCE(MAX(id), 0) AS id FROM live_events")
+                    self._floor = int(cursor.fetchone()["id"])
+                    with self._lock:
+                        self._replay_after = self._floor
+                cursor.execute(
+                    """
+                    SELECT id, project_id, kind, payload
+                    FROM live_events
+                    WHERE id > %s
+                    ORDER BY id
+                    LIMIT %s
+                    """,
+                    (self._floor, _TAIL_BATCH),
+                )
+                rows = cursor.fetchall()
+                if time.monotonic() - self._last_trim >= _TRIM_EVERY_SECONDS:
+                    self._last_trim = time.monotonic()
+                    cursor.execute(
+                        "DELETE FROM live_events WHERE created_at < NOW() - INTERVAL %s SECOND LIMIT 10000",
+                        (LIVE_EVENTS_KEEP_SECONDS,),
+                    )
+            conn.commit()
+        finally:
+            conn.close()
+
+        for r in rows:
+            if r["id"] in self._seen:
+                continue
+            self._seen.add(r["id"])
+            self.publish({"id": r["id"], "project_id": r["project_id"], "kind": r["kind"], "data": r["payload"]})
+        self._advance()
+
+    def _advance(self):
+        while self._floor + 1 in self._seen:
+            self._floor += 1
+            self._seen.discard(self._floor)
+        if not self._seen:
+            self._gap_since = None
+            return
+        # An id below the ones already published hasn't committed (or never
+        # will: rolled back); give it a moment, then move past it.
+        if self._gap_since is None:
+            self._gap_since = time.monotonic()
+        elif time.monotonic() - self._gap_since >= LIVE_GAP_WAIT_SECONDS:
+            self._floor = min(self._seen) - 1
+            self._gap_since = None
+            self._advance()
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counters)
+            data["subscribers"] = self._count
+            data["projects"] = len(self._by_project)
+            data["last_event_id"] = self._floor
+        return data
+
+
+live_broker = LiveBroker()
@@ -1,9 +1,15 @@
-from flask import Blueprint, request, jsonify, g
+from flask import Blueprint, request, jsonify, g, Response
 from extensions.extensions import get_db_connection
 from functions.dashboard import login_required
-import uuid
+from functions.projects import event_stream_login_required
+from functions.rollups import rollup_rows_sql
+from extensions.ids import new_id
+from functions.live import live_broker, record_live_event, LIVE_KEEPALIVE_SECONDS
 import pymysql
+import json
 from datetime import datetime, timedelta
+from extensions.sql import in_list
+from extensions.pagination import page_args, keyset_condition, keyset_params, paginate
 
 monitors_bp = Blueprint('monitors', __name__)
 
@@ -20,47 +26,154 @@ def format_time_ago(dt):
         return f"{int(diff.total_seconds() // 3600)}h ago"
     return f"{diff.days}d ago"
 
+MONITORS_PAGE_DEFAULT = 500
+MONITORS_PAGE_MAX = 1000
+HISTORY_POINTS = 12
+
+def _fetch_recent_heartbeats(cursor, since_by_monitor):
+    """
+    One ranked query for a whole page of monitors: the last HISTORY_POINTS
+    heartbeats per monitor since its own `since_by_monitor` time, newest
+    first (rn = 1 is the latest). Monitors sharing a bound share one
+    IN list, and each bound keeps its monitors' scan to a short range of
+    the (monitor_id, checked_at) index.
+    """
+    by_since = {}
+    for monitor_id, since in since_by_monitor.items():
+        by_since.setdefault(since, []).append(monitor_id)
+    ranges = []
+    params = []
+    for since, monitor_ids in by_since.items():
+        ranges.append(f"(h.monitor_id IN ({in_list(len(monitor_ids))}) AND h.checked_at >= %s)")
+        params += monitor_ids + [since]
+    params.append(HISTORY_POINTS)
+    cursor.execute(f"""
+        SELECT monitor_id, status, response_time_ms, dns_ms, connect_ms, tls_ms, ttfb_ms, checked_at, rn
+        FROM (
+            SELECT
+                h.monitor_id,
+                h.status,
+                h.response_time_ms,
+                h.dns_ms,
+                h.connect_ms,
+                h.tls_ms,
+                h.ttfb_ms,
+                h.checked_at,
+                ROW_NUMBER() OVER (PARTITION BY h.monitor_id ORDER BY h.checked_at DESC) AS rn
+            FROM uptime_heartbeats h
+            WHERE {" OR ".join(ranges)}
+        ) ranked
+        WHERE rn <= %s
+        ORDER BY monitor_id, rn
+    """, tuple(params))
+
+    by_monitor = {}
+    for row in cursor.fetchall():
+        by_monitor.setdefault(row['monitor_id'], []).append(row)
+    return by_monitor
+
+def _fetch_last_heartbeats(cursor, monitor_ids):
+    """
+    The last HISTORY_POINTS heartbeats of monitors with no recent checks,
+    however long ago those were. Each monitor gets its own LIMITed branch,
+    a short backward read of the (monitor_id, checked_at) index, instead
+    of a window over its whole history.
+    """
+    branch = """
+        (SELECT monitor_id, status, response_time_ms, dns_ms, connect_ms, tls_ms, ttfb_ms, checked_at
+         FROM uptime_heartbeats
+         WHERE monitor_id = %s
+         ORDER BY checked_at DESC
+         LIMIT %s)
+    """
+    params = []
+    for monitor_id in monitor_ids:
+        params += [monitor_id, HISTORY_POINTS]
+    cursor.execute(" UNION ALL ".join([branch] * len(monitor_ids)), tuple(params))
+
+    by_monitor = {}
+    for row in cursor.fetchall():
+        by_monitor.setdefault(row['monitor_id'], []).append(row)
+    for rows in by_monitor.values():
+        rows.sort(key=lambda r: r['checked_at'], reverse=True)
+    return by_monitor
+
+def _fetch_window_stats(cursor, monitor_ids, since):
+    """Per-monitor check count, up count and average latency from the rollups."""
+    rollup_sql, rollup_params = rollup_rows_sql(
+        since,
+        columns="monitor_id, check_count, up_count, latency_count, latency_sum",
+        where=f"monitor_id IN ({in_list(len(monitor_ids))})",
+        where_params=monitor_ids,
+    )
+    cursor.execute(f"""
+        SELECT
+            r.monitor_id,
+            SUM(r.check_count) AS total_checks,
+            SUM(r.up_count) AS up_checks,
+            SUM(r.latency_sum) / NULLIF(SUM(r.latency_count), 0) AS avg_latency
+        FROM ({rollup_sql}) r
+        GROUP BY r.monitor_id
+    """, tuple(rollup_params))
+    return {row['monitor_id']: row for row in cursor.fetchall()}
+
 @monitors_bp.route('/monitors', methods=['GET'])
 @login_required
 def get_monitors():
+    """
+    Monitors of the user's projects, newest first, one page at a time:
+    pass `next_cursor` back as `cursor`.
+    """
+    try:
+        limit, after = page_args(request.args, MONITORS_PAGE_DEFAULT, MONITORS_PAGE_MAX)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     conn = get_db_connection()
     cursor = conn.cursor(pymysql.cursors.DictCursor)
     
     try:
-        # Get all monitors for projects the user is subscribed to
-        cursor.execute("""
-            SELECT m.id, m.name, m.url, m.project_id, m.interval_seconds as check_interval
+        # Get a page of monitors for projects the user is subscribed to
+        query = """
+            SELECT m.id, m.name, m.url, m.project_id, m.interval_seconds as check_interval, m.created_at
             FROM uptime_monitors m
             JOIN subscriptions s ON m.project_id = s.project_id
             WHERE s.user_id = %s AND m.deleted_at IS NULL
-        """, (request.user_id,))
-        monitors = cursor.fetchall()
+        """
+        params = [request.user_id]
+        if after:
+            query += " AND " + keyset_condition("m.created_at", "m.id")
+            params.extend(keyset_params(after))
+        query += " ORDER BY m.created_at DESC, m.id DESC LIMIT %s"
+        params.append(limit + 1)
+        cursor.execute(query, tuple(params))
+        monitors, next_cursor = paginate(cursor.fetchall(), limit, "created_at")
+
+        heartbeats = {}
+        window_stats = {}
+        if monitors:
+            monitor_ids = [m['id'] for m in monitors]
+            now = datetime.now()
+            window_stats = _fetch_window_stats(cursor, monitor_ids, now - timedelta(hours=24))
+
+            # The last HISTORY_POINTS checks of an active monitor fall inside
+            # HISTORY_POINTS of its intervals (plus slack for worker lag).
+            heartbeats = _fetch_recent_heartbeats(cursor, {
+                m['id']: now - timedelta(seconds=(HISTORY_POINTS + 2) * int(m['check_interval'] or 60))
+                for m in monitors
+            })
+
+            # Monitors without recent checks (paused, worker down) still
+            # show their last known checks; at most one more query.
+            stale_ids = [mid for mid in monitor_ids if mid not in heartbeats]
+            if stale_ids:
+                heartbeats.update(_fetch_last_heartbeats(cursor, stale_ids))
         
         result = []
         for monitor in monitors:
-            monitor_id = monitor['id']
-            
-            # Get latest check for status and last_check
-            cursor.execute("""
-                SELECT status, response_time_ms, checked_at
-                FROM uptime_heartbeats
-                WHERE monitor_id = %s
-                ORDER BY checked_at DESC
-                LIMIT 1
-            """, (monitor_id,))
-            latest_check = cursor.fetchone()
-            
-            # Calculate uptime and average latency for last 24h
-            yesterday = datetime.now() - timedelta(hours=24)
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_checks,
-                    SUM(CASE WHEN status = 'up' OR status_code >= 200 AND status_code < 300 THEN 1 ELSE 0 END) as up_checks,
-                    AVG(response_time_ms) as avg_latency
-                FROM uptime_heartbeats
-                WHERE monitor_id = %s AND checked_at >= %s
-            """, (monitor_id, yesterday))
-            stats = cursor.fetchone()
+            rows = heartbeats.get(monitor['id'], [])
+            latest_check = rows[0] if rows else None
+            stats = window_stats.get(monitor['id'])
             
             # Determine status
             status = "down"
@@ -95,17 +208,9 @@ def get_monitors():
             elif latest_check and latest_check.get('response_time_ms'):
                  latency_display = f"{int(latest_check['response_time_ms'])}ms"
 
-            # Get history for sparkline (last 12 checks)
-            cursor.execute("""
-                SELECT response_time_ms, status
-                FROM uptime_heartbeats
-                WHERE monitor_id = %s
-                ORDER BY checked_at DESC
-                LIMIT 12
-            """, (monitor_id,))
-            history_rows = cursor.fetchall()
+            # History for sparkline (last 12 checks, newest first)
             history = []
-            for h in history_rows:
+            for h in rows:
                 history.append({
                     'latency': h['response_time_ms'],
                     'status': h['status']
@@ -120,10 +225,17 @@ def get_monitors():
                 "latency": latency_display,
                 "lastCheck": last_check_time,
                 "uptime": uptime,
-                "history": history
+                "history": history,
+                "timings": {
+                    "dns": latest_check.get('dns_ms'),
+                    "connect": latest_check.get('connect_ms'),
+                    "tls": latest_check.get('tls_ms'),
+                    "ttfb": latest_check.get('ttfb_ms'),
+                    "total": latest_check.get('response_time_ms'),
+                } if latest_check else None
             })
-            
-        return jsonify(result), 200
+
+        return jsonify({"monitors": result, "next_cursor": next_cursor}), 200
         
     except Exception as e:
         print(f"Error fetching monitors: {e}")
@@ -131,6 +243,90 @@ def get_monitors():
     finally:
         conn.close()
 
+def _sse(event_id, kind, data):
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {kind}\ndata: {data}\n\n"
+
+@monitors_bp.route('/monitors/stream', methods=['GET'])
+@event_stream_login_required
+def stream_monitors():
+    """
+    Server-Sent Events: monitor status changes, heartbeats and incident
+    open/resolve events for the user's projects, as the uptime worker
+    records them. Costs two queries per connection (projects and a status
+    snapshot); events come from the process-wide live_broker.
+
+    A reconnect with Last-Event-ID is resumed from the broker's replay
+    buffer when it still holds everything after that id; otherwise (the
+    id is older, or came from another process or before a restart) the
+    client gets a fresh snapshot instead.
+    """
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.args.get('lastEventId') or 0) or None
+    except ValueError:
+        last_event_id = None
+
+    conn = get_db_connection()
+    if not conn:
+        return jsonify({"error": "Database connection failed"}), 500
+    sub = None
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT project_id FROM subscriptions WHERE user_id = %s", (request.user_id,))
+            project_ids = [r['project_id'] for r in cursor.fetchall()]
+
+            # Subscribed before the snapshot is read, so nothing recorded in
+            # between is missed; such events just arrive after it.
+            sub = live_broker.subscribe(project_ids, last_event_id)
+            if sub is None:
+                response = jsonify({"error": "Too many open streams, try again later"})
+                response.headers['Retry-After'] = "5"
+                return response, 503
+
+            snapshot = []
+            if project_ids and not sub.resumed:
+                cursor.execute(f"""
+                    SELECT id, project_id, status, last_checked_at
+                    FROM uptime_monitors
+                    WHERE project_id IN ({in_list(len(project_ids))}) AND deleted_at IS NULL
+                """, tuple(project_ids))
+                snapshot = [
+                    {
+                        "monitorId": r['id'],
+                        "projectId": r['project_id'],
+                        "status": r['status'],
+                        "lastCheckedAt": r['last_checked_at'].isoformat() if r['last_checked_at'] else None,
+                    }
+                    for r in cursor.fetchall()
+                ]
+        conn.commit()
+    except Exception as e:
+        print(f"Error opening monitor stream: {e}")
+        if sub is not None:
+            live_broker.unsubscribe(sub)
+        return jsonify({"error": "Internal server error"}), 500
+    finally:
+        conn.close()
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            if not sub.resumed:
+                yield _sse(None, "snapshot", json.dumps(snapshot))
+            while not sub.overflowed:
+                event = sub.get(LIVE_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield _sse(event['id'], event['kind'], event['data'])
+        finally:
+            live_broker.unsubscribe(sub)
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
 @monitors_bp.route('/monitors', methods=['POST'])
 @login_required
 def create_monitor():
@@ -156,7 +352,7 @@ def create_monitor():
         if not cursor.fetchone():
             return jsonify({"error": "Unauthorized access to project"}), 403
             
-        monitor_id = str(uuid.uuid4())
+        monitor_id = new_id()
         # Clean URL
         url = url.strip().strip('`').strip()
         
@@ -164,6 +360,7 @@ def create_monitor():
             INSERT INTO uptime_monitors (id, project_id, name, url, interval_seconds, next_check_at)
             VALUES (%s, %s, %s, %s, %s, NOW())
         """, (monitor_id, project_id, name, url, check_interval))
+        record_live_event(cursor, project_id, "monitor.created", {"monitorId": monitor_id, "projectId": project_id})
         
         conn.commit()
         
@@ -194,13 +391,14 @@ def delete_monitor(monitor_id):
     try:
         # Verify ownership (via project subscription)
         cursor.execute("""
-            SELECT m.id 
+            SELECT m.id, m.project_id
             FROM uptime_monitors m
             JOIN subscriptions s ON m.project_id = s.project_id
             WHERE m.id = %s AND s.user_id = %s
         """, (monitor_id, request.user_id))
         
-        if not cursor.fetchone():
+        monitor = cursor.fetchone()
+        if not monitor:
             return jsonify({"error": "Monitor not found or unauthorized"}), 404
             
         # Soft delete
@@ -209,6 +407,7 @@ def delete_monitor(monitor_id):
             SET deleted_at = NOW(), is_active = FALSE
             WHERE id = %s
         """, (monitor_id,))
+        record_live_event(cursor, monitor['project_id'], "monitor.deleted", {"monitorId": monitor_id, "projectId": monitor['project_id']})
         
         conn.commit()
         return jsonify({"message": "Monitor deleted successfully"}), 200
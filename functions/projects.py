@@ -1,33 +1,54 @@
 from extensions.extensions import get_db_connection
 from flask import Blueprint, request, jsonify
 import jwt
-import uuid
+from extensions.ids import new_id
 from functools import wraps
+from functions.response_cache import response_cache
 
 projects_bp = Blueprint("projects", __name__)
 
 JWT_SECRET = "watchupisthebest"
 
+def _authenticate(token):
+    """Sets request.user_id from the JWT; returns an error response, or None."""
+    if not token:
+        return jsonify({"error": "Token is missing"}), 401
+
+    try:
+        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        request.user_id = payload["id"]
+    except jwt.ExpiredSignatureError:
+        return jsonify({"error": "Token has expired"}), 401
+    except jwt.InvalidTokenError:
+        return jsonify({"error": "Invalid token"}), 401
+    return None
+
+def _bearer_token():
+    auth_header = request.headers.get("Authorization", "")
+    if auth_header.startswith("Bearer "):
+        return auth_header.split(" ")[1]
+    return None
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        token = None
-        if "Authorization" in request.headers:
-            auth_header = request.headers["Authorization"]
-            if auth_header.startswith("Bearer "):
-                token = auth_header.split(" ")[1]
-        
-        if not token:
-            return jsonify({"error": "Token is missing"}), 401
-        
-        try:
-            payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-            request.user_id = payload["id"]
-        except jwt.ExpiredSignatureError:
-            return jsonify({"error": "Token has expired"}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({"error": "Invalid token"}), 401
-            
+        error = _authenticate(_bearer_token())
+        if error:
+            return error
+        return f(*args, **kwargs)
+    return decorated_function
+
+def event_stream_login_required(f):
+    """
+    login_required for Server-Sent Events endpoints only: EventSource can't
+    set headers, so the token may also come as ?token=. Anywhere else a
+    token in the URL would end up in access logs and browser history.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        error = _authenticate(_bearer_token() or request.args.get("token"))
+        if error:
+            return error
         return f(*args, **kwargs)
     return decorated_function
 
@@ -101,7 +122,7 @@ def create_project():
             return jsonify({"error": "Project name is required"}), 400
             
         user_id = request.user_id
-        project_id = str(uuid.uuid4())
+        project_id = new_id()
         
         # Include project id in description as requested
         description = f"{description} [Project ID: {project_id}]"
@@ -119,7 +140,7 @@ def create_project():
                 )
                 
                 # 2. Subscribe User to Project
-                subscription_id = str(uuid.uuid4())
+                subscription_id = new_id()
                 cursor.execute(
                     """
                     INSERT INTO subscriptions (id, user_id, project_id) 
@@ -137,6 +158,8 @@ def create_project():
         finally:
             conn.close()
 
+        # The user's cached dashboard and alerts don't cover this project yet.
+        response_cache.invalidate_user(user_id)
         return jsonify({"project": new_project, "message": "Project created and subscribed successfully"}), 201
 
     except Exception as e:
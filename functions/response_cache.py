@@ -0,0 +1,211 @@
+import os
+import hashlib
+import threading
+import time
+from functools import wraps
+from flask import request, make_response
+from extensions.cache import TTLCache
+from extensions.extensions import get_db_connection
+from functions.live import live_broker
+
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", 30))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 20000))
+# Heartbeats only nudge 24h aggregates, so entries younger than this
+# survive them; incidents and status changes always invalidate.
+RESPONSE_CACHE_MIN_FRESH_SECONDS = float(os.getenv("RESPONSE_CACHE_MIN_FRESH_SECONDS", 5))
+
+
+class ResponseCache:
+    """
+    Per-user cache of rendered JSON responses with TTL expiry, indexed by
+    the projects each response was built from so a change in one project
+    drops just the responses that depend on it. Invalidations are driven
+    by the live event feed (functions/live.py), which carries the uptime
+    worker's heartbeats and incidents from its own process.
+
+    A response computed while an invalidation for one of its projects
+    came in is served but not stored, so a stale result never outlives
+    the event that made it stale. Invalidations are remembered for one
+    TTL; a response that took longer than that to compute is not stored
+    either.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self.ttl = float(ttl if ttl is not None else RESPONSE_CACHE_TTL_SECONDS)
+        self._entries = TTLCache(maxsize=maxsize or RESPONSE_CACHE_MAX_ENTRIES, ttl=self.ttl)
+        self._user_projects = TTLCache(maxsize=maxsize or RESPONSE_CACHE_MAX_ENTRIES, ttl=self.ttl)
+        self._by_project = {}  # project_id -> set of keys (may hold expired keys)
+        self._by_user = {}  # user_id -> set of keys
+        self._generation = 0
+        self._project_generation = {}  # project_id -> (generation, time) of its last invalidation, oldest first
+        self._forgotten_generation = 0  # newest generation dropped from _project_generation
+        self._stores_since_prune = 0
+        self._lock = threading.Lock()
+        self._counters = {"not_modified": 0, "stored": 0, "skipped_stale": 0, "project_invalidations": 0}
+
+    def generation(self):
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        return self._entries.get(key)
+
+    def set(self, key, entry, project_ids, since_generation):
+        with self._lock:
+            if since_generation < self._forgotten_generation or any(
+                self._project_generation.get(p, (0,))[0] > since_generation for p in project_ids
+            ):
+                self._counters["skipped_stale"] += 1
+                return False
+            for p in project_ids:
+                self._by_project.setdefault(p, set()).add(key)
+            self._by_user.setdefault(key[1], set()).add(key)
+            self._counters["stored"] += 1
+            self._stores_since_prune += 1
+            prune = self._stores_since_prune >= self._entries.maxsize
+            if prune:
+                self._stores_since_prune = 0
+        self._entries.set(key, entry)
+        if prune:
+            self._prune()
+        return True
+
+    def _prune(self):
+        """Drops index entries for responses that expired or were evicted."""
+        with self._lock:
+            for index in (self._by_project, self._by_user):
+                for k in list(index):
+                    live = {key for key in index[k] if self._entries.peek(key) is not None}
+                    if live:
+                        index[k] = live
+                    else:
+                        del index[k]
+
+    def _forget_generations(self, now):
+        """Drops invalidations older than the TTL; call with the lock held."""
+        while self._project_generation:
+            project_id, (generation, at) = next(iter(self._project_generation.items()))
+            if now - at < self.ttl:
+                return
+            del self._project_generation[project_id]
+            self._forgotten_generation = generation
+
+    def project_ids(self, user_id):
+        """The user's subscribed projects; one query per TTL per user."""
+        project_ids = self._user_projects.get(user_id)
+        if project_ids is not None:
+            return project_ids
+        conn = get_db_connection()
+        if not conn:
+            return None
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT project_id FROM subscriptions WHERE user_id = %s", (user_id,))
+                project_ids = frozenset(r["project_id"] for r in cursor.fetchall())
+            conn.commit()
+        finally:
+            conn.close()
+        self._user_projects.set(user_id, project_ids)
+        return project_ids
+
+    def invalidate_project(self, project_id, heartbeat=False):
+        now = time.monotonic()
+        with self._lock:
+            keys = self._by_project.get(project_id, set())
+            if heartbeat:
+                doomed = set()
+                for key in keys:
+                    entry = self._entries.peek(key)
+                    if entry is None or now - entry["stored_at"] >= RESPONSE_CACHE_MIN_FRESH_SECONDS:
+                        doomed.add(key)
+            else:
+                doomed = set(keys)
+                self._generation += 1
+                # Re-inserted so the dict stays ordered by generation.
+                self._project_generation.pop(project_id, None)
+                self._project_generation[project_id] = (self._generation, now)
+                self._forget_generations(now)
+            keys -= doomed
+            if not keys:
+                self._by_project.pop(project_id, None)
+            self._counters["project_invalidations"] += 1
+        for key in doomed:
+            self._entries.delete(key)
+
+    def invalidate_user(self, user_id):
+        self._user_projects.delete(user_id)
+        with self._lock:
+            keys = self._by_user.pop(user_id, set())
+        for key in keys:
+            self._entries.delete(key)
+
+    def on_live_event(self, event):
+        self.invalidate_project(event["project_id"], heartbeat=event["kind"] == "heartbeat")
+
+    def count_not_modified(self):
+        with self._lock:
+            self._counters["not_modified"] += 1
+
+    def stats(self):
+        data = self._entries.stats()
+        with self._lock:
+            data.update(self._counters)
+        return data
+
+
+response_cache = ResponseCache()
+live_broker.add_listener(response_cache.on_live_event)
+
+
+def _etag_response(entry):
+    response = make_response(entry["body"], 200)
+    response.mimetype = entry["mimetype"]
+    response.set_etag(entry["etag"])
+    # Browsers keep the copy but revalidate it with If-None-Match each time.
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+
+def cached_response(namespace):
+    """
+    Caches a login_required GET handler's 200 responses per user and query
+    string, and answers If-None-Match with 304 when the body is unchanged
+    (whether it came from the cache or was just rebuilt). Streamed
+    responses are passed through untouched.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = (namespace, request.user_id, tuple(sorted(request.args.items(multi=True))))
+            live_broker.start()
+            entry = response_cache.get(key)
+            if entry is None:
+                since = response_cache.generation()
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                entry = {
+                    "body": body,
+                    "mimetype": response.mimetype,
+                    "etag": hashlib.sha1(body).hexdigest(),
+                    "stored_at": time.monotonic(),
+                }
+                try:
+                    project_ids = response_cache.project_ids(request.user_id)
+                except Exception as e:
+                    print("Response cache: project lookup failed:", e)
+                    project_ids = None
+                if project_ids is not None:
+                    response_cache.set(key, entry, project_ids, since)
+                cache_status = "MISS"
+            else:
+                cache_status = "HIT"
+
+            response = _etag_response(entry)
+            response.headers["X-Cache"] = cache_status
+            if response.status_code == 304:
+                response_cache.count_not_modified()
+            return response
+        return decorated_function
+    return decorator
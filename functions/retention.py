@@ -0,0 +1,211 @@
+import os
+import time
+from datetime import datetime, timedelta
+from extensions.extensions import get_db_connection
+from extensions.partitions import ensure_future_partitions, drop_expired_partitions
+from functions.rollups import ROLLUP_TABLES, rollup_watermark, write_rollups
+from extensions.sql import in_list
+
+
+def _days(name, default):
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return None if value.lower() in ("", "none", "forever") else int(value)
+
+
+# Days to keep per plan; None keeps forever. The plan is "paid" when the
+# project has an active subscription that hasn't expired, the same rule
+# sdk_auth_required uses for request.sdk_is_free.
+RETENTION_POLICIES = {
+    "free": {
+        "raw": _days("RETENTION_FREE_RAW_DAYS", 7),
+        "minute": _days("RETENTION_FREE_MINUTE_DAYS", 14),
+        "hour": _days("RETENTION_FREE_HOUR_DAYS", 90),
+        "day": _days("RETENTION_FREE_DAY_DAYS", 400),
+    },
+    "paid": {
+        "raw": _days("RETENTION_PAID_RAW_DAYS", 30),
+        "minute": _days("RETENTION_PAID_MINUTE_DAYS", 30),
+        "hour": _days("RETENTION_PAID_HOUR_DAYS", 400),
+        "day": _days("RETENTION_PAID_DAY_DAYS", None),
+    },
+}
+
+def rollup_kept_since(is_paid, now=None):
+    """
+    {"minute" | "hour" | "day": oldest rollup bucket retention keeps for
+    the plan, or None when kept forever}; reports read around the gaps.
+    """
+    now = now or datetime.now()
+    policy = RETENTION_POLICIES["paid" if is_paid else "free"]
+    return {
+        resolution: now - timedelta(days=policy[resolution]) if policy[resolution] is not None else None
+        for resolution in ROLLUP_TABLES
+    }
+
+
+def project_is_paid(cursor, project_id):
+    cursor.execute(
+        """
+        SELECT EXISTS (
+            SELECT 1 FROM subscriptions
+            WHERE project_id = %s AND is_active = TRUE AND expires_at > NOW()
+        ) AS is_paid
+        """,
+        (project_id,),
+    )
+    return bool(cursor.fetchone()["is_paid"])
+
+
+RETENTION_CHUNK_SIZE = int(os.getenv("RETENTION_CHUNK_SIZE", 1000))
+RETENTION_CHUNK_PAUSE_SECONDS = float(os.getenv("RETENTION_CHUNK_PAUSE_SECONDS", 0.05))
+
+
+def _monitor_plans(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT
+                m.id,
+                m.project_id,
+                EXISTS (
+                    SELECT 1 FROM subscriptions s
+                    WHERE s.project_id = m.project_id
+                      AND s.is_active = TRUE
+                      AND s.expires_at > NOW()
+                ) AS is_paid
+            FROM uptime_monitors m
+            """
+        )
+        rows = cursor.fetchall()
+    conn.commit()
+    return rows
+
+
+def _expire_heartbeats(conn, monitor_id, cutoff, chunk_size, pause_seconds):
+    """
+    Deletes one monitor's heartbeats older than `cutoff`, oldest first, one
+    short transaction per chunk. Rows the rollups don't cover yet (older
+    than the rollup watermark) are downsampled into them in the same
+    transaction before they go.
+    """
+    deleted = 0
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT id, monitor_id, project_id, checked_at, status AS hb_status, response_time_ms
+                FROM uptime_heartbeats
+                WHERE monitor_id = %s AND checked_at < %s
+                ORDER BY checked_at
+                LIMIT %s
+                """,
+                (monitor_id, cutoff, chunk_size),
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+
+            watermark = rollup_watermark(cursor)
+            pending = [r for r in rows if r["checked_at"] < watermark]
+            if pending:
+                write_rollups(cursor, pending)
+
+            # Stay on the (monitor_id, checked_at) range just read; the
+            # primary key may be (checked_at, id) on partitioned tables.
+            cursor.execute(
+                f"""
+                DELETE FROM uptime_heartbeats
+                WHERE monitor_id = %s AND checked_at <= %s AND id IN ({in_list(len(rows))})
+                """,
+                [monitor_id, rows[-1]["checked_at"]] + [r["id"] for r in rows],
+            )
+        conn.commit()
+        deleted += len(rows)
+        if len(rows) < chunk_size:
+            break
+        time.sleep(pause_seconds)
+    conn.commit()
+    return deleted
+
+
+def _expire_rollups(conn, table, monitor_id, cutoff, chunk_size, pause_seconds):
+    deleted = 0
+    while True:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {table} WHERE monitor_id = %s AND bucket_start < %s LIMIT %s",
+                (monitor_id, cutoff, chunk_size),
+            )
+            affected = cursor.rowcount
+        conn.commit()
+        deleted += affected
+        if affected < chunk_size:
+            break
+        time.sleep(pause_seconds)
+    return deleted
+
+
+def _maintain_partitions(conn, now):
+    """
+    On a partitioned uptime_heartbeats, creates the partitions ahead and
+    drops whole partitions past the longest raw retention of any plan, so
+    the per-monitor deletes below only handle plans with shorter limits.
+    """
+    raw_days = [p["raw"] for p in RETENTION_POLICIES.values()]
+    with conn.cursor() as cursor:
+        added = ensure_future_partitions(cursor)
+        dropped = []
+        if None not in raw_days:
+            dropped = drop_expired_partitions(
+                cursor, now - timedelta(days=max(raw_days)), rollup_watermark(cursor)
+            )
+    conn.commit()
+    if added or dropped:
+        print(f"Retention: added partitions {added}, dropped partitions {dropped}")
+
+
+def run_retention_once(chunk_size=None, pause_seconds=None):
+    chunk_size = int(chunk_size or RETENTION_CHUNK_SIZE)
+    pause_seconds = RETENTION_CHUNK_PAUSE_SECONDS if pause_seconds is None else float(pause_seconds)
+
+    conn = get_db_connection()
+    if not conn:
+        print("Retention: database connection failed")
+        return
+
+    totals = {"raw": 0, "minute": 0, "hour": 0, "day": 0}
+    try:
+        now = datetime.now()
+        _maintain_partitions(conn, now)
+        for m in _monitor_plans(conn):
+            policy = RETENTION_POLICIES["paid" if m["is_paid"] else "free"]
+
+            if policy["raw"] is not None:
+                totals["raw"] += _expire_heartbeats(
+                    conn, m["id"], now - timedelta(days=policy["raw"]), chunk_size, pause_seconds
+                )
+
+            for resolution, table in ROLLUP_TABLES.items():
+                if policy[resolution] is None:
+                    continue
+                totals[resolution] += _expire_rollups(
+                    conn, table, m["id"], now - timedelta(days=policy[resolution]), chunk_size, pause_seconds
+                )
+    finally:
+        conn.close()
+
+    print(
+        "Retention: deleted {raw} heartbeats, {minute} minute / {hour} hour / {day} day rollups".format(**totals)
+    )
+    return totals
+
+
+def run_retention_worker_forever(interval_seconds=3600):
+    while True:
+        try:
+            run_retention_once()
+        except Exception as e:
+            print("Retention worker error:", e)
+        time.sleep(interval_seconds)
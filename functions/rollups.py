@@ -0,0 +1,306 @@
+import json
+import math
+from datetime import datetime, timedelta
+from extensions.sql import placeholders
+
+ROLLUP_TABLES = {
+    "minute": "uptime_rollup_minute",
+    "hour": "uptime_rollup_hour",
+    "day": "uptime_rollup_day",
+}
+
+
+class LatencySketch:
+    """
+    Mergeable latency histogram with logarithmic buckets (DDSketch style).
+    Any quantile is returned within RELATIVE_ACCURACY of the true value,
+    and two sketches merge by adding bucket counts, so minute rollups can
+    be folded into hours/days and days into arbitrary report windows.
+    """
+
+    RELATIVE_ACCURACY = 0.02
+    GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+    _LOG_GAMMA = math.log(GAMMA)
+
+    def __init__(self, buckets=None, zero_count=0):
+        self.buckets = dict(buckets or {})
+        self.zero_count = int(zero_count)
+
+    @property
+    def count(self):
+        return self.zero_count + sum(self.buckets.values())
+
+    def add(self, value, count=1):
+        if value is None:
+            return
+        if value <= 0:
+            self.zero_count += count
+            return
+        idx = int(math.ceil(math.log(value) / self._LOG_GAMMA))
+        self.buckets[idx] = self.buckets.get(idx, 0) + count
+
+    def merge(self, other):
+        if other is None:
+            return self
+        self.zero_count += other.zero_count
+        for idx, c in other.buckets.items():
+            self.buckets[idx] = self.buckets.get(idx, 0) + c
+        return self
+
+    def quantile(self, q):
+        total = self.count
+        if total == 0:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if rank < seen:
+                return 2 * (self.GAMMA ** idx) / (self.GAMMA + 1)
+        return 2 * (self.GAMMA ** max(self.buckets)) / (self.GAMMA + 1)
+
+    def to_json(self):
+        return json.dumps({"z": self.zero_count, "b": self.buckets}, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw):
+        if not raw:
+            return cls()
+        data = json.loads(raw)
+        return cls({int(k): v for k, v in data.get("b", {}).items()}, data.get("z", 0))
+
+
+def bucket_start(dt, resolution):
+    if resolution == "minute":
+        return dt.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil(dt, resolution):
+    start = bucket_start(dt, resolution)
+    if start == dt:
+        return start
+    return start + (timedelta(hours=1) if resolution == "hour" else timedelta(days=1))
+
+
+def _minute_ranges(since, until):
+    h1, h2 = _ceil(since, "hour"), bucket_start(until, "hour")
+    if h1 >= h2:
+        return [("minute", since, until)]
+
+    ranges = [("minute", since, h1)]
+    ranges += _hour_ranges(h1, h2)
+    ranges.append(("minute", h2, until))
+    return [r for r in ranges if r[1] < r[2]]
+
+
+def _hour_ranges(since, until):
+    """Like _minute_ranges without minute rows: the edges widen to whole hours."""
+    h1, h2 = bucket_start(since, "hour"), _ceil(until, "hour")
+    d1, d2 = _ceil(h1, "day"), bucket_start(h2, "day")
+    if d1 < d2:
+        ranges = [("hour", h1, d1), ("day", d1, d2), ("hour", d2, h2)]
+    else:
+        ranges = [("hour", h1, h2)]
+    return [r for r in ranges if r[1] < r[2]]
+
+
+def covering_ranges(since, until, kept_since=None):
+    """
+    Splits [since, until) into (resolution, start, end) pieces so that the
+    coarsest rollup covers as much as possible: days in the middle, hours
+    around them and minutes only for the ragged edges.
+
+    kept_since maps "minute" / "hour" to the oldest bucket retention still
+    keeps in that table (see functions/retention.rollup_kept_since). Older
+    parts of the window are read from the next coarser table instead, and
+    a window edge there widens to the whole hour or day around it.
+    """
+    kept_since = kept_since or {}
+    hours_from = _ceil(kept_since["hour"], "day") if kept_since.get("hour") else since
+    minutes_from = _ceil(kept_since["minute"], "hour") if kept_since.get("minute") else since
+    x = min(max(hours_from, since), until)
+    y = min(max(minutes_from, x), until)
+
+    ranges = []
+    if since < x:
+        ranges.append(("day", bucket_start(since, "day"), _ceil(x, "day")))
+    if x < y:
+        ranges += _hour_ranges(x, y)
+    if y < until:
+        ranges += _minute_ranges(y, until)
+    return ranges
+
+
+def rollup_rows_sql(since, until=None, columns="*", where=None, where_params=(), kept_since=None):
+    """
+    Returns (sql, params) for a UNION ALL of the rollup rows covering
+    [since, until) (see covering_ranges for kept_since). Use it as a
+    derived table and aggregate over it. `where` is ANDed into every
+    branch so it can use the rollup indexes.
+    """
+    until = until or datetime.now()
+    extra = f" AND ({where})" if where else ""
+    parts, params = [], []
+    for resolution, start, end in covering_ranges(since, until, kept_since):
+        parts.append(
+            f"SELECT {columns} FROM {ROLLUP_TABLES[resolution]} WHERE bucket_start >= %s AND bucket_start < %s{extra}"
+        )
+        params += [start, end] + list(where_params)
+    return " UNION ALL ".join(parts), params
+
+
+def _aggregate(records, resolution):
+    groups = {}
+    for r in records:
+        key = (r["monitor_id"], bucket_start(r["checked_at"], resolution))
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = {
+                "project_id": r["project_id"],
+                "check_count": 0,
+                "up_count": 0,
+                "latency_count": 0,
+                "latency_sum": 0,
+                "latency_min": None,
+                "latency_max": None,
+                "sketch": LatencySketch(),
+            }
+        g["check_count"] += 1
+        if r["hb_status"] == "up":
+            g["up_count"] += 1
+        latency = r.get("response_time_ms")
+        if latency is not None:
+            g["latency_count"] += 1
+            g["latency_sum"] += latency
+            g["latency_min"] = latency if g["latency_min"] is None else min(g["latency_min"], latency)
+            g["latency_max"] = latency if g["latency_max"] is None else max(g["latency_max"], latency)
+            g["sketch"].add(latency)
+    return groups
+
+
+def write_rollups(cursor, records):
+    """
+    Folds heartbeat records (monitor_id, project_id, checked_at, hb_status,
+    response_time_ms) into the minute/hour/day rollups. Must run inside the
+    caller's transaction: existing sketches are read FOR UPDATE and merged
+    here, counters are added by the upsert itself.
+    """
+    for resolution, table in ROLLUP_TABLES.items():
+        groups = _aggregate(records, resolution)
+        if not groups:
+            continue
+        keys = list(groups)
+
+        cursor.execute(
+            f"""
+            SELECT monitor_id, bucket_start, latency_sketch
+            FROM {table}
+            WHERE (monitor_id, bucket_start) IN ({placeholders(2, len(keys))})
+            FOR UPDATE
+            """,
+            [v for k in keys for v in k],
+        )
+        for row in cursor.fetchall():
+            g = groups.get((row["monitor_id"], row["bucket_start"]))
+            if g is not None:
+                g["sketch"].merge(LatencySketch.from_json(row["latency_sketch"]))
+
+        cursor.execute(
+            f"""
+            INSERT INTO {table} (
+                monitor_id, bucket_start, project_id, check_count, up_count,
+                latency_count, latency_sum, latency_min, latency_max, latency_sketch
+            ) VALUES {placeholders(10, len(keys))}
+            ON DUPLICATE KEY UPDATE
+                check_count = check_count + VALUES(check_count),
+                up_count = up_count + VALUES(up_count),
+                latency_count = latency_count + VALUES(latency_count),
+                latency_sum = latency_sum + VALUES(latency_sum),
+                latency_min = LEAST(COALESCE(latency_min, VALUES(latency_min)), COALESCE(VALUES(latency_min), latency_min)),
+                latency_max = GREATEST(COALESCE(latency_max, VALUES(latency_max)), COALESCE(VALUES(latency_max), latency_max)),
+                latency_sketch = VALUES(latency_sketch)
+            """,
+            [
+                v
+                for (monitor_id, start), g in groups.items()
+                for v in (
+                    monitor_id,
+                    start,
+                    g["project_id"],
+                    g["check_count"],
+                    g["up_count"],
+                    g["latency_count"],
+                    g["latency_sum"],
+                    g["latency_min"],
+                    g["latency_max"],
+                    g["sketch"].to_json(),
+                )
+            ],
+        )
+
+
+def rollup_watermark(cursor):
+    """
+    Every heartbeat at or after the returned time is already in the
+    rollups; older ones may not be. Kept in uptime_rollup_state and locked
+    FOR UPDATE, so call it inside the transaction that moves it. The first
+    call seeds it with the earliest minute rollup (i.e. when the worker
+    started writing rollups).
+    """
+    cursor.execute("SELECT rolled_up_since FROM uptime_rollup_state WHERE id = 1 FOR UPDATE")
+    row = cursor.fetchone()
+    if row:
+        return row["rolled_up_since"]
+
+    cursor.execute(f"SELECT MIN(bucket_start) AS earliest FROM {ROLLUP_TABLES['minute']}")
+    row = cursor.fetchone()
+    since = (row and row["earliest"]) or bucket_start(datetime.now(), "minute")
+    cursor.execute(
+        "INSERT IGNORE INTO uptime_rollup_state (id, rolled_up_since) VALUES (1, %s)",
+        (since,),
+    )
+    return since
+
+
+def backfill_rollups(get_connection, hours=24 * 7, chunk_minutes=60):
+    """
+    Builds rollups from raw heartbeats older than the rollup watermark,
+    walking backwards one chunk per transaction and moving the watermark
+    with each chunk, so an interrupted run can simply be started again.
+    """
+    conn = get_connection()
+    if not conn:
+        print("Rollup backfill: database connection failed")
+        return
+    try:
+        with conn.cursor() as cursor:
+            floor = rollup_watermark(cursor) - timedelta(hours=hours)
+        conn.commit()
+
+        while True:
+            with conn.cursor() as cursor:
+                upper = rollup_watermark(cursor)
+                if upper <= floor:
+                    break
+                lower = max(floor, upper - timedelta(minutes=chunk_minutes))
+                cursor.execute(
+                    """
+                    SELECT monitor_id, project_id, checked_at, status AS hb_status, response_time_ms
+                    FROM uptime_heartbeats
+                    WHERE checked_at >= %s AND checked_at < %s
+                    """,
+                    (lower, upper),
+                )
+                records = cursor.fetchall()
+                if records:
+                    write_rollups(cursor, records)
+                cursor.execute("UPDATE uptime_rollup_state SET rolled_up_since = %s WHERE id = 1", (lower,))
+            conn.commit()
+            print(f"Rollup backfill: {lower} - {upper}: {len(records)} heartbeats")
+    finally:
+        conn.close()
@@ -0,0 +1,252 @@
+import os
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+from extensions.extensions import get_db_connection
+from extensions.streaming import fetch_chunks
+from extensions.times import parse_time
+from functions.projects import login_required
+from functions.response_cache import cached_response
+from functions.rollups import LatencySketch, covering_ranges, rollup_rows_sql
+from functions.retention import project_is_paid, rollup_kept_since
+import pymysql
+
+sla_bp = Blueprint("sla", __name__)
+
+SLA_WINDOWS = {"7d": 7, "30d": 30, "90d": 90}
+SLA_DEFAULT_WINDOW = "30d"
+SLA_MAX_DAYS = int(os.getenv("SLA_MAX_DAYS", 400))
+SLA_QUANTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+
+def _merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _new_stats():
+    return {
+        "checks": 0, "up": 0, "latency_count": 0, "latency_sum": 0,
+        "latency_min": None, "latency_max": None, "sketch": LatencySketch(),
+        "downtime": [], "incidents": 0,
+    }
+
+
+def _add_latency_range(stats, low, high):
+    if low is not None:
+        stats["latency_min"] = low if stats["latency_min"] is None else min(stats["latency_min"], low)
+    if high is not None:
+        stats["latency_max"] = high if stats["latency_max"] is None else max(stats["latency_max"], high)
+
+
+def _add_rollup(stats, row):
+    stats["checks"] += row["check_count"]
+    stats["up"] += row["up_count"]
+    stats["latency_count"] += row["latency_count"]
+    stats["latency_sum"] += row["latency_sum"]
+    _add_latency_range(stats, row["latency_min"], row["latency_max"])
+    stats["sketch"].merge(LatencySketch.from_json(row["latency_sketch"]))
+
+
+def _summarize(stats, monitored_seconds):
+    down_seconds = sum((end - start).total_seconds() for start, end in stats["downtime"])
+    latency = {name: None for name in SLA_QUANTILES}
+    latency.update(avg=None, min=stats["latency_min"], max=stats["latency_max"])
+    if stats["latency_count"]:
+        for name, q in SLA_QUANTILES.items():
+            value = stats["sketch"].quantile(q)
+            latency[name] = round(value, 1) if value is not None else None
+        latency["avg"] = round(stats["latency_sum"] / stats["latency_count"], 1)
+    return {
+        "uptimePercent": round(100 * (1 - down_seconds / monitored_seconds), 4) if monitored_seconds > 0 else None,
+        "downtimeMinutes": round(down_seconds / 60, 2),
+        "incidents": stats["incidents"],
+        "checks": stats["checks"],
+        "checkSuccessPercent": round(100 * stats["up"] / stats["checks"], 4) if stats["checks"] else None,
+        "latency": latency,
+    }
+
+
+def sla_report(conn, project_id, start, end, monitor_id=None):
+    """
+    SLA figures for a project's monitors over [start, end):
+
+    - uptime and downtime minutes from the monitors' down incidents,
+      clipped to the window and to each monitor's lifetime
+    - check counts and latency p50/p95/p99 from the heartbeat rollups,
+      using day rows for whole days and hour/minute rows only at the
+      edges, so a 90 day window reads a few hundred rows per monitor and
+      no raw heartbeats; latency sketches are merged, and every quantile
+      is within LatencySketch.RELATIVE_ACCURACY of the exact value. Where
+      the plan's retention removed the minute or hour rows an edge needs,
+      the whole hour or day around it is read instead
+
+    The summary counts monitor-minutes: its downtime is the sum over
+    monitors and its uptime is the share of all monitored time that was up.
+    """
+    only = [monitor_id] if monitor_id else []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT id, name, url, created_at, deleted_at
+            FROM uptime_monitors
+            WHERE project_id = %s AND created_at < %s AND (deleted_at IS NULL OR deleted_at > %s)
+            {" AND id = %s" if monitor_id else ""}
+            ORDER BY created_at, id
+            """,
+            [project_id, end, start] + only,
+        )
+        monitors = cursor.fetchall()
+
+        cursor.execute(
+            f"""
+            SELECT monitor_id, started_at, resolved_at
+            FROM uptime_incidents
+            WHERE project_id = %s AND monitor_id IS NOT NULL AND started_reason = 'down'
+              AND started_at < %s AND (resolved_at IS NULL OR resolved_at > %s)
+              {" AND monitor_id = %s" if monitor_id else ""}
+            """,
+            [project_id, end, start] + only,
+        )
+        incidents = cursor.fetchall()
+
+        cursor.execute("SELECT rolled_up_since FROM uptime_rollup_state WHERE id = 1")
+        state = cursor.fetchone()
+        kept_since = rollup_kept_since(project_is_paid(cursor, project_id))
+
+    stats = {m["id"]: _new_stats() for m in monitors}
+    lifetimes = {
+        m["id"]: (max(start, m["created_at"]), min(end, m["deleted_at"] or end)) for m in monitors
+    }
+
+    for incident in incidents:
+        s = stats.get(incident["monitor_id"])
+        if s is None:
+            continue
+        life_start, life_end = lifetimes[incident["monitor_id"]]
+        down_start = max(incident["started_at"], life_start)
+        down_end = min(incident["resolved_at"] or end, life_end)
+        s["incidents"] += 1
+        if down_start < down_end:
+            s["downtime"].append((down_start, down_end))
+
+    # Rollup rows are folded in as they arrive, so memory doesn't grow
+    # with the window.
+    rollup_sql, rollup_params = rollup_rows_sql(
+        start, end,
+        columns="monitor_id, check_count, up_count, latency_count, latency_sum, latency_min, latency_max, latency_sketch",
+        where="project_id = %s" + (" AND monitor_id = %s" if monitor_id else ""),
+        where_params=[project_id] + only,
+        kept_since=kept_since,
+    )
+    rollup_rows = 0
+    with conn.cursor(pymysql.cursors.SSDictCursor) as cursor:
+        cursor.execute(rollup_sql, rollup_params)
+        for rows in fetch_chunks(cursor):
+            rollup_rows += len(rows)
+            for row in rows:
+                s = stats.get(row["monitor_id"])
+                if s is not None:
+                    _add_rollup(s, row)
+
+    total = _new_stats()
+    total_seconds = 0
+    result = []
+    for m in monitors:
+        s = stats[m["id"]]
+        s["downtime"] = _merge_intervals(s["downtime"])
+        life_start, life_end = lifetimes[m["id"]]
+        seconds = max(0.0, (life_end - life_start).total_seconds())
+        result.append(dict(
+            _summarize(s, seconds), monitorId=m["id"], name=m["name"], url=m["url"],
+        ))
+        total_seconds += seconds
+        total["downtime"] += s["downtime"]
+        total["incidents"] += s["incidents"]
+        for key in ("checks", "up", "latency_count", "latency_sum"):
+            total[key] += s[key]
+        _add_latency_range(total, s["latency_min"], s["latency_max"])
+        total["sketch"].merge(s["sketch"])
+
+    rolled_up_since = state["rolled_up_since"] if state else None
+    ranges = covering_ranges(start, end, kept_since)
+    return {
+        "projectId": project_id,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "summary": _summarize(total, total_seconds),
+        "monitors": result,
+        "coverage": {
+            # Heartbeats before this aren't in the rollups (see
+            # `index.py --backfill-rollups`). Minute and hour rows that
+            # retention removed are read from coarser rollups instead, so
+            # only expired day rows leave a gap.
+            "rolledUpSince": rolled_up_since.isoformat() if rolled_up_since else None,
+            "complete": bool(
+                rolled_up_since and rolled_up_since <= start
+                and (kept_since["day"] is None or kept_since["day"] <= start)
+            ),
+            # Check counts and latency include whole hours/days around an
+            # edge whose minute/hour rows have expired.
+            "approximateEdges": ranges[0][1] < start or ranges[-1][2] > end,
+            "rollupRows": rollup_rows,
+        },
+    }
+
+
+@sla_bp.route("/sla", methods=["GET"])
+@login_required
+@cached_response("reports.sla")
+def get_sla_report():
+    """
+    SLA report for one project (projectId), optionally one monitor
+    (monitorId), over window=7d|30d|90d ending now, or a custom from/to.
+    """
+    project_id = request.args.get("projectId")
+    if not project_id:
+        return jsonify({"error": "projectId is required"}), 400
+    try:
+        if request.args.get("from"):
+            start = parse_time(request.args["from"], "from")
+            end = parse_time(request.args["to"], "to") if request.args.get("to") else datetime.now()
+            window = "custom"
+        else:
+            window = request.args.get("window", SLA_DEFAULT_WINDOW)
+            if window not in SLA_WINDOWS:
+                raise ValueError(f"window must be one of {', '.join(SLA_WINDOWS)}, or pass from/to")
+            end = datetime.now()
+            start = end - timedelta(days=SLA_WINDOWS[window])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if start >= end:
+        return jsonify({"error": "from must be before to"}), 400
+    if end - start > timedelta(days=SLA_MAX_DAYS):
+        return jsonify({"error": f"window can be at most {SLA_MAX_DAYS} days"}), 400
+
+    try:
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({"error": "Database connection failed"}), 500
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM subscriptions WHERE user_id = %s AND project_id = %s",
+                    (request.user_id, project_id),
+                )
+                if not cursor.fetchone():
+                    return jsonify({"error": "Unauthorized"}), 403
+            report = sla_report(conn, project_id, start, end, request.args.get("monitorId"))
+            conn.commit()
+        finally:
+            conn.close()
+
+        report["window"] = window
+        return jsonify(report), 200
+    except Exception as e:
+        print("SLA report error:", e)
+        return jsonify({"error": "Internal server error"}), 500
@@ -1,27 +1,131 @@
 from flask import Blueprint, request, jsonify
-from extensions.extensions import get_db_connection
+from extensions.extensions import get_db_connection, db_pool
 from functions.projects import login_required
 import uuid
+from extensions.ids import new_id
+from extensions.cache import TTLCache
+from extensions.ratelimit import RateLimiter, store_from_env
+from extensions.streaming import wants_stream, stream_json
 import datetime
 import time
+import io
+import gzip
+import json
 from functools import wraps
-import requests
+import os
+import socket
+import threading
+from functions.uptime_engine import run_checks
+from functions.uptime_writer import UptimeResultWriter
+from functions.uptime_scheduler import UptimeScheduler
+from extensions.partitions import ensure_future_partitions
+from functions.capture_queue import capture_queue
+from functions.issues import incident_record, record_issues, issue_cache_stats
+from functions.ingestion import ingestion_gate, INGEST_POLICIES
+from functions.live import live_broker, record_live_event
+from functions.response_cache import response_cache
+from extensions.sql import in_list
 
 system_bp = Blueprint("system", __name__)
 v1_bp = Blueprint("v1", __name__)
 
-_rate_state = {}
+# Per-project token buckets; the policy follows the plan resolved by
+# sdk_auth_required. Set RATE_LIMIT_BACKEND=sqlite:/path/file.db to share
+# the buckets between worker processes on one host.
+_rate_limiter = RateLimiter(
+    store_from_env(),
+    {
+        "free": (int(os.getenv("RATE_LIMIT_FREE_PER_MINUTE", 120)), 60),
+        "paid": (int(os.getenv("RATE_LIMIT_PAID_PER_MINUTE", 1200)), 60),
+    },
+)
+
+UPTIME_BATCH_SIZE = int(os.getenv("UPTIME_BATCH_SIZE", 500))
+# Any number of --uptime-worker processes can run; each pass leases the
+# monitors it checks. A lease outliving a crashed worker expires after
+# UPTIME_LEASE_SECONDS, which must exceed the longest pass.
+UPTIME_LEASE_SECONDS = int(os.getenv("UPTIME_LEASE_SECONDS", 300))
+UPTIME_WORKER_ID = os.getenv("UPTIME_WORKER_ID")
+# "memory" runs checks on time from an in-memory schedule (see
+# functions/uptime_scheduler.py); "poll" scans for due rows every few seconds.
+UPTIME_SCHEDULER = os.getenv("UPTIME_SCHEDULER", "memory").lower()
+# The uptime worker writes the heartbeats, so it also makes sure dated
+# partitions exist ahead of them, whether or not a retention worker runs.
+HEARTBEAT_PARTITION_CHECK_SECONDS = float(os.getenv("HEARTBEAT_PARTITION_CHECK_SECONDS", 3600))
+
+CAPTURE_BATCH_MAX_EVENTS = int(os.getenv("CAPTURE_BATCH_MAX_EVENTS", 100))
+CAPTURE_BATCH_MAX_BYTES = int(os.getenv("CAPTURE_BATCH_MAX_BYTES", 1024 * 1024))
+CAPTURE_RETRY_AFTER_SECONDS = int(os.getenv("CAPTURE_RETRY_AFTER_SECONDS", 5))
+
+# (api_key, project_id) -> credential resolution for the /v1 SDK endpoints.
+# Rotation invalidates this process only; other gunicorn workers converge
+# within SDK_AUTH_CACHE_TTL.
+SDK_AUTH_NEGATIVE_TTL = float(os.getenv("SDK_AUTH_NEGATIVE_TTL", 30))
+_sdk_auth_cache = TTLCache(
+    maxsize=int(os.getenv("SDK_AUTH_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("SDK_AUTH_CACHE_TTL", 60)),
+)
+
+
+def _resolve_sdk_credentials(api_key, project_id):
+    """
+    Resolves (api_key, project_id) to
+    {"user_id", "has_subscription", "is_active", "expires_at"}, served from
+    _sdk_auth_cache when possible. user_id is None for an unknown key.
+    Unknown keys and missing subscriptions are cached too, for a shorter
+    time. Returns None if the database is unavailable.
+    """
+    key = (api_key, project_id)
+    cached = _sdk_auth_cache.get(key)
+    if cached is not None:
+        return cached
 
+    conn = get_db_connection()
+    if not conn:
+        return None
 
-def _rate_limit(project_id, limit, window_seconds):
-    now = time.time()
-    window = int(now // window_seconds)
-    key = (project_id, window_seconds, window)
-    current = _rate_state.get(key, 0) + 1
-    _rate_state[key] = current
-    if current > limit:
-        return False
-    return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT ak.user_id
+                FROM api_keys ak
+                WHERE ak.api_key = %s
+                LIMIT 1
+                """,
+                (api_key,),
+            )
+            ak_row = cursor.fetchone()
+
+            sub_row = None
+            if ak_row:
+                cursor.execute(
+                    """
+                    SELECT s.expires_at, s.is_active
+                    FROM subscriptions s
+                    WHERE s.user_id = %s AND s.project_id = %s
+                    LIMIT 1
+                    """,
+                    (ak_row["user_id"], project_id),
+                )
+                sub_row = cursor.fetchone()
+    finally:
+        conn.close()
+
+    creds = {
+        "user_id": ak_row["user_id"] if ak_row else None,
+        "has_subscription": sub_row is not None,
+        "is_active": bool(sub_row.get("is_active", True)) if sub_row else False,
+        "expires_at": sub_row.get("expires_at") if sub_row else None,
+    }
+    positive = creds["has_subscription"] and creds["is_active"]
+    _sdk_auth_cache.set(key, creds, ttl=None if positive else SDK_AUTH_NEGATIVE_TTL)
+    return creds
+
+
+def invalidate_sdk_credentials(api_key):
+    """Forgets every cached resolution for `api_key` (e.g. after rotation)."""
+    return _sdk_auth_cache.delete_where(lambda k: k[0] == api_key)
 
 
 def sdk_auth_required(f):
@@ -33,53 +137,27 @@ def sdk_auth_required(f):
         if not project_id or not api_key:
             return jsonify({"error": "Missing X-Watchup-Project or X-Watchup-Key"}), 401
 
-        if not _rate_limit(project_id, limit=120, window_seconds=60):
-            return jsonify({"error": "Rate limit exceeded"}), 429
-
-        conn = get_db_connection()
-        if not conn:
+        creds = _resolve_sdk_credentials(api_key, project_id)
+        if creds is None:
             return jsonify({"error": "Database connection failed"}), 500
 
-        try:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    """
-                    SELECT ak.user_id
-                    FROM api_keys ak
-                    WHERE ak.api_key = %s
-                    LIMIT 1
-                    """,
-                    (api_key,),
-                )
-                ak_row = cursor.fetchone()
+        if not creds["user_id"]:
+            return jsonify({"error": "Invalid credentials"}), 401
 
-                if not ak_row:
-                    return jsonify({"error": "Invalid credentials"}), 401
+        if not creds["has_subscription"] or not creds["is_active"]:
+            return jsonify({"error": "Project access denied"}), 403
 
-                user_id = ak_row["user_id"]
+        expires_at = creds["expires_at"]
+        now_dt = datetime.datetime.now()
+        is_paid = bool(expires_at and expires_at > now_dt)
 
-                cursor.execute(
-                    """
-                    SELECT s.expires_at, s.is_active
-                    FROM subscriptions s
-                    WHERE s.user_id = %s AND s.project_id = %s
-                    LIMIT 1
-                    """,
-                    (user_id, project_id),
-                )
-                sub_row = cursor.fetchone()
-
-                if not sub_row or not bool(sub_row.get("is_active", True)):
-                    return jsonify({"error": "Project access denied"}), 403
+        if not _rate_limiter.allow(project_id, "paid" if is_paid else "free"):
+            return jsonify({"error": "Rate limit exceeded"}), 429
 
-                expires_at = sub_row.get("expires_at")
-                now_dt = datetime.datetime.now()
-                is_paid = bool(expires_at and expires_at > now_dt)
-                request.sdk_user_id = user_id
-                request.sdk_project_id = project_id
-                request.sdk_is_free = not is_paid
-        finally:
-            conn.close()
+        request.sdk_user_id = creds["user_id"]
+        request.sdk_project_id = project_id
+        request.sdk_is_free = not is_paid
+        request.sdk_plan = "paid" if is_paid else "free"
 
         return f(*args, **kwargs)
 
@@ -138,6 +216,7 @@ def get_api_key():
 def create_or_regenerate_api_key():
     try:
         user_id = request.user_id
+        # Keys are secrets: fully random uuid4, not the time-ordered new_id()
         new_key = str(uuid.uuid4())
 
         conn = get_db_connection()
@@ -163,12 +242,98 @@ def create_or_regenerate_api_key():
         finally:
             conn.close()
 
+        if existing:
+            invalidate_sdk_credentials(existing["api_key"])
+
         return jsonify({"api_key": new_key}), 200
     except Exception as e:
         print("Create/regenerate api key error:", e)
         return jsonify({"error": "Internal server error"}), 500
 
 
+@system_bp.route("/metrics", methods=["GET"])
+@login_required
+def get_system_metrics():
+    return jsonify({
+        "db_pool": db_pool.stats(),
+        "sdk_auth_cache": _sdk_auth_cache.stats(),
+        "rate_limiter": _rate_limiter.stats(),
+        "capture_queue": capture_queue.stats(),
+        "issue_cache": issue_cache_stats(),
+        "ingestion": ingestion_gate.stats(),
+        "live": live_broker.stats(),
+        "response_cache": response_cache.stats(),
+    }), 200
+
+
+@system_bp.route("/ingestion", methods=["GET"])
+@login_required
+def get_ingestion_stats():
+    """
+    Per-day accepted / sampled-out / over-quota event counts for one of the
+    user's projects. Counts reach the table within INGEST_FLUSH_SECONDS.
+    """
+    try:
+        user_id = request.user_id
+        project_id = request.args.get("projectId")
+        if not project_id:
+            return jsonify({"error": "Missing projectId"}), 400
+        try:
+            days = min(max(int(request.args.get("days", 7)), 1), 90)
+        except ValueError:
+            return jsonify({"error": "days must be an integer"}), 400
+
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({"error": "Database connection failed"}), 500
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    SELECT expires_at, is_active FROM subscriptions
+                    WHERE user_id = %s AND project_id = %s
+                    LIMIT 1
+                    """,
+                    (user_id, project_id),
+                )
+                sub = cursor.fetchone()
+                if not sub:
+                    return jsonify({"error": "Project not found"}), 404
+
+                cursor.execute(
+                    """
+                    SELECT day, accepted, sampled_out, over_quota
+                    FROM ingestion_stats
+                    WHERE project_id = %s AND day > %s
+                    ORDER BY day DESC
+                    """,
+                    (project_id, datetime.date.today() - datetime.timedelta(days=days)),
+                )
+                rows = cursor.fetchall()
+        finally:
+            conn.close()
+
+        is_paid = bool(sub["is_active"] and sub["expires_at"] and sub["expires_at"] > datetime.datetime.now())
+        return jsonify({
+            "projectId": project_id,
+            "plan": "paid" if is_paid else "free",
+            "policy": INGEST_POLICIES["paid" if is_paid else "free"],
+            "days": [
+                {
+                    "day": r["day"].isoformat(),
+                    "accepted": r["accepted"],
+                    "sampledOut": r["sampled_out"],
+                    "overQuota": r["over_quota"],
+                }
+                for r in rows
+            ],
+        }), 200
+    except Exception as e:
+        print("Get ingestion stats error:", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+
 @system_bp.route("/sdk/auth", methods=["POST"])
 def sdk_auth():
     try:
@@ -183,34 +348,15 @@ def sdk_auth():
         if not project_id or not api_key:
             return jsonify({"ok": False, "error": "Missing projectId or apiKey"}), 400
 
-        conn = get_db_connection()
-        if not conn:
+        creds = _resolve_sdk_credentials(api_key, project_id)
+        if creds is None:
             return jsonify({"ok": False, "error": "Database connection failed"}), 500
 
-        try:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    """
-                    SELECT
-                        ak.user_id,
-                        s.expires_at,
-                        s.is_active
-                    FROM api_keys ak
-                    JOIN subscriptions s ON s.user_id = ak.user_id
-                    WHERE ak.api_key = %s AND s.project_id = %s
-                    LIMIT 1
-                    """,
-                    (api_key, project_id),
-                )
-                row = cursor.fetchone()
-        finally:
-            conn.close()
-
-        if not row:
+        if not creds["user_id"] or not creds["has_subscription"]:
             return jsonify({"ok": False, "error": "Invalid credentials"}), 401
 
-        is_active = bool(row.get("is_active", True))
-        expires_at = row.get("expires_at")
+        is_active = creds["is_active"]
+        expires_at = creds["expires_at"]
         now = datetime.datetime.now()
 
         is_paid = bool(expires_at and expires_at > now)
@@ -223,7 +369,7 @@ def sdk_auth():
             jsonify(
                 {
                     "ok": True,
-                    "userId": row["user_id"],
+                    "userId": creds["user_id"],
                     "projectId": project_id,
                     "isFree": is_free,
                     "plan": "free" if is_free else "paid",
@@ -241,55 +387,124 @@ def sdk_auth():
 def v1_capture_event():
     try:
         data = request.get_json(silent=True) or {}
-        project_id = request.sdk_project_id
-        
-        event_type = data.get("type", "unknown_error")
-        message = data.get("message", "No message provided")
-        stack = data.get("stack", "")
-        component_stack = data.get("componentStack", "")
-        url = data.get("url", "")
-        user_agent = data.get("userAgent", "")
-        timestamp = data.get("timestamp") # ISO string
-
-        # Format details into last_error
-        details = f"{message}\n\nURL: {url}\nUser Agent: {user_agent}"
-        if stack:
-            details += f"\nStack: {stack}"
-        if component_stack:
-            details += f"\nComponent Stack: {component_stack}"
-
-        incident_id = str(uuid.uuid4())
-        
+
+        outcome, weight = ingestion_gate.admit(request.sdk_project_id, request.sdk_plan)[0]
+        if outcome == "over_quota":
+            return jsonify({"error": "Daily event quota exceeded"}), 429, _retry_tomorrow()
+        if outcome == "sampled_out":
+            return jsonify({"ok": True, "sampled": True}), 202
+
+        record = incident_record(data, request.sdk_project_id)
+        record["weight"] = weight
+
         conn = get_db_connection()
         if not conn:
+            ingestion_gate.refund(request.sdk_project_id)
             return jsonify({"error": "Database connection failed"}), 500
 
         try:
             with conn.cursor() as cursor:
-                cursor.execute(
-                    """
-                    INSERT INTO uptime_incidents (
-                        id, project_id, monitor_id, status, started_at, started_reason, last_error
-                    ) VALUES (%s, %s, NULL, 'open', %s, %s, %s)
-                    """,
-                    (
-                        incident_id,
-                        project_id,
-                        datetime.datetime.now() if not timestamp else timestamp,
-                        event_type,
-                        details
-                    ),
-                )
+                ids = record_issues(cursor, [record])
             conn.commit()
+        except Exception:
+            ingestion_gate.refund(request.sdk_project_id)
+            raise
         finally:
             conn.close()
 
-        return jsonify({"ok": True, "id": incident_id}), 201
+        issue_id = ids.get((record["project_id"], record["fingerprint"]), record["id"])
+        return jsonify({"ok": True, "id": issue_id, "fingerprint": record["fingerprint"]}), 201
     except Exception as e:
         print("Capture event error:", e)
         return jsonify({"error": "Internal server error"}), 500
 
 
+def _retry_tomorrow():
+    """Retry-After for a used-up daily quota: seconds until local midnight."""
+    now = datetime.datetime.now()
+    midnight = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), datetime.time())
+    return {"Retry-After": str(int((midnight - now).total_seconds()) + 1)}
+
+
+def _read_batch_body():
+    """
+    Request body as JSON, gunzipped when sent with Content-Encoding: gzip.
+    Raises ValueError if it is malformed or larger than
+    CAPTURE_BATCH_MAX_BYTES once decompressed.
+    """
+    if (request.content_length or 0) > CAPTURE_BATCH_MAX_BYTES:
+        raise ValueError("Request body too large")
+    raw = request.get_data(cache=False)
+    if (request.headers.get("Content-Encoding") or "").lower() == "gzip":
+        try:
+            with gzip.GzipFile(fileobj=io.BytesIO(raw)) as f:
+                raw = f.read(CAPTURE_BATCH_MAX_BYTES + 1)
+        except (OSError, EOFError):
+            raise ValueError("Invalid gzip body")
+    if len(raw) > CAPTURE_BATCH_MAX_BYTES:
+        raise ValueError("Request body too large")
+    return json.loads(raw or b"null")
+
+
+@v1_bp.route("/capture/batch", methods=["POST"])
+@sdk_auth_required
+def v1_capture_batch():
+    """
+    Accepts {"events": [...]} (or a bare array) of /v1/capture payloads and
+    queues them for the background writer. Returns 202 once queued; 429
+    when the project is over its rate limit (each event costs one request)
+    and 503 when the write queue is full. Both carry Retry-After.
+    """
+    try:
+        try:
+            data = _read_batch_body()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        events = data.get("events") if isinstance(data, dict) else data
+        if not isinstance(events, list) or not events:
+            return jsonify({"error": "Expected a non-empty events array"}), 400
+        if len(events) > CAPTURE_BATCH_MAX_EVENTS:
+            return jsonify({"error": f"At most {CAPTURE_BATCH_MAX_EVENTS} events per batch"}), 413
+        if not all(isinstance(e, dict) for e in events):
+            return jsonify({"error": "Each event must be an object"}), 400
+
+        retry_after = {"Retry-After": str(CAPTURE_RETRY_AFTER_SECONDS)}
+        project_id = request.sdk_project_id
+
+        # sdk_auth_required already took one token for the request itself.
+        if len(events) > 1 and not _rate_limiter.allow(project_id, request.sdk_plan, cost=len(events) - 1):
+            return jsonify({"error": "Rate limit exceeded"}), 429, retry_after
+
+        admitted = ingestion_gate.admit(project_id, request.sdk_plan, len(events))
+        dropped = {"sampled_out": 0, "over_quota": 0}
+        records = []
+        for event, (outcome, weight) in zip(events, admitted):
+            if outcome != "accepted":
+                dropped[outcome] += 1
+                continue
+            record = incident_record(event, project_id)
+            record["weight"] = weight
+            records.append(record)
+
+        if not records and dropped["over_quota"]:
+            return jsonify({"error": "Daily event quota exceeded"}), 429, _retry_tomorrow()
+        if records and not capture_queue.offer(records):
+            ingestion_gate.refund(project_id, len(records))
+            return jsonify({"error": "Capture queue is full, retry later"}), 503, retry_after
+
+        return jsonify({
+            "ok": True,
+            "accepted": len(records),
+            "sampled": dropped["sampled_out"],
+            "overQuota": dropped["over_quota"],
+            "fingerprints": [r["fingerprint"] for r in records],
+        }), 202
+    except Exception as e:
+        print("Capture batch error:", e)
+        return jsonify({"error": "Internal server error"}), 500
+
+
 @v1_bp.route("/monitors", methods=["POST"])
 @sdk_auth_required
 def v1_create_monitor():
@@ -313,7 +528,7 @@ def v1_create_monitor():
         if timeout_ms > 30000:
             timeout_ms = 30000
 
-        monitor_id = str(uuid.uuid4())
+        monitor_id = new_id()
         project_id = request.sdk_project_id
 
         conn = get_db_connection()
@@ -343,6 +558,7 @@ def v1_create_monitor():
                     """,
                     (monitor_id, project_id, name, url, interval_seconds, timeout_ms),
                 )
+                record_live_event(cursor, project_id, "monitor.created", {"monitorId": monitor_id, "projectId": project_id})
             conn.commit()
         finally:
             conn.close()
@@ -365,50 +581,51 @@ def v1_create_monitor():
         return jsonify({"error": "Internal server error"}), 500
 
 
+def _format_v1_monitor(r):
+    for key in ("last_checked_at", "created_at", "updated_at"):
+        if r.get(key):
+            r[key] = r[key].isoformat()
+    return r
+
+
 @v1_bp.route("/monitors", methods=["GET"])
 @sdk_auth_required
 def v1_list_monitors():
+    """All of the project's monitors; `stream=1` streams them as they are read."""
     try:
         project_id = request.sdk_project_id
         conn = get_db_connection()
         if not conn:
             return jsonify({"error": "Database connection failed"}), 500
 
+        query = """
+            SELECT
+                id,
+                project_id,
+                name,
+                url,
+                interval_seconds,
+                timeout_ms,
+                status,
+                consecutive_failures,
+                last_checked_at,
+                created_at,
+                updated_at
+            FROM uptime_monitors
+            WHERE project_id = %s AND deleted_at IS NULL
+            ORDER BY created_at DESC
+        """
+        if wants_stream(request.args):
+            return stream_json(conn, query, (project_id,), "monitors", _format_v1_monitor, head={"projectId": project_id})
+
         try:
             with conn.cursor() as cursor:
-                cursor.execute(
-                    """
-                    SELECT
-                        id,
-                        project_id,
-                        name,
-                        url,
-                        interval_seconds,
-                        timeout_ms,
-                        status,
-                        consecutive_failures,
-                        last_checked_at,
-                        created_at,
-                        updated_at
-                    FROM uptime_monitors
-                    WHERE project_id = %s AND deleted_at IS NULL
-                    ORDER BY created_at DESC
-                    """,
-                    (project_id,),
-                )
+                cursor.execute(query, (project_id,))
                 rows = cursor.fetchall()
         finally:
             conn.close()
 
-        for r in rows:
-            if r.get("last_checked_at"):
-                r["last_checked_at"] = r["last_checked_at"].isoformat()
-            if r.get("created_at"):
-                r["created_at"] = r["created_at"].isoformat()
-            if r.get("updated_at"):
-                r["updated_at"] = r["updated_at"].isoformat()
-
-        return jsonify({"projectId": project_id, "monitors": rows}), 200
+        return jsonify({"projectId": project_id, "monitors": [_format_v1_monitor(r) for r in rows]}), 200
     except Exception as e:
         print("List monitors error:", e)
         return jsonify({"error": "Internal server error"}), 500
@@ -434,6 +651,8 @@ def v1_delete_monitor(monitor_id):
                     (monitor_id, project_id),
                 )
                 affected = cursor.rowcount
+                if affected:
+                    record_live_event(cursor, project_id, "monitor.deleted", {"monitorId": monitor_id, "projectId": project_id})
             conn.commit()
         finally:
             conn.close()
@@ -447,16 +666,23 @@ def v1_delete_monitor(monitor_id):
         return jsonify({"error": "Internal server error"}), 500
 
 
-def process_due_uptime_monitors_once(max_monitors=25, failure_threshold=3):
+def _claim_due_monitors(max_monitors, worker_id, lease_seconds, monitor_ids=None):
+    """
+    Leases up to `max_monitors` due monitors to `worker_id`, optionally only
+    among `monitor_ids`. SKIP LOCKED lets concurrent workers claim disjoint
+    sets without waiting on each other, and a monitor whose lease ran out
+    (its worker died mid-pass) is due again. The writer clears the lease
+    with the check result.
+    """
+    id_filter = f"AND id IN ({in_list(len(monitor_ids))})" if monitor_ids else ""
     conn = get_db_connection()
     if not conn:
-        return
+        return []
 
-    now_dt = datetime.datetime.now()
     try:
         with conn.cursor() as cursor:
             cursor.execute(
-                """
+                f"""
                 SELECT
                     id,
                     project_id,
@@ -469,42 +695,124 @@ def process_due_uptime_monitors_once(max_monitors=25, failure_threshold=3):
                 WHERE is_active = TRUE
                   AND deleted_at IS NULL
                   AND (next_check_at IS NULL OR next_check_at <= NOW())
-                ORDER BY COALESCE(next_check_at, created_at) ASC
+                  AND (lease_until IS NULL OR lease_until <= NOW())
+                  {id_filter}
+                ORDER BY next_check_at ASC
                 LIMIT %s
+                FOR UPDATE SKIP LOCKED
                 """,
-                (max_monitors,),
+                list(monitor_ids or []) + [max_monitors],
             )
             monitors = cursor.fetchall()
+            if monitors:
+                # updated_at is left alone: a lease isn't a config change.
+                cursor.execute(
+                    f"""
+                    UPDATE uptime_monitors
+                    SET claimed_by = %s,
+                        lease_until = DATE_ADD(NOW(), INTERVAL %s SECOND),
+                        updated_at = updated_at
+                    WHERE id IN ({in_list(len(monitors))})
+                    """,
+                    [worker_id, lease_seconds] + [m["id"] for m in monitors],
+                )
+        conn.commit()
+    finally:
+        conn.close()
+    return monitors
+
+
+def _release_monitors(worker_id, monitor_ids):
+    """Drops leases still held after a pass (results that failed to write)."""
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                UPDATE uptime_monitors
+                SET claimed_by = NULL, lease_until = NULL, updated_at = updated_at
+                WHERE claimed_by = %s AND id IN ({in_list(len(monitor_ids))})
+                """,
+                [worker_id] + list(monitor_ids),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def process_due_uptime_monitors_once(max_monitors=None, failure_threshold=3, write_batch_size=None, write_flush_seconds=None, worker_id=None):
+    """Claims, checks and records one batch of due monitors; returns how many."""
+    max_monitors = int(max_monitors or UPTIME_BATCH_SIZE)
+    worker_id = worker_id or UPTIME_WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
+
+    monitors = _claim_due_monitors(max_monitors, worker_id, UPTIME_LEASE_SECONDS)
+    if not monitors:
+        return 0
+
+    try:
+        _check_and_write(monitors, failure_threshold, write_batch_size, write_flush_seconds, worker_id)
+    finally:
+        _release_monitors(worker_id, [m["id"] for m in monitors])
+    return len(monitors)
+
+
+def process_monitors_by_id(monitor_ids, failure_threshold=3, worker_id=None):
+    """
+    Scheduler pass: leases whichever of `monitor_ids` are still due and
+    free, checks and records them, and returns {monitor_id: next due
+    datetime, or None if it is no longer active} for all of them.
+    """
+    worker_id = worker_id or UPTIME_WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
+
+    monitors = _claim_due_monitors(len(monitor_ids), worker_id, UPTIME_LEASE_SECONDS, monitor_ids=monitor_ids)
+    if monitors:
+        try:
+            _check_and_write(monitors, failure_threshold, None, None, worker_id)
+        finally:
+            _release_monitors(worker_id, [m["id"] for m in monitors])
+
+    # Whether this pass checked them, another worker did, or they changed
+    # since the schedule last synced, the table has the due times, on the
+    # database clock the scheduler runs on.
+    return _next_due_times(monitor_ids)
+
+
+def _next_due_times(monitor_ids):
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT id, next_check_at, lease_until, is_active, deleted_at, NOW() AS now
+                FROM uptime_monitors
+                WHERE id IN ({in_list(len(monitor_ids))})
+                """,
+                list(monitor_ids),
+            )
+            rows = cursor.fetchall()
+        conn.commit()
+    finally:
+        conn.close()
 
-        for m in monitors:
-            monitor_id = m["id"]
-            project_id = m["project_id"]
-            url = m["url"]
-            timeout_ms = int(m.get("timeout_ms") or 5000)
+    due = {mid: None for mid in monitor_ids}
+    for r in rows:
+        if r["is_active"] and r["deleted_at"] is None:
+            due[r["id"]] = max(t for t in (r["next_check_at"], r["lease_until"], r["now"]) if t is not None)
+    return due
+
+
+def _check_and_write(monitors, failure_threshold, write_batch_size, write_flush_seconds, worker_id):
+    """Checks `monitors`, leased to `worker_id`, and writes the results."""
+    with UptimeResultWriter(batch_size=write_batch_size, flush_seconds=write_flush_seconds, worker_id=worker_id) as writer:
+        for m, result in run_checks(monitors):
             interval_seconds = int(m.get("interval_seconds") or 60)
             prev_status = (m.get("status") or "up").lower()
             prev_failures = int(m.get("consecutive_failures") or 0)
-
-            status_code = None
-            response_time_ms = None
-            error_message = None
-            is_success = False
-
-            start = time.time()
-            try:
-                resp = requests.get(
-                    url,
-                    timeout=max(1.0, timeout_ms / 1000.0),
-                    headers={"User-Agent": "WatchUp-Uptime/1.0"},
-                    allow_redirects=True,
-                )
-                status_code = resp.status_code
-                response_time_ms = int((time.time() - start) * 1000)
-                is_success = 200 <= status_code < 400
-            except Exception as ex:
-                response_time_ms = int((time.time() - start) * 1000)
-                error_message = str(ex)
-                is_success = False
+            is_success = result["is_success"]
 
             hb_status = "up" if is_success else "down"
             new_failures = 0 if is_success else (prev_failures + 1)
@@ -520,84 +828,59 @@ def process_due_uptime_monitors_once(max_monitors=25, failure_threshold=3):
                 else:
                     new_status = "up"
 
-            next_check_at_expr = "DATE_ADD(NOW(), INTERVAL %s SECOND)"
+            checked_at = datetime.datetime.now()
 
-            conn2 = get_db_connection()
-            if not conn2:
-                continue
-            try:
-                with conn2.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        INSERT INTO uptime_heartbeats (
-                            id, project_id, monitor_id, status, status_code, response_time_ms, error_message
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        """,
-                        (
-                            str(uuid.uuid4()),
-                            project_id,
-                            monitor_id,
-                            hb_status,
-                            status_code,
-                            response_time_ms,
-                            error_message,
-                        ),
-                    )
+            writer.add(
+                {
+                    "monitor_id": m["id"],
+                    "project_id": m["project_id"],
+                    "checked_at": checked_at,
+                    "interval_seconds": interval_seconds,
+                    "hb_status": hb_status,
+                    "status_code": result["status_code"],
+                    "response_time_ms": result["response_time_ms"],
+                    "error_message": result["error_message"],
+                    "dns_ms": result.get("dns_ms"),
+                    "connect_ms": result.get("connect_ms"),
+                    "tls_ms": result.get("tls_ms"),
+                    "ttfb_ms": result.get("ttfb_ms"),
+                    "prev_status": prev_status,
+                    "new_status": new_status,
+                    "consecutive_failures": new_failures,
+                }
+            )
 
-                    cursor.execute(
-                        f"""
-                        UPDATE uptime_monitors
-                        SET
-                            last_checked_at = NOW(),
-                            next_check_at = {next_check_at_expr},
-                            consecutive_failures = %s,
-                            status = %s
-                        WHERE id = %s
-                        """,
-                        (interval_seconds, new_failures, new_status, monitor_id),
-                    )
 
-                    if prev_status != "down" and new_status == "down":
-                        cursor.execute(
-                            """
-                            INSERT INTO uptime_incidents (
-                                id, project_id, monitor_id, status, started_at, started_reason, last_error
-                            ) VALUES (%s, %s, %s, 'open', NOW(), 'down', %s)
-                            """,
-                            (str(uuid.uuid4()), project_id, monitor_id, error_message),
-                        )
-
-                    if prev_status == "down" and new_status == "up":
-                        cursor.execute(
-                            """
-                            UPDATE uptime_incidents
-                            SET status = 'resolved', resolved_at = NOW(), resolved_reason = 'recovered'
-                            WHERE monitor_id = %s AND project_id = %s AND status = 'open'
-                            """,
-                            (monitor_id, project_id),
-                        )
-
-                    if new_status == "down" and error_message:
-                        cursor.execute(
-                            """
-                            UPDATE uptime_incidents
-                            SET last_error = %s
-                            WHERE monitor_id = %s AND project_id = %s AND status = 'open'
-                            """,
-                            (error_message, monitor_id, project_id),
-                        )
-
-                conn2.commit()
+def _keep_heartbeat_partitions_ahead():
+    while True:
+        conn = get_db_connection()
+        if conn:
+            try:
+                with conn.cursor() as cursor:
+                    added = ensure_future_partitions(cursor)
+                conn.commit()
+                if added:
+                    print(f"Uptime worker: added heartbeat partitions {added}")
+            except Exception as e:
+                print("Uptime worker: heartbeat partition check failed:", e)
             finally:
-                conn2.close()
-    finally:
-        conn.close()
+                conn.close()
+        time.sleep(HEARTBEAT_PARTITION_CHECK_SECONDS)
 
 
 def run_uptime_worker_forever(poll_seconds=5):
+    threading.Thread(target=_keep_heartbeat_partitions_ahead, name="heartbeat-partitions", daemon=True).start()
+
+    if UPTIME_SCHEDULER == "memory":
+        UptimeScheduler(process_monitors_by_id, UPTIME_BATCH_SIZE).run_forever()
+        return
+
     while True:
+        claimed = 0
         try:
-            process_due_uptime_monitors_once()
+            claimed = process_due_uptime_monitors_once()
         except Exception as e:
             print("Uptime worker error:", e)
-        time.sleep(poll_seconds)
+        # A full batch means more monitors are due; go again right away.
+        if claimed < UPTIME_BATCH_SIZE:
+            time.sleep(poll_seconds)
@@ -0,0 +1,326 @@
+import os
+import time
+import socket
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.cookiejar import DefaultCookiePolicy
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+UPTIME_CONCURRENCY = int(os.getenv("UPTIME_CONCURRENCY", 200))
+UPTIME_PER_HOST_LIMIT = int(os.getenv("UPTIME_PER_HOST_LIMIT", 8))
+UPTIME_DNS_TTL_SECONDS = float(os.getenv("UPTIME_DNS_TTL_SECONDS", 60))
+UPTIME_DNS_CACHE_MAX_HOSTS = int(os.getenv("UPTIME_DNS_CACHE_MAX_HOSTS", 10000))
+UPTIME_SESSION_MAX_HOSTS = int(os.getenv("UPTIME_SESSION_MAX_HOSTS", 1000))
+
+USER_AGENT = "WatchUp-Uptime/1.0"
+
+
+def _host_key(url):
+    try:
+        parts = urlsplit(url)
+        return (parts.hostname or "").lower(), parts.port
+    except Exception:
+        return ("", None)
+
+
+class _HostLimiter:
+    """
+    Hands out one bounded semaphore per (host, port) so a single slow or
+    popular host can't take every slot in the pool.
+    """
+
+    def __init__(self, per_host_limit):
+        self.per_host_limit = max(1, int(per_host_limit))
+        self._lock = threading.Lock()
+        self._semaphores = {}
+
+    def get(self, url):
+        key = _host_key(url)
+        with self._lock:
+            sem = self._semaphores.get(key)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.per_host_limit)
+                self._semaphores[key] = sem
+            return sem
+
+
+class _DNSCache:
+    """
+    getaddrinfo() results per (host, port, family), kept for `ttl` seconds
+    and for at most `max_hosts` keys (least recently used dropped first).
+    Hosts checked every minute are otherwise resolved on every new
+    connection.
+    """
+
+    def __init__(self, ttl, max_hosts):
+        self.ttl = float(ttl)
+        self.max_hosts = max(1, int(max_hosts))
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def resolve(self, host, port, family=0):
+        key = (host, port, family)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+        addrs = socket.getaddrinfo(host, port, family, socket.SOCK_STREAM)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (now + self.ttl, addrs)
+            while len(self._entries) > self.max_hosts:
+                self._entries.popitem(last=False)
+        return addrs
+
+
+_dns_cache = _DNSCache(UPTIME_DNS_TTL_SECONDS, UPTIME_DNS_CACHE_MAX_HOSTS)
+
+
+class _TimedConnectionMixin:
+    """
+    Connects through _dns_cache and records how long the DNS lookup, TCP
+    connect and TLS handshake of this connection took (in ms). probe_url
+    takes the timings once, so a reused keep-alive connection reports 0.
+
+    Like urllib3's own create_connection, it honours allowed_gai_family()
+    and tries each resolved address in turn, so a dual-stack host whose
+    first (IPv6) address is unreachable is still reached over IPv4.
+    """
+
+    phase_timings = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        start = time.perf_counter()
+        try:
+            addrs = _dns_cache.resolve(host.strip("[]"), self.port, allowed_gai_family())
+        except socket.gaierror as e:
+            raise NameResolutionError(self.host, self, e) from e
+        resolved = time.perf_counter()
+
+        sock = None
+        for i, (_, _, _, _, sockaddr) in enumerate(addrs):
+            self._dns_host = sockaddr[0]
+            try:
+                sock = super()._new_conn()
+                break
+            except (NewConnectionError, ConnectTimeoutError):
+                if i == len(addrs) - 1:
+                    raise
+            finally:
+                self._dns_host = host
+        if sock is None:
+            raise NewConnectionError(self, "Failed to establish a new connection: getaddrinfo returned no addresses")
+        self.phase_timings = {
+            "dns_ms": int((resolved - start) * 1000),
+            "connect_ms": int((time.perf_counter() - resolved) * 1000),
+            "tls_ms": 0,
+        }
+        return sock
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        if isinstance(self, HTTPSConnection) and self.phase_timings is not None:
+            elapsed = int((time.perf_counter() - start) * 1000)
+            t = self.phase_timings
+            t["tls_ms"] = max(0, elapsed - t["dns_ms"] - t["connect_ms"])
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+# Error messages name these classes and end up in last_error; keep them
+# reading the same as with plain requests.
+for _cls, _name in (
+    (_TimedHTTPConnection, "HTTPConnection"),
+    (_TimedHTTPSConnection, "HTTPSConnection"),
+    (_TimedHTTPConnectionPool, "HTTPConnectionPool"),
+    (_TimedHTTPSConnectionPool, "HTTPSConnectionPool"),
+):
+    _cls.__name__ = _cls.__qualname__ = _name
+
+
+class _TimedAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class _SessionPool:
+    """
+    One keep-alive requests.Session per (host, port), holding up to
+    UPTIME_PER_HOST_LIMIT connections (the most checks of one host that
+    run at once), so repeat checks skip the TCP connect and TLS handshake.
+    Sessions live across worker passes; the least recently used host is
+    dropped beyond `max_hosts`, and its session closed once no probe is
+    using it any more. Cookies are never stored, so one monitor's
+    responses can't change what another monitor of the same host sends.
+    """
+
+    def __init__(self, max_hosts, per_host_limit):
+        self.max_hosts = max(1, int(max_hosts))
+        self.per_host_limit = max(1, int(per_host_limit))
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+
+    def _new_session(self):
+        session = requests.Session()
+        session.headers["User-Agent"] = USER_AGENT
+        session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = _TimedAdapter(pool_connections=4, pool_maxsize=self.per_host_limit)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    @contextmanager
+    def session(self, url):
+        key = _host_key(url)
+        idle = []
+        with self._lock:
+            entry = self._sessions.pop(key, None) or {"session": self._new_session(), "users": 0, "evicted": False}
+            entry["users"] += 1
+            self._sessions[key] = entry
+            while len(self._sessions) > self.max_hosts:
+                old = self._sessions.popitem(last=False)[1]
+                old["evicted"] = True
+                if old["users"] == 0:
+                    idle.append(old["session"])
+        for old in idle:
+            old.close()
+        try:
+            yield entry["session"]
+        finally:
+            with self._lock:
+                entry["users"] -= 1
+                done = entry["evicted"] and entry["users"] == 0
+            if done:
+                entry["session"].close()
+
+
+_sessions = _SessionPool(UPTIME_SESSION_MAX_HOSTS, UPTIME_PER_HOST_LIMIT)
+
+
+def _take_phase_timings(resp):
+    conn = getattr(resp.raw, "connection", None)
+    timings = getattr(conn, "phase_timings", None)
+    if conn is not None:
+        conn.phase_timings = None
+    return timings or {"dns_ms": 0, "connect_ms": 0, "tls_ms": 0}
+
+
+def probe_url(url, timeout_ms=5000):
+    """
+    Performs a single HTTP check and returns
+    {"status_code", "response_time_ms", "error_message", "is_success",
+    "dns_ms", "connect_ms", "tls_ms", "ttfb_ms"}.
+
+    dns/connect/tls are the setup of the connection the final response
+    came over (0 when a keep-alive connection was reused); ttfb_ms is the
+    time until its headers arrived and response_time_ms includes the body.
+    """
+    result = {
+        "status_code": None,
+        "response_time_ms": None,
+        "error_message": None,
+        "is_success": False,
+        "dns_ms": None,
+        "connect_ms": None,
+        "tls_ms": None,
+        "ttfb_ms": None,
+    }
+    with _sessions.session(url) as session:
+        # A keep-alive connection the server closed while idle fails on reuse;
+        # one retry goes out over a fresh connection. Timeouts aren't retried.
+        for attempt in (0, 1):
+            start = time.perf_counter()
+            try:
+                with session.get(url, timeout=max(1.0, timeout_ms / 1000.0), allow_redirects=True, stream=True) as resp:
+                    result["ttfb_ms"] = int((time.perf_counter() - start) * 1000)
+                    result.update(_take_phase_timings(resp))
+                    resp.content
+                    result["status_code"] = resp.status_code
+                    result["is_success"] = 200 <= resp.status_code < 400
+                result["response_time_ms"] = int((time.perf_counter() - start) * 1000)
+                result["error_message"] = None
+                break
+            except requests.exceptions.ConnectionError as ex:
+                result["response_time_ms"] = int((time.perf_counter() - start) * 1000)
+                result["error_message"] = str(ex)
+                if isinstance(ex, requests.exceptions.ConnectTimeout):
+                    break
+            except Exception as ex:
+                result["response_time_ms"] = int((time.perf_counter() - start) * 1000)
+                result["error_message"] = str(ex)
+                break
+
+    return result
+
+
+def _probe_with_limit(limiter, monitor, probe):
+    url = monitor["url"]
+    timeout_ms = int(monitor.get("timeout_ms") or 5000)
+    # The clock starts inside probe(), after we hold the host slot, so time
+    # spent queued behind other checks of the same host is not reported as
+    # response time.
+    with limiter.get(url):
+        return probe(url, timeout_ms)
+
+
+def run_checks(monitors, concurrency=None, per_host_limit=None, probe=probe_url):
+    """
+    Probes every monitor concurrently on a bounded thread pool and yields
+    (monitor, result) pairs in completion order.
+    """
+    monitors = list(monitors)
+    if not monitors:
+        return
+
+    concurrency = int(concurrency or UPTIME_CONCURRENCY)
+    limiter = _HostLimiter(per_host_limit or UPTIME_PER_HOST_LIMIT)
+    workers = max(1, min(concurrency, len(monitors)))
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="uptime-check") as pool:
+        futures = {pool.submit(_probe_with_limit, limiter, m, probe): m for m in monitors}
+        for fut in as_completed(futures):
+            m = futures[fut]
+            try:
+                result = fut.result()
+            except Exception as ex:
+                result = {
+                    "status_code": None,
+                    "response_time_ms": None,
+                    "error_message": str(ex),
+                    "is_success": False,
+                    "dns_ms": None,
+                    "connect_ms": None,
+                    "tls_ms": None,
+                    "ttfb_ms": None,
+                }
+            yield m, result
@@ -0,0 +1,244 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from extensions.extensions import get_db_connection
+
+UPTIME_SYNC_SECONDS = float(os.getenv("UPTIME_SYNC_SECONDS", 2))
+UPTIME_SYNC_OVERLAP_SECONDS = float(os.getenv("UPTIME_SYNC_OVERLAP_SECONDS", 10))
+UPTIME_FULL_RESYNC_SECONDS = float(os.getenv("UPTIME_FULL_RESYNC_SECONDS", 600))
+UPTIME_MAX_PASSES = int(os.getenv("UPTIME_MAX_PASSES", 4))
+
+
+def _ts(dt):
+    return dt.timestamp() if dt is not None else None
+
+
+class MonitorSchedule:
+    """
+    Min-heap of (due timestamp, monitor_id) with lazy invalidation: a
+    monitor's current due time lives in `_due`, and heap entries that no
+    longer match it are skipped when popped. Monitors handed out by
+    pop_due() are in flight until finish(); updates for them are ignored
+    meanwhile, since the pass that checks them reschedules them.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._due = {}
+        self._in_flight = set()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._due) + len(self._in_flight)
+
+    def _push(self, monitor_id, due_ts):
+        self._due[monitor_id] = due_ts
+        heapq.heappush(self._heap, (due_ts, next(self._seq), monitor_id))
+
+    def set(self, monitor_id, due_ts):
+        with self._lock:
+            if monitor_id not in self._in_flight and self._due.get(monitor_id) != due_ts:
+                self._push(monitor_id, due_ts)
+
+    def remove(self, monitor_id):
+        with self._lock:
+            self._due.pop(monitor_id, None)
+            self._in_flight.discard(monitor_id)
+
+    def replace_all(self, entries):
+        """entries: {monitor_id: due_ts}; monitors in flight are kept as they are."""
+        with self._lock:
+            self._heap = []
+            self._due = {}
+            for monitor_id, due_ts in entries.items():
+                if monitor_id not in self._in_flight:
+                    self._push(monitor_id, due_ts)
+
+    def pop_due(self, now_ts, limit):
+        ids = []
+        with self._lock:
+            while self._heap and len(ids) < limit:
+                due_ts, _, monitor_id = self._heap[0]
+                if self._due.get(monitor_id) != due_ts:
+                    heapq.heappop(self._heap)
+                    continue
+                if due_ts > now_ts:
+                    break
+                heapq.heappop(self._heap)
+                del self._due[monitor_id]
+                self._in_flight.add(monitor_id)
+                ids.append(monitor_id)
+        return ids
+
+    def finish(self, due_by_id):
+        """Returns in-flight monitors to the heap; a None due time drops one."""
+        with self._lock:
+            for monitor_id, due_ts in due_by_id.items():
+                if monitor_id not in self._in_flight:
+                    continue
+                self._in_flight.discard(monitor_id)
+                if due_ts is not None:
+                    self._push(monitor_id, due_ts)
+
+    def next_due(self):
+        with self._lock:
+            while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+
+class UptimeScheduler:
+    """
+    Keeps every active monitor's next check time in memory and runs each
+    check when it falls due, instead of polling uptime_monitors for due
+    rows. The set is loaded once (and again every UPTIME_FULL_RESYNC_SECONDS
+    as a safety net) and kept current by reading only rows whose updated_at
+    moved, every UPTIME_SYNC_SECONDS. Creating, editing and deleting a
+    monitor touch updated_at; checks and leases don't, so a sync reads
+    only config changes. A monitor checked by another worker is found
+    out when it comes up here: its pass sees it isn't due and returns its
+    real next_check_at.
+
+    All due times are the table's next_check_at, on the database clock;
+    _now() is local time corrected by the skew measured at each sync.
+
+    `run_pass(monitor_ids)` checks a batch and returns {monitor_id:
+    next due datetime, or None to stop scheduling it}; it is expected to
+    lease the monitors first, so several schedulers can share the table.
+    Up to UPTIME_MAX_PASSES passes run at once, so a batch of slow hosts
+    doesn't hold back checks that fall due behind it.
+    """
+
+    def __init__(self, run_pass, batch_size):
+        self.run_pass = run_pass
+        self.batch_size = max(1, int(batch_size))
+        self.schedule = MonitorSchedule()
+        self._watermark = None
+        self._skew = 0.0  # database clock minus local clock, in seconds
+        self._last_sync = 0.0
+        self._last_full = 0.0
+        self._passes = threading.BoundedSemaphore(max(1, UPTIME_MAX_PASSES))
+
+    def _now(self):
+        return time.time() + self._skew
+
+    def _entry(self, row):
+        if row["next_check_at"] is None:
+            return 0.0  # never checked: due now
+        return _ts(row["next_check_at"])
+
+    def load(self):
+        conn = get_db_connection()
+        if not conn:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT NOW(6) AS now")
+                db_now = cursor.fetchone()["now"]
+                self._skew = _ts(db_now) - time.time()
+                cursor.execute(
+                    """
+                    SELECT id, next_check_at, updated_at
+                    FROM uptime_monitors
+                    WHERE is_active = TRUE AND deleted_at IS NULL
+                    """
+                )
+                rows = cursor.fetchall()
+            conn.commit()
+        finally:
+            conn.close()
+
+        self.schedule.replace_all({r["id"]: self._entry(r) for r in rows})
+        self._watermark = db_now
+        self._last_full = self._last_sync = time.monotonic()
+        print(f"Uptime scheduler: loaded {len(rows)} monitors")
+        return True
+
+    def sync(self):
+        conn = get_db_connection()
+        if not conn:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT NOW(6) AS now")
+                db_now = cursor.fetchone()["now"]
+                # Re-read a short overlap: updated_at has one-second
+                # resolution and a transaction can commit after rows with
+                # a later updated_at were already read.
+                cursor.execute(
+                    """
+                    SELECT id, next_check_at, is_active, deleted_at, updated_at
+                    FROM uptime_monitors
+                    WHERE updated_at >= DATE_SUB(%s, INTERVAL %s SECOND)
+                    """,
+                    (self._watermark, UPTIME_SYNC_OVERLAP_SECONDS),
+                )
+                rows = cursor.fetchall()
+            conn.commit()
+        finally:
+            conn.close()
+
+        self._skew = _ts(db_now) - time.time()
+        for r in rows:
+            if not r["is_active"] or r["deleted_at"] is not None:
+                self.schedule.remove(r["id"])
+            else:
+                self.schedule.set(r["id"], self._entry(r))
+        self._watermark = db_now
+        self._last_sync = time.monotonic()
+        return True
+
+    def _run_pass(self, monitor_ids):
+        due = {}
+        try:
+            due = self.run_pass(monitor_ids) or {}
+        except Exception as e:
+            print("Uptime scheduler pass error:", e)
+        finally:
+            # Anything the pass didn't account for is retried after the next
+            # sync, which will have its real next_check_at by then.
+            retry_at = self._now() + UPTIME_SYNC_SECONDS
+            self.schedule.finish({
+                mid: (_ts(due[mid]) if due[mid] is not None else None) if mid in due else retry_at
+                for mid in monitor_ids
+            })
+            self._passes.release()
+
+    def run_forever(self):
+        with ThreadPoolExecutor(max_workers=max(1, UPTIME_MAX_PASSES), thread_name_prefix="uptime-pass") as pool:
+            while True:
+                synced = True
+                try:
+                    if time.monotonic() - self._last_full >= UPTIME_FULL_RESYNC_SECONDS:
+                        synced = self.load()
+                    elif time.monotonic() - self._last_sync >= UPTIME_SYNC_SECONDS:
+                        synced = self.sync()
+                except Exception as e:
+                    print("Uptime scheduler sync error:", e)
+                    synced = False
+                if not synced and self._watermark is None:
+                    # Nothing loaded yet; nothing to schedule.
+                    time.sleep(UPTIME_SYNC_SECONDS)
+                    continue
+                if not synced:
+                    # Keep checking from what's in memory; try again later.
+                    self._last_sync = time.monotonic()
+
+                if self._passes.acquire(blocking=False):
+                    ids = self.schedule.pop_due(self._now(), self.batch_size)
+                    if ids:
+                        pool.submit(self._run_pass, ids)
+                        continue
+                    self._passes.release()
+                else:
+                    time.sleep(0.05)
+                    continue
+
+                next_due = self.schedule.next_due()
+                until_sync = UPTIME_SYNC_SECONDS - (time.monotonic() - self._last_sync)
+                wait = until_sync if next_due is None else min(until_sync, next_due - self._now())
+                time.sleep(min(max(wait, 0.01), UPTIME_SYNC_SECONDS))
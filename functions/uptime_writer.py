@@ -0,0 +1,238 @@
+import os
+import time
+from extensions.extensions import get_db_connection
+from extensions.ids import new_id, new_id_bytes, heartbeat_id_is_binary
+from extensions.sql import placeholders, in_list
+from functions.rollups import write_rollups
+from functions.live import record_live_events
+
+UPTIME_WRITE_BATCH_SIZE = int(os.getenv("UPTIME_WRITE_BATCH_SIZE", 100))
+UPTIME_WRITE_FLUSH_SECONDS = float(os.getenv("UPTIME_WRITE_FLUSH_SECONDS", 1.0))
+
+
+def _derived_table(columns, rows):
+    """
+    Builds an inline `SELECT ... UNION ALL SELECT ...` table so one UPDATE
+    can JOIN against per-row values. Returns (sql, params).
+    """
+    first = "SELECT " + ", ".join(f"%s AS {c}" for c in columns)
+    rest = " UNION ALL SELECT " + ", ".join(["%s"] * len(columns))
+    sql = first + rest * (len(rows) - 1)
+    params = [v for r in rows for v in r]
+    return sql, params
+
+
+class UptimeResultWriter:
+    """
+    Buffers check results and writes them in one transaction per batch:
+    a multi-row heartbeat INSERT, the minute/hour/day rollup upserts, one
+    bulk monitor-state UPDATE, bulk incident open/resolve/last_error
+    statements and the live events for streaming clients.
+
+    A batch is flushed once it holds `batch_size` results or the oldest
+    buffered result is `flush_seconds` old. Each monitor is expected at
+    most once per batch (one writer per worker pass).
+
+    With `worker_id`, nothing is written for monitors that worker no
+    longer holds the lease on. A worker whose lease ran out and was taken
+    over must not add a second heartbeat or rollup count for the check the
+    new owner repeats, release the new owner's lease, move its schedule or
+    open a second incident.
+    """
+
+    def __init__(self, batch_size=None, flush_seconds=None, worker_id=None):
+        self.worker_id = worker_id
+        self.batch_size = max(1, int(batch_size or UPTIME_WRITE_BATCH_SIZE))
+        self.flush_seconds = float(flush_seconds if flush_seconds is not None else UPTIME_WRITE_FLUSH_SECONDS)
+        self._pending = []
+        self._first_at = None
+        self._conn = None
+
+    def add(self, record):
+        """
+        record keys: monitor_id, project_id, checked_at, interval_seconds,
+        hb_status, status_code, response_time_ms, error_message,
+        prev_status, new_status, consecutive_failures, and optionally
+        dns_ms, connect_ms, tls_ms, ttfb_ms
+        """
+        if not self._pending:
+            self._first_at = time.monotonic()
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size or (time.monotonic() - self._first_at) >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        batch = self._pending
+        self._pending = []
+        self._first_at = None
+
+        if self._conn is None:
+            self._conn = get_db_connection()
+            if not self._conn:
+                self._conn = None
+                print(f"Uptime writer: database connection failed, dropping {len(batch)} results")
+                return
+
+        try:
+            with self._conn.cursor() as cursor:
+                self._write_batch(cursor, batch)
+            self._conn.commit()
+        except Exception as e:
+            # Monitors in a dropped batch keep their old next_check_at, so the
+            # next pass picks them up again.
+            print(f"Uptime writer: flush of {len(batch)} results failed: {e}")
+            try:
+                self._conn.rollback()
+            except Exception:
+                pass
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self._conn:
+                self._conn.close()
+                self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _still_leased(self, cursor, batch):
+        """The records whose monitors are still leased to this worker, locked until commit."""
+        cursor.execute(
+            f"""
+            SELECT id FROM uptime_monitors
+            WHERE claimed_by = %s AND id IN ({in_list(len(batch))})
+            FOR UPDATE
+            """,
+            [self.worker_id] + [r["monitor_id"] for r in batch],
+        )
+        owned = {row["id"] for row in cursor.fetchall()}
+        if len(owned) < len(batch):
+            print(f"Uptime writer: {len(batch) - len(owned)} monitors were leased to another worker meanwhile")
+        return [r for r in batch if r["monitor_id"] in owned]
+
+    def _write_batch(self, cursor, batch):
+        if self.worker_id:
+            batch = self._still_leased(cursor, batch)
+            if not batch:
+                return
+
+        heartbeat_id = new_id_bytes if heartbeat_id_is_binary(cursor) else new_id
+        cursor.execute(
+            """
+            INSERT INTO uptime_heartbeats (
+                id, project_id, monitor_id, status, status_code, response_time_ms, error_message, checked_at,
+                dns_ms, connect_ms, tls_ms, ttfb_ms
+            ) VALUES
+            """
+            + placeholders(12, len(batch)),
+            [
+                v
+                for r in batch
+                for v in (
+                    heartbeat_id(),
+                    r["project_id"],
+                    r["monitor_id"],
+                    r["hb_status"],
+                    r["status_code"],
+                    r["response_time_ms"],
+                    r["error_message"],
+                    r["checked_at"],
+                    r.get("dns_ms"),
+                    r.get("connect_ms"),
+                    r.get("tls_ms"),
+                    r.get("ttfb_ms"),
+                )
+            ],
+        )
+
+        write_rollups(cursor, batch)
+
+        state_sql, state_params = _derived_table(
+            ("id", "checked_at", "interval_seconds", "consecutive_failures", "status"),
+            [
+                (r["monitor_id"], r["checked_at"], r["interval_seconds"], r["consecutive_failures"], r["new_status"])
+                for r in batch
+            ],
+        )
+        # next_check_at is on the database clock, like the NOW() it is
+        # claimed against; updated_at is left alone since a check isn't a
+        # config change (the scheduler syncs on updated_at).
+        cursor.execute(
+            f"""
+            UPDATE uptime_monitors m
+            JOIN ({state_sql}) v ON m.id = v.id
+            SET
+                m.last_checked_at = v.checked_at,
+                m.next_check_at = DATE_ADD(NOW(), INTERVAL v.interval_seconds SECOND),
+                m.consecutive_failures = v.consecutive_failures,
+                m.status = v.status,
+                m.claimed_by = NULL,
+                m.lease_until = NULL,
+                m.updated_at = m.updated_at
+            {"WHERE m.claimed_by = %s" if self.worker_id else ""}
+            """,
+            state_params + ([self.worker_id] if self.worker_id else []),
+        )
+
+        opened = [r for r in batch if r["prev_status"] != "down" and r["new_status"] == "down"]
+        if opened:
+            cursor.execute(
+                """
+                INSERT INTO uptime_incidents (
+                    id, project_id, monitor_id, status, started_at, started_reason, last_error
+                ) VALUES
+                """
+                + placeholders(7, len(opened)),
+                [
+                    v
+                    for r in opened
+                    for v in (new_id(), r["project_id"], r["monitor_id"], "open", r["checked_at"], "down", r["error_message"])
+                ],
+            )
+
+        recovered = [r for r in batch if r["prev_status"] == "down" and r["new_status"] == "up"]
+        if recovered:
+            rec_sql, rec_params = _derived_table(
+                ("monitor_id", "project_id", "resolved_at"),
+                [(r["monitor_id"], r["project_id"], r["checked_at"]) for r in recovered],
+            )
+            cursor.execute(
+                f"""
+                UPDATE uptime_incidents i
+                JOIN ({rec_sql}) v ON i.monitor_id = v.monitor_id AND i.project_id = v.project_id
+                SET i.status = 'resolved', i.resolved_at = v.resolved_at, i.resolved_reason = 'recovered'
+                WHERE i.status = 'open'
+                """,
+                rec_params,
+            )
+
+        # Newly opened incidents already carry the error; only refresh the
+        # ones that were open before this check.
+        still_down = [
+            r for r in batch
+            if r["prev_status"] == "down" and r["new_status"] == "down" and r["error_message"]
+        ]
+        if still_down:
+            err_sql, err_params = _derived_table(
+                ("monitor_id", "project_id", "last_error"),
+                [(r["monitor_id"], r["project_id"], r["error_message"]) for r in still_down],
+            )
+            cursor.execute(
+                f"""
+                UPDATE uptime_incidents i
+                JOIN ({err_sql}) v ON i.monitor_id = v.monitor_id AND i.project_id = v.project_id
+                SET i.last_error = v.last_error
+                WHERE i.status = 'open'
+                """,
+                err_params,
+            )
+
+        # Streamed to dashboards by functions/live.py
+        record_live_events(cursor, batch)
@@ -1,5 +1,5 @@
 from extensions.extensions import get_db_connection, mail, app
-from extensions.dbschemas import setup_database_schemas
+from extensions.dbschemas import setup_database_schemas, migrate_command
 from functions.auth import auth_bp
 from functions.projects import projects_bp
 from functions.dashboard import dashboard_bp
@@ -7,7 +7,13 @@ from functions.alerts import alerts_bp
 from functions.monitors import monitors_bp
 from functions.events import events_bp
 from functions.system import system_bp, v1_bp
+from functions.exports import exports_bp, export_command
+from functions.sla import sla_bp
 from functions.system import run_uptime_worker_forever
+from functions.rollups import backfill_rollups
+from functions.retention import run_retention_worker_forever
+from extensions.partitions import convert_heartbeats_to_partitioned
+from extensions.ids import convert_heartbeat_ids_to_binary
 import sys
 
 app.register_blueprint(auth_bp, url_prefix="/auth")
@@ -18,13 +24,38 @@ app.register_blueprint(monitors_bp, url_prefix="/") # Root or /monitors? Route d
 app.register_blueprint(events_bp, url_prefix="/events")
 app.register_blueprint(system_bp, url_prefix="/system")
 app.register_blueprint(v1_bp, url_prefix="/v1")
+app.register_blueprint(exports_bp, url_prefix="/exports")
+app.register_blueprint(sla_bp, url_prefix="/reports")
 
 
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--migrate":
+        migrate_command(sys.argv[2:])
+        sys.exit(0)
+    # Applies pending migrations only; a no-op once the schema is current.
     setup_database_schemas()
     if len(sys.argv) > 1 and sys.argv[1] == "--uptime-worker":
         run_uptime_worker_forever()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--retention-worker":
+        run_retention_worker_forever()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--partition-heartbeats":
+        conn = get_db_connection()
+        try:
+            convert_heartbeats_to_partitioned(conn)
+        finally:
+            conn.close()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--binary-heartbeat-ids":
+        conn = get_db_connection()
+        try:
+            convert_heartbeat_ids_to_binary(conn)
+        finally:
+            conn.close()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--backfill-rollups":
+        hours = int(sys.argv[2]) if len(sys.argv) > 2 else 24 * 7
+        backfill_rollups(get_db_connection, hours=hours)
+    elif len(sys.argv) > 1 and sys.argv[1] == "--export":
+        export_command(sys.argv[2:])
     else:
         app.run(debug=True, host="0.0.0.0", port=2092, use_reloader=True)